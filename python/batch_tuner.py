@@ -0,0 +1,212 @@
+############# ADAPTIVE BATCH SIZE AND PARALLELISM FOR PERIODIC ITERATE LOADS #############
+# Tuning mode runs every apoc.periodic.iterate load against a sample of its input file at each
+# batch size and parallel setting in candidate_configs, measuring rows per second, lock retries,
+# failed batches and heap use, and keeps the best setting per query in logs/batch_profile.json.
+# Builds read the profile and rewrite batchSize/parallel/retries of each tuned query; untuned
+# queries keep their hand-written config.
+# Tuning replays a fresh build (it starts with MATCH (n) DETACH DELETE n) on a scratch database whose
+# import folder is --scratch-path, never the production one. Every candidate of a load gets its own
+# slice of the input file, so each one creates its nodes and relationships and takes the write
+# locks a real build does; the rest of the file is loaded after, with the query's own config, so
+# the loads after it find what they MATCH. Other queries run as written on copies of their files.
+#
+#   python batch_tuner.py --scratch-path ... [--password ...] [--rows 5000] [--query 61 --query 62]
+
+import argparse
+import shutil
+import json
+import time
+import csv
+import sys
+import os
+import re
+
+from import_validation import file_pattern
+from query_scheduler import run_query
+from query_metrics import query_key
+
+batch_profile_file_name = 'batch_profile.json'
+sample_file_name = 'batch_tuning_sample_{}.csv' # one per candidate, then 'rest'
+tuning_rows = 5000 # rows per candidate
+batch_sizes = (500, 1000, 2000, 5000, 10000)
+candidate_configs = [(batch_size, parallel) for batch_size in batch_sizes for parallel in (False, True)]
+parallel_retries = 10 # retries given to parallel loads, deadlocked batches are retried
+heap_limit = 0.85 # candidates that leave more of the heap used than this are rejected
+
+config_pattern = re.compile(r'(",\s*)\{([^{}]*)\}(\s*\)\s*)$')
+
+############# APOC CONFIG MAP #############
+# '{batchSize:1000, parallel:true, retries: 10}' -> {'batchSize': '1000', 'parallel': 'true', 'retries': '10'}
+def query_config(query):
+    match = config_pattern.search(query)
+    if not match or 'apoc.periodic.iterate' not in query:
+        return None
+    config = {}
+    for entry in match.group(2).split(','):
+        if ':' in entry:
+            key, value = entry.split(':', 1)
+            config[key.strip()] = value.strip()
+    return config
+
+def with_config(query, batch_size, parallel):
+    config = query_config(query)
+    config['batchSize'] = str(batch_size)
+    config['parallel'] = 'true' if parallel else 'false'
+    if parallel:
+        config.setdefault('retries', str(parallel_retries))
+    config_text = '{' + ', '.join(key + ':' + value for key, value in config.items()) + '}'
+    return config_pattern.sub(lambda match: match.group(1) + config_text + match.group(3), query)
+
+# sets retries when the query doesn't, a failed batch is rerun in its own transaction
+def with_retries(query, retries):
+    config = query_config(query)
+    if config is None or 'retries' in config:
+        return query
+    config['retries'] = str(retries)
+    config_text = '{' + ', '.join(key + ':' + value for key, value in config.items()) + '}'
+    return config_pattern.sub(lambda match: match.group(1) + config_text + match.group(3), query)
+
+############# PROFILE FILE #############
+def load_batch_profile(profile_path):
+    if not os.path.exists(profile_path):
+        return {}
+    with open(profile_path, 'r') as profile_file:
+        return json.load(profile_file)
+
+def save_batch_profile(profile_path, profile):
+    with open(profile_path + '.tmp', 'w') as profile_file:
+        json.dump(profile, profile_file, indent=2, sort_keys=True)
+    os.replace(profile_path + '.tmp', profile_path)
+
+# profile entries are keyed by the hand-written query text, so editing a query drops its tuning
+# returns the rewritten query_list and the number of queries tuned
+def apply_batch_profile(query_list, profile):
+    tuned = 0
+    applied = []
+    for query in query_list:
+        entry = profile.get(query_key(query))
+        if entry and query_config(query) is not None:
+            query = with_config(query, entry['batchSize'], entry['parallel'])
+            tuned += 1
+        applied.append(query)
+    return applied, tuned
+
+############# MEASUREMENTS #############
+# fraction of the heap in use, None when jmx isn't available
+def heap_usage(graph):
+    try:
+        usage = graph.run("""CALL dbms.queryJmx('java.lang:type=Memory') YIELD attributes
+            RETURN attributes.HeapMemoryUsage.value.properties AS heap""").evaluate()
+        return usage['used'] / usage['max']
+    except Exception:
+        return None
+
+# splits the input file into a slice of up to rows rows per candidate and the rest, each with the header
+# returns the sample file names, the rest last
+def write_samples(path, file_name, scratch_path, candidates, rows=tuning_rows):
+    with open(os.path.join(path, file_name), 'r', newline='', encoding='utf-8-sig') as source:
+        reader = csv.reader(source)
+        header = next(reader, [])
+        lines = list(reader)
+    rows = min(rows, len(lines) // candidates)
+    file_names = [sample_file_name.format(number) for number in range(candidates)] + [sample_file_name.format('rest')]
+    for number, sample_name in enumerate(file_names):
+        with open(os.path.join(scratch_path, sample_name), 'w', newline='', encoding='utf-8') as sample:
+            writer = csv.writer(sample)
+            writer.writerow(header)
+            writer.writerows(lines[number * rows:(number + 1) * rows] if number < candidates else lines[candidates * rows:])
+    return file_names
+
+# returns {'batchSize', 'parallel', 'seconds', 'rows_per_second', 'retries', 'failed_batches', 'heap', 'error'}
+def measure(graph, index, query, batch_size, parallel):
+    outcome = run_query(graph, index, with_config(query, batch_size, parallel))
+    result = outcome['result'] or {}
+    total = result.get('total') or 0
+    return {'batchSize': batch_size, 'parallel': parallel, 'seconds': outcome['seconds'],
+            'rows_per_second': total / outcome['seconds'] if outcome['seconds'] > 0 else 0.0,
+            'retries': result.get('retries') or 0, 'failed_batches': result.get('failedBatches') or 0,
+            'heap': heap_usage(graph), 'error': outcome['error']}
+
+# fastest candidate without failures or heap pressure, fewer retries breaking near ties
+def best_candidate(measurements):
+    usable = [m for m in measurements if not m['error'] and not m['failed_batches']
+              and (m['heap'] is None or m['heap'] <= heap_limit)]
+    if not usable:
+        return None
+    return max(usable, key=lambda m: (round(m['rows_per_second'], -1), -m['retries']))
+
+############# TUNE EVERY LOAD #############
+# query_list is a fresh install's (append_queries(True)), run in order on the scratch database
+# on_done(index, input_file, best, measurements) after each tuned query
+def tune_queries(graph, query_list, path, scratch_path, rows=tuning_rows, only=None, on_done=None):
+    profile = {}
+    for index, query in enumerate(query_list):
+        input_files = sorted(set(file_pattern.findall(query)))
+        tuned = query_config(query) is not None and len(input_files) == 1 and (not only or index + 1 in only) \
+            and os.path.isfile(os.path.join(path, input_files[0]))
+        if not tuned:
+            for file_name in input_files:
+                if os.path.isfile(os.path.join(path, file_name)):
+                    shutil.copyfile(os.path.join(path, file_name), os.path.join(scratch_path, file_name))
+            run_query(graph, index, query)
+            for file_name in input_files:
+                if os.path.exists(os.path.join(scratch_path, file_name)):
+                    os.remove(os.path.join(scratch_path, file_name))
+            continue
+        sample_names = write_samples(path, input_files[0], scratch_path, len(candidate_configs), rows)
+        def sample_query(sample_name):
+            return query.replace('file:///' + input_files[0], 'file:///' + sample_name)
+        measurements = [measure(graph, index, sample_query(sample_name), batch_size, parallel)
+                        for sample_name, (batch_size, parallel) in zip(sample_names, candidate_configs)]
+        run_query(graph, index, sample_query(sample_names[-1]))
+        for sample_name in sample_names:
+            os.remove(os.path.join(scratch_path, sample_name))
+        best = best_candidate(measurements)
+        if best:
+            profile[query_key(query)] = dict(best, query=index + 1, input_file=input_files[0], tuned=time.strftime('%Y-%m-%d'))
+        if on_done:
+            on_done(index, input_files[0], best, measurements)
+    return profile
+
+############# COMMAND LINE #############
+if __name__ == '__main__':
+    assumed_path = os.path.abspath(os.path.join(os.path.dirname( __file__ ), '..', 'import'))
+    log_path = os.path.abspath(os.path.join(os.path.dirname( __file__ ), '..', 'logs'))
+    parser = argparse.ArgumentParser(description='Tune batchSize/parallel of every periodic iterate load on a scratch database.')
+    parser.add_argument('--host', default=os.environ.get('NEO4J_HOST', 'localhost'), help='scratch database host (NEO4J_HOST)')
+    parser.add_argument('--port', default=os.environ.get('NEO4J_PORT', '7687'), help='bolt port (NEO4J_PORT)')
+    parser.add_argument('--user', default=os.environ.get('NEO4J_USER', 'neo4j'), help='database user (NEO4J_USER)')
+    parser.add_argument('--password', default=os.environ.get('NEO4J_PASSWORD'), help='database password (NEO4J_PASSWORD)')
+    parser.add_argument('--import-path', default=os.environ.get('ONET_IMPORT_PATH', assumed_path), help='neo4j import folder (ONET_IMPORT_PATH)')
+    parser.add_argument('--scratch-path', default=os.environ.get('ONET_TUNING_IMPORT_PATH'), help='import folder of the scratch database, gets the samples (ONET_TUNING_IMPORT_PATH)')
+    parser.add_argument('--rows', type=int, default=tuning_rows, help='sample rows per candidate')
+    parser.add_argument('--query', type=int, action='append', help='only tune this query number (repeatable)')
+    arguments = parser.parse_args()
+    if not arguments.scratch_path:
+        parser.error('--scratch-path or ONET_TUNING_IMPORT_PATH is required')
+    if os.path.realpath(arguments.scratch_path) == os.path.realpath(arguments.import_path):
+        parser.error('--scratch-path has to be the scratch database\'s import folder, not the production one')
+    os.makedirs(arguments.scratch_path, exist_ok=True)
+
+    # the build script holds the statements; importing it doesn't start a build
+    import database_update_script as build
+    from index_advisor import advise_indexes, with_advised_indexes
+    from py2neo import Graph
+    graph = Graph('bolt://' + arguments.host + ':' + arguments.port, auth=(arguments.user, arguments.password))
+    build.query_list = []
+    query_list = build.append_queries(True)
+    # the build's advised indexes, so the loads are tuned on the plans they get in a build
+    query_list = with_advised_indexes(query_list, advise_indexes(query_list + [build.comp_ele_similarity_query])['statements'])
+
+    def tuned(index, input_file, best, measurements):
+        for m in measurements:
+            print(f'  query {index + 1} batchSize {m["batchSize"]:>5} parallel {str(m["parallel"]):5} '
+                  + f'{m["rows_per_second"]:10.0f} rows/s {m["retries"]} retries heap {m["heap"]}' + (' ' + m['error'] if m['error'] else ''))
+        print('Query ' + str(index + 1) + ' (' + input_file + '): '
+              + (f'batchSize {best["batchSize"]}, parallel {best["parallel"]}' if best else 'no usable setting, left as written'))
+    profile_path = os.path.join(log_path, batch_profile_file_name)
+    profile = load_batch_profile(profile_path)
+    profile.update(tune_queries(graph, query_list, arguments.import_path, arguments.scratch_path, arguments.rows, arguments.query, on_done=tuned))
+    save_batch_profile(profile_path, profile)
+    print('Saved ' + str(len(profile)) + ' tuned queries to ' + profile_path)
+    sys.exit(0)
@@ -0,0 +1,89 @@
+############# CHECKPOINT AND RESUME FOR DATABASE BUILDS #############
+# Every finished query is recorded in a json state file under logs/, keyed by a sha256 of the
+# query text and of every import file it reads (file:///...), so editing a query or getting a new
+# file invalidates just that query. A rerun skips a query if its key is recorded and everything it
+# depends on (query_scheduler's dependency graph) is skipped too, and resumes from there.
+# The state file is written after every query, and removed once a build finishes without failures,
+# so the next fresh build starts from MATCH (n) DETACH DELETE n again.
+# Constraints and indexes that fail because they already exist (every update run) count as done,
+# or the checkpoint would never be cleared. --reset-checkpoint forces a full build.
+
+import hashlib
+import json
+import re
+import os
+
+from import_validation import file_pattern
+from query_scheduler import schema_pattern
+
+checkpoint_file_name = 'build_checkpoint.json'
+chunk_size = 1024 * 1024 # bytes hashed per read
+# neo4j 4.0 has no IF NOT EXISTS: 'An equivalent constraint already exists', 'There already exists an index called ...'
+already_exists_pattern = re.compile(r'already\s+exists', re.IGNORECASE)
+
+############# STATE FILE #############
+def load_checkpoint(checkpoint_path):
+    if not os.path.exists(checkpoint_path):
+        return {'completed': {}, 'file_hashes': {}}
+    with open(checkpoint_path, 'r') as checkpoint_file:
+        return json.load(checkpoint_file)
+
+# write to a temp file and fsync first so a crash never leaves a half-written checkpoint
+def save_checkpoint(checkpoint_path, checkpoint):
+    with open(checkpoint_path + '.tmp', 'w') as checkpoint_file:
+        json.dump(checkpoint, checkpoint_file, indent=2, sort_keys=True)
+        checkpoint_file.flush()
+        os.fsync(checkpoint_file.fileno())
+    os.replace(checkpoint_path + '.tmp', checkpoint_path)
+
+def clear_checkpoint(checkpoint_path):
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+
+############# QUERY KEYS #############
+# hashes are cached by size and modification time, so unchanged files aren't read again
+def input_file_hash(path, file_name, file_hashes):
+    file_path = os.path.join(path, file_name)
+    if not os.path.exists(file_path):
+        return 'missing'
+    stat = os.stat(file_path)
+    cached = file_hashes.get(file_name)
+    if cached and cached['size'] == stat.st_size and cached['mtime'] == stat.st_mtime:
+        return cached['sha256']
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    file_hashes[file_name] = {'size': stat.st_size, 'mtime': stat.st_mtime, 'sha256': digest.hexdigest()}
+    return file_hashes[file_name]['sha256']
+
+# one key per query; repeated identical queries are kept apart by their occurrence number
+def query_keys(query_list, path, file_hashes):
+    keys = []
+    occurrences = {}
+    for query in query_list:
+        digest = hashlib.sha256(query.encode('utf-8'))
+        for file_name in sorted(set(file_pattern.findall(query))):
+            digest.update(('\x1f' + file_name + '=' + input_file_hash(path, file_name, file_hashes)).encode('utf-8'))
+        occurrence = occurrences.get(digest.hexdigest(), 0)
+        occurrences[digest.hexdigest()] = occurrence + 1
+        keys.append(digest.hexdigest() + '#' + str(occurrence))
+    return keys
+
+############# QUERIES A RERUN CAN SKIP #############
+# nodes come from query_scheduler.build_dependency_graph, in query_list order
+def resumable_queries(nodes, keys, checkpoint):
+    skipped = set()
+    for node in nodes:
+        if keys[node['index']] in checkpoint['completed'] and node['depends_on'] <= skipped:
+            skipped.add(node['index'])
+    return skipped
+
+def record_completion(checkpoint_path, checkpoint, key, outcome):
+    checkpoint['completed'][key] = {'query': outcome['index'] + 1, 'seconds': outcome['seconds']}
+    save_checkpoint(checkpoint_path, checkpoint)
+
+# a CREATE CONSTRAINT/INDEX that failed only because the database already has it
+def schema_in_place(query, error):
+    return bool(error) and bool(schema_pattern.search(query)) and query.lstrip().upper().startswith('CREATE') \
+        and bool(already_exists_pattern.search(error))
@@ -0,0 +1,530 @@
+############# OFFLINE BULK IMPORT FOR FRESH INSTALLS #############
+# A fresh install replays query_list on an empty graph. Instead, the loads are run here, in memory,
+# over the csvs in the import folder, and the resulting graph is written as node and relationship
+# files for neo4j-admin import:
+# - every MERGE dedupes in python (the same label and property map is one node, the same
+#   endpoints, type and map one relationship), and nodes get integer :ID values
+# - ON CREATE SET / ON MATCH SET / SET, label SETs, apoc.create.addLabels, MATCH ... WHERE
+#   (=, <>, CONTAINS, IN [...]) and apoc.util.md5 keys work as in cypher
+# - a row that would MERGE on a null value, or give date() something that isn't a date, is
+#   skipped from that clause on (cypher would fail its whole batch)
+# A query is compiled when every clause is understood (see compile_query) and it doesn't depend on
+# a query that isn't (query_scheduler's dependency graph). Everything else, and the constraints and
+# indexes, run as usual against the imported database afterwards, in query_list order.
+# neo4j-admin import only writes a database that doesn't exist yet, so the DBMS is stopped, the
+# database folders moved aside to <database>.before-import-<time> (delete them once the new
+# database checks out) and started again after. The build only does this with --force.
+
+from datetime import date
+import subprocess
+import hashlib
+import shutil
+import time
+import csv
+import os
+import re
+
+from import_validation import file_pattern
+from query_scheduler import clause_pattern, schema_pattern, build_dependency_graph
+from query_plans import iterate_pattern
+from client_loader import conversions
+
+bulk_folder_name = 'bulk_import'
+default_database = 'neo4j'
+start_timeout = 300 # seconds to wait for bolt after starting the DBMS
+wipe_queries = ('CALL apoc.schema.assert({},{})', 'MATCH (n) DETACH DELETE n')
+property_types = {str: 'string', bool: 'boolean', int: 'long', float: 'double', date: 'date'}
+
+literal_pattern = re.compile(r"'[^']*'|\"[^\"]*\"")
+placeholder_pattern = re.compile(r'\x00(\d+)\x00')
+node_pattern = re.compile(r'^\(\s*(\w*)\s*(?::\s*(\w+))?\s*(\{.*\})?\s*\)$', re.DOTALL)
+relationship_pattern = re.compile(r'^\(\s*(\w+)\s*\)\s*(<?-)\s*\[\s*(\w*)\s*:\s*(\w+)\s*(\{.*\})?\s*\]\s*(->?)\s*\(\s*(\w+)\s*\)$', re.DOTALL)
+function_pattern = re.compile(r'^(\w+)\s*\((.*)\)$', re.DOTALL)
+md5_pattern = re.compile(r'^apoc\.util\.md5\(\s*\[(.*)\]\s*\)$', re.DOTALL)
+add_labels_pattern = re.compile(r'^apoc\.create\.addLabels\(\s*(\w+)\s*,\s*(\[.*\])\s*\)$', re.DOTALL)
+list_pattern = re.compile(r'^\[(.*)\]$', re.DOTALL)
+property_pattern = re.compile(r'^(\w+)\.(?:`([^`]+)`|(\w+))$')
+
+class NotCompilable(Exception):
+    pass
+
+class SkipRow(Exception):
+    pass
+
+############# PARSING #############
+# string literals are swapped for \x00n\x00 first, so keywords and commas inside them are left alone
+def mask_literals(text):
+    literals = []
+    def mask(match):
+        literals.append(match.group(0)[1:-1])
+        return '\x00' + str(len(literals) - 1) + '\x00'
+    return literal_pattern.sub(mask, text), literals
+
+def split_top_level(text, separator=','):
+    parts, depth, current = [], 0, ''
+    for character in text:
+        if character in '([{':
+            depth += 1
+        elif character in ')]}':
+            depth -= 1
+        if character == separator and depth == 0:
+            parts.append(current.strip())
+            current = ''
+        else:
+            current += character
+    if current.strip():
+        parts.append(current.strip())
+    return parts
+
+# expressions are compiled to functions of a binding (variable -> row, node or relationship)
+def parse_expression(text, literals, graph):
+    text = text.strip()
+    if placeholder_pattern.fullmatch(text):
+        value = literals[int(placeholder_pattern.fullmatch(text).group(1))]
+        return lambda binding: value
+    if re.fullmatch(r'-?\d+', text):
+        return lambda binding: int(text)
+    if re.fullmatch(r'-?\d+\.\d+', text):
+        return lambda binding: float(text)
+    if text.startswith('(') and text.endswith(')'):
+        return parse_expression(text[1:-1], literals, graph)
+    items = list_pattern.match(text)
+    if items:
+        values = [parse_expression(value, literals, graph) for value in split_top_level(items.group(1))]
+        return lambda binding: [value(binding) for value in values]
+    md5 = md5_pattern.match(text)
+    if md5:
+        values = [parse_expression(value, literals, graph) for value in split_top_level(md5.group(1))]
+        return lambda binding: apoc_md5([value(binding) for value in values])
+    function = function_pattern.match(text)
+    if function and function.group(1) in conversions or function and function.group(1) == 'date':
+        argument = parse_expression(function.group(2), literals, graph)
+        convert = conversions.get(function.group(1), parse_date)
+        def call(binding):
+            value = argument(binding)
+            return convert(value if isinstance(value, str) else str(value)) if value is not None else None
+        return call
+    reference = property_pattern.match(text)
+    if reference:
+        variable, name = reference.group(1), reference.group(2) or reference.group(3)
+        return lambda binding: graph_property(graph, binding, variable, name)
+    raise NotCompilable('expression ' + text)
+
+# apoc.util.md5 hashes the values' strings run together, null as ''
+def apoc_md5(values):
+    return hashlib.md5(''.join('' if value is None else str(value) for value in values).encode('utf-8')).hexdigest()
+
+def parse_date(value):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise SkipRow()
+
+# {key: expr, ...} -> [(key, function)]
+def parse_map(text, literals, graph):
+    if not text:
+        return []
+    entries = []
+    for entry in split_top_level(text.strip()[1:-1]):
+        key, value = entry.split(':', 1)
+        entries.append((key.strip().strip('`'), parse_expression(value, literals, graph)))
+    return entries
+
+# a.p = expr, a.p <> b.q, a.p CONTAINS(expr), a.p IN [expr, ...]
+def parse_condition(text, literals, graph):
+    within = re.fullmatch(r'(\w+)\.(\w+)\s+IN\s+(\[.*\])', text, re.DOTALL | re.IGNORECASE)
+    if within:
+        return ('IN', within.group(1), within.group(2), parse_expression(within.group(3), literals, graph), None)
+    equal = re.fullmatch(r'(\w+)\.(\w+)\s*=\s*(.+)', text, re.DOTALL)
+    if equal:
+        return ('=', equal.group(1), equal.group(2), parse_expression(equal.group(3), literals, graph), set(re.findall(r'\b(\w+)\.', equal.group(3))))
+    different = re.fullmatch(r'(\w+)\.(\w+)\s*<>\s*(.+)', text, re.DOTALL)
+    if different:
+        return ('<>', different.group(1), different.group(2), parse_expression(different.group(3), literals, graph), None)
+    contains = re.fullmatch(r'(\w+)\.(\w+)\s+CONTAINS\s*(.+)', text, re.DOTALL | re.IGNORECASE)
+    if contains:
+        return ('CONTAINS', contains.group(1), contains.group(2), parse_expression(contains.group(3), literals, graph), None)
+    raise NotCompilable('condition ' + text)
+
+# returns [(keyword, parsed clause)] or raises NotCompilable
+def compile_statement(statement, graph):
+    text, literals = mask_literals(statement.strip().rstrip(';'))
+    pieces = clause_pattern.split(text)
+    if pieces[0].strip():
+        raise NotCompilable('statement ' + pieces[0])
+    clauses = []
+    bound = {'line'}
+    def check_bound(*variables):
+        for variable in variables:
+            if variable not in bound:
+                raise NotCompilable('unbound ' + variable)
+    for keyword, body in zip(pieces[1::2], pieces[2::2]):
+        keyword = ' '.join(keyword.upper().split())
+        body = body.strip()
+        if keyword == 'MATCH':
+            patterns = []
+            for pattern in split_top_level(body):
+                node = node_pattern.match(pattern)
+                if not node or not node.group(1):
+                    raise NotCompilable('match ' + pattern)
+                if node.group(1) in bound or not node.group(2):
+                    raise NotCompilable('match on a bound or unlabeled variable ' + pattern)
+                patterns.append((node.group(1), node.group(2), parse_map(node.group(3), literals, graph)))
+                bound.add(node.group(1))
+            clauses.append(('MATCH', {'patterns': patterns, 'conditions': []}))
+        elif keyword == 'WHERE' and clauses and clauses[-1][0] == 'MATCH':
+            clauses[-1][1]['conditions'] = [parse_condition(condition, literals, graph) for condition in re.split(r'\s+AND\s+', body, flags=re.IGNORECASE)]
+        elif keyword == 'MERGE':
+            node = node_pattern.match(body)
+            relationship = relationship_pattern.match(body)
+            if node and node.group(1) and node.group(2) and node.group(1) not in bound:
+                bound.add(node.group(1))
+                clauses.append(('MERGE NODE', (node.group(1), node.group(2), parse_map(node.group(3), literals, graph))))
+            elif relationship and relationship.group(4):
+                start, left, variable, kind, properties, right, end = relationship.groups()
+                check_bound(start, end)
+                if variable:
+                    bound.add(variable)
+                direction = '<' if left == '<-' else '>' if right == '->' else '-'
+                clauses.append(('MERGE RELATIONSHIP', (start, variable, kind, parse_map(properties, literals, graph), direction, end)))
+            else:
+                raise NotCompilable('merge ' + body)
+        elif keyword in ('SET', 'ON CREATE SET', 'ON MATCH SET'):
+            items = []
+            for item in split_top_level(body):
+                label = re.fullmatch(r'(\w+)\s*:\s*(\w+)', item)
+                assignment = re.fullmatch(r'(\w+)\.(\w+)\s*=\s*(.+)', item, re.DOTALL)
+                if label or assignment:
+                    check_bound((label or assignment).group(1))
+                if label:
+                    items.append(('label', label.group(1), label.group(2), None))
+                elif assignment:
+                    items.append(('property', assignment.group(1), assignment.group(2), parse_expression(assignment.group(3), literals, graph)))
+                else:
+                    raise NotCompilable('set ' + item)
+            clauses.append((keyword, items))
+        elif keyword == 'CALL' and add_labels_pattern.match(body):
+            add_labels = add_labels_pattern.match(body)
+            check_bound(add_labels.group(1))
+            clauses.append(('ADD LABELS', (add_labels.group(1), parse_expression(add_labels.group(2), literals, graph))))
+        elif keyword == 'YIELD' and clauses and clauses[-1][0] == 'ADD LABELS' and re.fullmatch(r'\w+', body):
+            bound.add(body) # the same node
+        elif keyword == 'WITH' and all(re.fullmatch(r'\w+', item) for item in split_top_level(body)):
+            continue # only passes variables along
+        elif keyword == 'RETURN' and body == pieces[-1].strip():
+            continue # the count some loads return
+        else:
+            raise NotCompilable(keyword + ' ' + body)
+    return clauses
+
+############# IN-MEMORY GRAPH #############
+def new_graph():
+    return {'nodes': [], 'labels': {}, 'indexes': {}, 'relationships': {}, 'merged_rows': 0, 'skipped_rows': 0}
+
+def graph_property(graph, binding, variable, name):
+    value = binding.get(variable)
+    if isinstance(value, dict): # the csv row
+        return value.get(name)
+    if value is None:
+        return None
+    return entity_properties(graph, value).get(name)
+
+def entity_properties(graph, entity):
+    if entity[0] == 'node':
+        return graph['nodes'][entity[1]]['properties']
+    return graph['relationships'][entity[1]][entity[2]]
+
+def label_index(graph, label, name):
+    key = (label, name)
+    if key not in graph['indexes']:
+        index = {}
+        for node_id in graph['labels'].get(label, ()):
+            value = graph['nodes'][node_id]['properties'].get(name)
+            if value is not None:
+                index.setdefault(value, set()).add(node_id)
+        graph['indexes'][key] = index
+    return graph['indexes'][key]
+
+def index_node(graph, node_id, labels, names):
+    node = graph['nodes'][node_id]
+    for (label, name), index in graph['indexes'].items():
+        if label in labels and name in names and node['properties'].get(name) is not None:
+            index.setdefault(node['properties'][name], set()).add(node_id)
+
+def unindex_property(graph, node_id, name):
+    node = graph['nodes'][node_id]
+    for (label, index_name), index in graph['indexes'].items():
+        if index_name == name and label in node['labels'] and node['properties'].get(name) in index:
+            index[node['properties'][name]].discard(node_id)
+
+def find_nodes(graph, label, properties):
+    if properties:
+        name, value = properties[0]
+        candidates = label_index(graph, label, name).get(value, ())
+    else:
+        candidates = graph['labels'].get(label, ())
+    return [node_id for node_id in sorted(candidates)
+            if all(graph['nodes'][node_id]['properties'].get(name) == value for name, value in properties)]
+
+def create_node(graph, label, properties):
+    node_id = len(graph['nodes'])
+    graph['nodes'].append({'labels': {label}, 'properties': dict(properties)})
+    graph['labels'].setdefault(label, set()).add(node_id)
+    index_node(graph, node_id, {label}, dict(properties))
+    return node_id
+
+def set_property(graph, entity, name, value):
+    if entity[0] == 'node':
+        unindex_property(graph, entity[1], name)
+    properties = entity_properties(graph, entity)
+    if value is None:
+        properties.pop(name, None)
+    else:
+        properties[name] = value
+        if entity[0] == 'node':
+            index_node(graph, entity[1], graph['nodes'][entity[1]]['labels'], {name})
+
+def add_label(graph, node_id, label):
+    node = graph['nodes'][node_id]
+    if label not in node['labels']:
+        node['labels'].add(label)
+        graph['labels'].setdefault(label, set()).add(node_id)
+        index_node(graph, node_id, {label}, node['properties'])
+
+def merge_relationship(graph, start, kind, end, properties, undirected):
+    for key in ((start, kind, end), (end, kind, start)) if undirected else ((start, kind, end),):
+        for position, existing in enumerate(graph['relationships'].get(key, ())):
+            if all(existing.get(name) == value for name, value in properties):
+                return ('relationship', key, position), False
+    key = (start, kind, end)
+    graph['relationships'].setdefault(key, []).append(dict(properties))
+    return ('relationship', key, len(graph['relationships'][key]) - 1), True
+
+############# RUN A COMPILED STATEMENT #############
+def evaluate_map(entries, binding):
+    return [(name, function(binding)) for name, function in entries]
+
+def run_match(graph, clause, bindings):
+    results = []
+    for binding in bindings:
+        partial = [binding]
+        for variable, label, properties in clause['patterns']:
+            expanded = []
+            for current in partial:
+                lookup = evaluate_map(properties, current)
+                # equality conditions on this variable narrow the lookup like an index seek
+                for operator, left, name, right, variables in clause['conditions']:
+                    if operator == '=' and left == variable and variables <= set(current) | {'line'}:
+                        lookup.append((name, right(current)))
+                if any(value is None for name, value in lookup):
+                    continue
+                for node_id in find_nodes(graph, label, lookup):
+                    expanded.append(dict(current, **{variable: ('node', node_id)}))
+            partial = expanded
+        for current in partial:
+            if all(condition_holds(graph, current, condition) for condition in clause['conditions']):
+                results.append(current)
+    return results
+
+def condition_holds(graph, binding, condition):
+    operator, left, name, right, variables = condition
+    value = graph_property(graph, binding, left, name)
+    other = right(binding)
+    if value is None or other is None:
+        return False
+    if operator == '=':
+        return value == other
+    if operator == '<>':
+        return value != other
+    if operator == 'IN':
+        return value in other
+    return isinstance(value, str) and isinstance(other, str) and other in value
+
+def run_clauses(graph, clauses, row):
+    bindings = [{'line': row}]
+    for keyword, clause in clauses:
+        if keyword == 'MATCH':
+            bindings = run_match(graph, clause, bindings)
+        elif keyword == 'MERGE NODE':
+            variable, label, properties = clause
+            merged = []
+            for binding in bindings:
+                lookup = evaluate_map(properties, binding)
+                if any(value is None for name, value in lookup):
+                    raise SkipRow()
+                found = find_nodes(graph, label, lookup)
+                if found:
+                    graph['merged_rows'] += 1
+                    merged.extend(dict(binding, **{variable: ('node', node_id), '__created': False}) for node_id in found)
+                else:
+                    merged.append(dict(binding, **{variable: ('node', create_node(graph, label, lookup)), '__created': True}))
+            bindings = merged
+        elif keyword == 'ADD LABELS':
+            variable, labels = clause
+            for binding in bindings:
+                for label in labels(binding):
+                    if label is not None:
+                        add_label(graph, binding[variable][1], label)
+        elif keyword == 'MERGE RELATIONSHIP':
+            start, variable, kind, properties, direction, end = clause
+            for binding in bindings:
+                lookup = evaluate_map(properties, binding)
+                if any(value is None for name, value in lookup):
+                    raise SkipRow()
+                first, second = (binding[end], binding[start]) if direction == '<' else (binding[start], binding[end])
+                relationship, created = merge_relationship(graph, first[1], kind, second[1], lookup, direction == '-')
+                binding['__created'] = created
+                if variable:
+                    binding[variable] = relationship
+        else:
+            for binding in bindings:
+                if keyword == 'ON CREATE SET' and not binding.get('__created') or keyword == 'ON MATCH SET' and binding.get('__created', True):
+                    continue
+                values = [(kind, variable, name, function(binding) if function else None) for kind, variable, name, function in clause]
+                for kind, variable, name, value in values:
+                    if kind == 'label':
+                        add_label(graph, binding[variable][1], name)
+                    else:
+                        set_property(graph, binding[variable], name, value)
+
+# LOAD CSV WITH HEADERS gives null for empty and missing fields
+def csv_rows(path, file_name):
+    with open(os.path.join(path, file_name), 'r', newline='', encoding='utf-8-sig') as f:
+        for row in csv.DictReader(f):
+            yield {column: (value if value != '' else None) for column, value in row.items()}
+
+# returns the clauses, or raises NotCompilable
+def compile_query(query, graph):
+    iterate = iterate_pattern.search(query)
+    if iterate:
+        file_names = file_pattern.findall(iterate.group(1))
+        if not file_names or not re.fullmatch(r"\s*LOAD CSV WITH HEADERS\s+FROM\s+'file:///[^']+'\s+AS\s+line\s+RETURN\s+line\s*", iterate.group(1), re.IGNORECASE):
+            raise NotCompilable('iterate statement')
+        return compile_statement(iterate.group(2), graph)
+    return compile_statement(query, graph)
+
+def run_compiled(graph, query, clauses, path):
+    iterate = iterate_pattern.search(query)
+    rows = csv_rows(path, file_pattern.findall(iterate.group(1))[0]) if iterate else [{}]
+    for row in rows:
+        try:
+            run_clauses(graph, clauses, row)
+        except SkipRow:
+            graph['skipped_rows'] += 1
+
+############# SPLIT QUERY_LIST #############
+# returns (graph, compiled indexes, queries left to run after the import: schema first, then the rest in order)
+def compile_import(query_list, path, on_done=None):
+    graph = new_graph()
+    nodes = build_dependency_graph(query_list)
+    deferred = {index for index, query in enumerate(query_list) if schema_pattern.search(query) or query.strip() in wipe_queries}
+    compiled = set()
+    not_compiled = set()
+    for node in nodes:
+        index = node['index']
+        if index in deferred:
+            continue
+        reason = None
+        try:
+            if node['depends_on'] - deferred - compiled:
+                raise NotCompilable('depends on a query that runs after the import')
+            clauses = compile_query(query_list[index], graph)
+            run_compiled(graph, query_list[index], clauses, path)
+            compiled.add(index)
+        except NotCompilable as e:
+            reason = str(e)
+            not_compiled.add(index)
+        if on_done:
+            on_done(index, reason)
+    remaining = [query for index, query in enumerate(query_list) if schema_pattern.search(query) and query.strip() not in wipe_queries]
+    remaining += [query_list[index] for index in sorted(not_compiled)]
+    return graph, compiled, remaining
+
+############# ADMIN IMPORT FILES #############
+def type_signature(properties):
+    return tuple(sorted((name, property_types[type(value)]) for name, value in properties.items()))
+
+def format_value(value):
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+# one file per label set and property types, one per relationship type and property types
+# returns (node files, relationship files)
+def write_import_files(graph, folder):
+    if os.path.exists(folder):
+        shutil.rmtree(folder)
+    os.makedirs(folder)
+    node_groups = {}
+    for node_id, node in enumerate(graph['nodes']):
+        node_groups.setdefault((tuple(sorted(node['labels'])), type_signature(node['properties'])), []).append(node_id)
+    relationship_groups = {}
+    for (start, kind, end), relationships in graph['relationships'].items():
+        for properties in relationships:
+            relationship_groups.setdefault((kind, type_signature(properties)), []).append((start, end, properties))
+    node_files = []
+    for number, ((labels, signature), node_ids) in enumerate(sorted(node_groups.items())):
+        file_path = os.path.join(folder, 'nodes_' + str(number) + '_' + '_'.join(labels) + '.csv')
+        with open(file_path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow([':ID'] + [name + ':' + kind for name, kind in signature] + [':LABEL'])
+            for node_id in node_ids:
+                properties = graph['nodes'][node_id]['properties']
+                writer.writerow([node_id] + [format_value(properties[name]) for name, kind in signature] + [';'.join(labels)])
+        node_files.append(file_path)
+    relationship_files = []
+    for number, ((kind, signature), relationships) in enumerate(sorted(relationship_groups.items())):
+        file_path = os.path.join(folder, 'relationships_' + str(number) + '_' + kind + '.csv')
+        with open(file_path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow([':START_ID', ':END_ID', ':TYPE'] + [name + ':' + property_kind for name, property_kind in signature])
+            for start, end, properties in relationships:
+                writer.writerow([start, end, kind] + [format_value(properties[name]) for name, property_kind in signature])
+        relationship_files.append(file_path)
+    return node_files, relationship_files
+
+############# NEO4J-ADMIN IMPORT #############
+def neo4j_command(neo4j_home, *arguments):
+    command = [os.path.join(neo4j_home, 'bin', arguments[0])] + list(arguments[1:])
+    return subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True)
+
+# stops the DBMS, replaces the database with the import and starts it again
+# the old store is moved aside, not deleted; returns the admin tool's output and the moved folders,
+# raises RuntimeError when a step fails
+def run_admin_import(neo4j_home, node_files, relationship_files, database=default_database):
+    stopped = neo4j_command(neo4j_home, 'neo4j', 'stop')
+    if stopped.returncode != 0:
+        raise RuntimeError('Could not stop neo4j:\n' + stopped.stdout)
+    moved = []
+    suffix = '.before-import-' + time.strftime('%Y%m%d-%H%M%S')
+    for folder in ('databases', 'transactions'):
+        database_path = os.path.join(neo4j_home, 'data', folder, database)
+        if os.path.exists(database_path):
+            shutil.move(database_path, database_path + suffix)
+            moved.append(database_path + suffix)
+    arguments = ['neo4j-admin', 'import', '--database=' + database, '--id-type=INTEGER',
+                 '--multiline-fields=true', '--ignore-empty-strings=true']
+    arguments += ['--nodes=' + file_path for file_path in node_files]
+    arguments += ['--relationships=' + file_path for file_path in relationship_files]
+    imported = neo4j_command(neo4j_home, *arguments)
+    if imported.returncode != 0:
+        raise RuntimeError('neo4j-admin import failed, the old database is in ' + ', '.join(moved or ['(none)']) + ':\n' + imported.stdout)
+    started = neo4j_command(neo4j_home, 'neo4j', 'start')
+    if started.returncode != 0:
+        raise RuntimeError('Could not start neo4j:\n' + started.stdout)
+    return imported.stdout, moved
+
+# connect(): returns a graph or raises while the database is still starting
+def wait_for_database(connect, timeout=start_timeout):
+    deadline = time.time() + timeout
+    while True:
+        try:
+            graph = connect()
+            graph.run('RETURN 1').evaluate()
+            return graph
+        except Exception:
+            if time.time() > deadline:
+                raise
+            time.sleep(2)
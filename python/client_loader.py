@@ -0,0 +1,227 @@
+############# CLIENT-SIDE UNWIND $rows LOADER #############
+# Runs the apoc.periodic.iterate LOAD CSV queries from query_list without the server reading
+# file:///... : the csv is streamed here, and the query's own action statement (the same MERGE
+# logic) is sent as UNWIND $rows AS line <action> in batches of the query's batchSize.
+# toInteger/toFloat/toLower/toString(line.Column) are worked out once per row in python and the
+# action reads the typed value from line.`toFloat(Column)` instead, so no per-row string work is
+# left on the database. Only the columns the action reads are sent.
+# Batches are committed one managed transaction each (database_driver.write_statements, with its
+# retries); parallel:true loads send up to parallel_batches batches at once.
+# Loads that read the same file share one scan (shared_scan_groups), when the queries between them
+# don't have to run first: each batch goes to every one of their actions in list order, in the
+# same transaction. The default server loader (LOAD CSV) still reads the file once per load.
+# Results look like apoc's (batches, total, committedOperations, failedBatches, errorMessages...)
+# so query_metrics and the scheduler treat both loaders the same.
+
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import time
+import csv
+import os
+import re
+
+from import_validation import file_pattern, line_column_pattern
+from query_plans import iterate_pattern
+from query_scheduler import query_labels, build_dependency_graph
+from batch_tuner import query_config
+from database_driver import write_statements, run_pooled_query
+
+parallel_batches = 4 # batches in flight for parallel:true loads
+conversion_pattern = re.compile(r'\b(toInteger|toFloat|toLower|toString)\(\s*line\.(?:`([^`]+)`|(\w+))\s*\)')
+merge_map_pattern = re.compile(r'MERGE\s*\(\s*\w*\s*:\s*`?(\w+)`?\s*\{([^{}]*)\}')
+
+############# TYPE CONVERSIONS, AS CYPHER DOES THEM #############
+def to_integer(value):
+    try:
+        return int(value)
+    except ValueError:
+        try:
+            return int(float(value)) # toInteger('3.7') is 3
+        except ValueError:
+            return None
+
+def to_float(value):
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+conversions = {'toInteger': to_integer,
+               'toFloat': to_float,
+               'toLower': lambda value: value.lower(),
+               'toString': lambda value: value}
+
+############# REWRITE ONE LOAD #############
+# returns None for queries that aren't a LOAD CSV under apoc.periodic.iterate, otherwise
+# {'file_name', 'statements', 'columns', 'converted', 'batch_size', 'parallel'}
+# converted is [(key in the row, function name, column)]
+def client_load_plan(query):
+    iterate = iterate_pattern.search(query)
+    file_names = file_pattern.findall(query)
+    config = query_config(query)
+    if not iterate or not file_names or config is None or 'LOAD CSV' not in iterate.group(1).upper():
+        return None
+    converted = {}
+    def typed_column(match):
+        column = match.group(2) or match.group(3)
+        key = match.group(1) + '(' + column + ')'
+        converted[key] = (key, match.group(1), column)
+        return 'line.`' + key + '`'
+    action = conversion_pattern.sub(typed_column, iterate.group(2))
+    columns = set(quoted or bare for quoted, bare in line_column_pattern.findall(action)) - set(converted)
+    return {'file_name': file_names[0],
+            'statements': ['UNWIND $rows AS line\n' + action],
+            'columns': sorted(columns),
+            'converted': sorted(converted.values()),
+            'batch_size': int(config.get('batchSize', 1000)),
+            'parallel': config.get('parallel') == 'true'}
+
+############# SHARED SCANS #############
+# {label: [(property, expression)]} of the nodes a statement MERGEs by a property map
+def merged_keys(statement):
+    keys = {}
+    for label, entries in merge_map_pattern.findall(statement):
+        for entry in entries.split(','):
+            if ':' in entry:
+                name, value = entry.split(':', 1)
+                keys.setdefault(label, []).append((name.strip(), ' '.join(value.split())))
+    return keys
+
+# a later action may only look up what an earlier one wrote by the key the same row merged it on,
+# the node of any other row could be in a batch that hasn't been sent yet
+def same_row_lookups(earlier, later):
+    keys = merged_keys(earlier)
+    text = ' '.join(later.split())
+    for label in query_labels(later)[0] & query_labels(earlier)[1]:
+        if not any(name + ': ' + value in text or name + ' = ' + value in text for name, value in keys.get(label, [])):
+            return False
+    return True
+
+# returns [[index, ...]] of loads on the same file that can share a scan, skipped indexes (finished by
+# an earlier run) aren't loaded again
+# a load joins the group of an earlier one on its file when it depends on none of the queries in
+# between (query_scheduler's dependency graph), so running it with the first of the group changes nothing
+def shared_scan_groups(query_list, skip=()):
+    nodes = build_dependency_graph(query_list)
+    groups = []
+    current = {} # file name -> [(index, plan)]
+    for index, query in enumerate(query_list):
+        plan = None if index in skip else client_load_plan(query)
+        if not plan:
+            continue
+        group = current.get(plan['file_name'])
+        if group:
+            between = set(range(group[0][0] + 1, index)) - set(position for position, earlier in group)
+            if not nodes[index]['depends_on'] & between \
+                    and all(same_row_lookups(earlier['statements'][0], plan['statements'][0]) for position, earlier in group):
+                group.append((index, plan))
+                continue
+            if len(group) > 1:
+                groups.append([position for position, earlier in group])
+        current[plan['file_name']] = [(index, plan)]
+    groups.extend([position for position, earlier in group] for group in current.values() if len(group) > 1)
+    return sorted(groups)
+
+# one plan that sends every batch to all the plans' statements
+def shared_load_plan(plans):
+    return {'file_name': plans[0]['file_name'],
+            'statements': [statement for plan in plans for statement in plan['statements']],
+            'columns': sorted(set().union(*(plan['columns'] for plan in plans))),
+            'converted': sorted(set().union(*(plan['converted'] for plan in plans))),
+            'batch_size': min(plan['batch_size'] for plan in plans),
+            'parallel': all(plan['parallel'] for plan in plans)}
+
+############# STREAM THE FILE #############
+# LOAD CSV WITH HEADERS gives null for empty and missing fields
+def typed_rows(path, plan):
+    with open(os.path.join(path, plan['file_name']), 'r', newline='', encoding='utf-8-sig') as f:
+        for row in csv.DictReader(f):
+            line = {}
+            for column in plan['columns']:
+                value = row.get(column)
+                line[column] = value if value != '' else None
+            for key, function, column in plan['converted']:
+                value = row.get(column)
+                line[key] = conversions[function](value) if value not in (None, '') else None
+            yield line
+
+def batches(rows, batch_size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+############# LOAD #############
+# returns counters named like apoc.periodic.iterate's
+def client_load(driver, path, plan):
+    load_time_start = time.perf_counter()
+    counters = {'batches': 0, 'total': 0, 'committedOperations': 0, 'failedOperations': 0,
+                'failedBatches': 0, 'retries': 0, 'errorMessages': {}}
+    def send(batch):
+        write_statements(driver, plan['statements'], {'rows': batch})
+        return len(batch)
+    def count(batch_size, error=None):
+        counters['batches'] += 1
+        counters['total'] += batch_size
+        if error is None:
+            counters['committedOperations'] += batch_size
+        else:
+            counters['failedBatches'] += 1
+            counters['failedOperations'] += batch_size
+            counters['errorMessages'][error] = counters['errorMessages'].get(error, 0) + 1
+    workers = parallel_batches if plan['parallel'] else 1
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        running = {}
+        for batch in batches(typed_rows(path, plan), plan['batch_size']):
+            # keep at most workers batches in memory
+            if len(running) >= workers:
+                done, pending = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    count(running.pop(future), None if future.exception() is None else repr(future.exception()))
+            running[pool.submit(send, batch)] = len(batch)
+        for future in list(running):
+            count(running.pop(future), None if future.exception() is None else repr(future.exception()))
+    counters['timeTaken'] = int(time.perf_counter() - load_time_start)
+    counters['operations'] = {'total': counters['total'], 'committed': counters['committedOperations'],
+                              'failed': counters['failedOperations'], 'errors': counters['errorMessages']}
+    return counters
+
+def load_outcome(driver, index, path, plan):
+    query_time_start = time.perf_counter()
+    outcome = {'index': index, 'ok': True, 'error': None, 'result': None}
+    try:
+        outcome['result'] = client_load(driver, path, plan)
+        if outcome['result']['failedBatches']:
+            outcome['ok'] = False
+            outcome['error'] = str(outcome['result']['errorMessages'])
+    except Exception as e:
+        outcome['ok'] = False
+        outcome['error'] = repr(e)
+    outcome['seconds'] = time.perf_counter() - query_time_start
+    return outcome
+
+# a run(driver, index, query) for query_scheduler.run_scheduled: LOAD CSV loads go through
+# client_load, everything else through run_pooled_query
+# groups come from shared_scan_groups(query_list) and have to be passed to run_scheduled as well,
+# so the rest of a group is only started after its first query, which loads all of them
+def client_runner(path, query_list=(), groups=()):
+    leaders = {group[0]: group for group in groups}
+    shared_outcomes = {}
+    def run(driver, index, query):
+        if index in shared_outcomes:
+            return shared_outcomes.pop(index)
+        plan = client_load_plan(query)
+        if plan is None:
+            return run_pooled_query(driver, index, query)
+        if index not in leaders:
+            return load_outcome(driver, index, path, plan)
+        group = leaders[index]
+        outcome = load_outcome(driver, index, path, shared_load_plan([client_load_plan(query_list[member]) for member in group]))
+        for member in group[1:]:
+            shared_outcomes[member] = dict(outcome, index=member, seconds=0.0,
+                                           result=dict(outcome['result'] or {}, sharedScan=index + 1))
+        return outcome
+    return run
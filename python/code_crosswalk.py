@@ -0,0 +1,185 @@
+############# SOC AND OPM CODE RESOLUTION FOR THE CROSSWALK LOADS #############
+# ncc_crosswalk.csv links OPM series to 2010 SOC codes, and the codes come in several shapes:
+# detailed '17-2011', broad and minor groups ending in zeros ('17-2070', '29-9000'), wildcards
+# ('17-21YY', '43-9XXX', '15-20XX'), and a few that Excel turned into dates ('Nov-21').
+# The loads used to test occ.onet_soc_code CONTAINS(code) on every Occupation/Workrole for every
+# row, which scans the labels and misses every group and wildcard code.
+# Here each code is normalized to a 6-digit pattern (NN-NNNN, ? for any digit) and expanded
+# against the onet_soc_codes the build creates, and OPM series are compared by number
+# ('GS-0855-0' and '855' are series 855). ncc_crosswalk_codes.csv gets one row per exact
+# (onet_soc_code, OPMSeries) pair and Employees_2020-05-27_opm.csv one per (UUPIC, OPMSeries),
+# so the loads join on the occ/workrolecode/opm uniqueness constraints.
+# Pairs only the patches below give have source 'patch': they link Occupations, as the hand-written
+# patch queries did, and the Workrole load leaves them out.
+# Codes that expand to nothing (the dates, 'Unknown') are reported.
+#
+#   python code_crosswalk.py [--import-path ...]    writes the pair files and lists what didn't resolve
+
+import argparse
+import json
+import csv
+import os
+import re
+
+crosswalk_file_name = 'ncc_crosswalk.csv'
+employee_file_name = 'Employees_2020-05-27.csv'
+# files whose code columns hold every Occupation/Workrole onet_soc_code
+occupation_code_columns = {'occupationdata.csv': 'O*NET-SOC Code',
+                           'SOC_Level_With_Detailed.csv': 'SOCLevelCode',
+                           'SOC_Level_Without_Detailed.csv': 'SOCLevelCode',
+                           'DetailedOccupation.csv': 'SOCDetailCode'}
+example_limit = 10 # unresolved codes kept per file in the report
+
+# links the crosswalk doesn't have, for Occupations only: (SOC code or pattern, OPM series number, census code, census title)
+opm_crosswalk_patches = [
+    ('17-2071.00', 855, '1410', 'ELECTRICAL & ELECTRONIC ENGINEERS'),
+    ('17-2072.00', 855, '1410', 'ELECTRICAL & ELECTRONIC ENGINEERS'),
+    ('17-206X', 854, '1400', 'COMPUTER HARDWARE ENGINEERS'),
+    ('15-1111', 1550, '1005', 'COMPUTER & INFORMATION RESEARCH SCIENTISTS'),
+    ('15-1XXX', 2210, '1050', 'COMPUTER SUPPORT SPECIALISTS')]
+
+soc_pattern = re.compile(r'^(\d{2})-([0-9XY]{4})$')
+number_pattern = re.compile(r'\d+')
+
+def crosswalk_pairs_file_name():
+    return crosswalk_file_name.replace('.csv', '_codes.csv')
+
+def employee_series_file_name():
+    return employee_file_name.replace('.csv', '_opm.csv')
+
+# columns each source file needs, checked by import_validation before anything is resolved
+def source_columns():
+    columns = {file_name: {column} for file_name, column in occupation_code_columns.items()}
+    columns[crosswalk_file_name] = {'2010 SOC CODE', 'OPMSeries', '2010 EEO TABULATION (CENSUS) CODE',
+                                    '2010 EEO TABULATION (CENSUS) OCCUPATION TITLE'}
+    columns[employee_file_name] = {'UUPIC', 'Occupational Series'}
+    return columns
+
+def derived_file_names():
+    return [crosswalk_pairs_file_name(), employee_series_file_name()]
+
+############# NORMALIZATION #############
+# '17-21YY' -> '17-21??', '17-2070' -> '17-207?', '29-9000' -> '29-9???',
+# a full onet_soc_code ('17-2071.00') is kept as is, None when it isn't a SOC code
+def normalize_soc(code):
+    code = code.strip()
+    if re.fullmatch(r'\d{2}-\d{4}\.\d{2}', code):
+        return code
+    match = soc_pattern.match(code)
+    if not match:
+        return None
+    digits = re.sub('[XY]', '?', match.group(2))
+    # a detailed code never ends in 0, trailing zeros are a broad or minor group
+    digits = digits.rstrip('0').ljust(4, '?')
+    return match.group(1) + '-' + digits
+
+# first number in the series, None if there is none
+def series_number(series):
+    match = number_pattern.search(series or '')
+    return int(match.group(0)) if match else None
+
+############# RESOLUTION TABLES #############
+def known_soc_codes(path):
+    codes = set()
+    for file_name, column in occupation_code_columns.items():
+        with open(os.path.join(path, file_name), 'r', newline='', encoding='utf-8-sig') as f:
+            codes.update(row[column] for row in csv.DictReader(f) if row.get(column))
+    return codes
+
+# {6-digit code: [onet_soc_code]}
+def codes_by_prefix(codes):
+    prefixes = {}
+    for code in sorted(codes):
+        prefixes.setdefault(code[:7], []).append(code)
+    return prefixes
+
+# onet_soc_codes a normalized pattern stands for
+def expand_soc(pattern, prefixes):
+    if pattern is None:
+        return []
+    if '.' in pattern:
+        return [pattern] if pattern in prefixes.get(pattern[:7], []) else []
+    if '?' not in pattern:
+        return prefixes.get(pattern, [])
+    matcher = re.compile(pattern.replace('?', r'\d'))
+    return [code for prefix in sorted(prefixes) if matcher.fullmatch(prefix) for code in prefixes[prefix]]
+
+############# WRITE THE PAIR FILES #############
+def resolve_crosswalk(path, prefixes):
+    result = {'rows': 0, 'resolved': 0, 'unresolved': 0, 'pairs': 0, 'examples': []}
+    pairs = {} # (onet_soc_code, OPMSeries, census code, census title): source, one IN_OPM_Series each
+    series_by_number = {}
+    with open(os.path.join(path, crosswalk_file_name), 'r', newline='', encoding='utf-8-sig') as f:
+        for row in csv.DictReader(f):
+            result['rows'] += 1
+            series_by_number.setdefault(series_number(row['OPMSeries']), set()).add(row['OPMSeries'])
+            codes = expand_soc(normalize_soc(row['2010 SOC CODE']), prefixes)
+            if not codes:
+                result['unresolved'] += 1
+                if len(result['examples']) < example_limit and row['2010 SOC CODE'] not in result['examples']:
+                    result['examples'].append(row['2010 SOC CODE'])
+                continue
+            result['resolved'] += 1
+            for code in codes:
+                pairs[(code, row['OPMSeries'], row['2010 EEO TABULATION (CENSUS) CODE'],
+                       row['2010 EEO TABULATION (CENSUS) OCCUPATION TITLE'])] = 'crosswalk'
+    for pattern, number, census_code, census_title in opm_crosswalk_patches:
+        for code in expand_soc(normalize_soc(pattern), prefixes):
+            for series in series_by_number.get(number, ()):
+                pairs.setdefault((code, series, census_code, census_title), 'patch')
+    with open(os.path.join(path, crosswalk_pairs_file_name()), 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['onet_soc_code', 'OPMSeries', 'census_code', 'census_title', 'source'])
+        writer.writerows(pair + (source,) for pair, source in sorted(pairs.items()))
+    result['pairs'] = len(pairs)
+    return result, series_by_number
+
+def resolve_employee_series(path, series_by_number):
+    result = {'rows': 0, 'resolved': 0, 'unresolved': 0, 'pairs': 0, 'examples': []}
+    with open(os.path.join(path, employee_file_name), 'r', newline='', encoding='utf-8-sig') as source, \
+            open(os.path.join(path, employee_series_file_name()), 'w', newline='', encoding='utf-8') as target:
+        writer = csv.writer(target)
+        writer.writerow(['UUPIC', 'OPMSeries'])
+        for row in csv.DictReader(source):
+            result['rows'] += 1
+            series_list = sorted(series_by_number.get(series_number(row.get('Occupational Series')), ()))
+            if not series_list:
+                result['unresolved'] += 1
+                if len(result['examples']) < example_limit and row.get('Occupational Series') not in result['examples']:
+                    result['examples'].append(row.get('Occupational Series'))
+                continue
+            result['resolved'] += 1
+            for series in series_list:
+                writer.writerow([row['UUPIC'], series])
+                result['pairs'] += 1
+    return result
+
+# writes both pair files and a json report, returns the report
+# report = {'ok': no unresolved rows, 'files': {file_name: result}}
+def resolve_crosswalk_codes(path, report_path=None):
+    crosswalk, series_by_number = resolve_crosswalk(path, codes_by_prefix(known_soc_codes(path)))
+    employees = resolve_employee_series(path, series_by_number)
+    report = {'ok': not crosswalk['unresolved'] and not employees['unresolved'],
+              'files': {crosswalk_file_name: crosswalk, employee_file_name: employees}}
+    if report_path:
+        with open(report_path, 'w') as report_file:
+            json.dump(report, report_file, indent=2)
+    return report
+
+def crosswalk_resolution_lines(report):
+    lines = []
+    for file_name, result in report['files'].items():
+        lines.append(file_name + ': ' + str(result['resolved']) + ' of ' + str(result['rows']) + ' rows resolved to '
+                     + str(result['pairs']) + ' code pairs, ' + str(result['unresolved']) + ' unresolved')
+        for example in result['examples']:
+            lines.append('    unresolved: ' + str(example))
+    return lines
+
+############# COMMAND LINE #############
+if __name__ == '__main__':
+    assumed_path = os.path.abspath(os.path.join(os.path.dirname( __file__ ), '..', 'import'))
+    parser = argparse.ArgumentParser(description='Expand the SOC/OPM crosswalk and employee series into exact code pairs.')
+    parser.add_argument('--import-path', default=os.environ.get('ONET_IMPORT_PATH', assumed_path), help='neo4j import folder (ONET_IMPORT_PATH)')
+    arguments = parser.parse_args()
+    for line in crosswalk_resolution_lines(resolve_crosswalk_codes(arguments.import_path)):
+        print(line)
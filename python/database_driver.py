@@ -0,0 +1,138 @@
+############# POOLED BOLT DRIVER WITH MANAGED TRANSACTIONS #############
+# Query work that runs on several threads goes through one official neo4j driver instead of the
+# py2neo Graph: the driver keeps a pool of bolt connections, each thread borrows its own session,
+# and neo4j:// uris route reads and writes across a cluster.
+# write_query/read_query run in managed transactions, which the driver retries with exponential
+# backoff on transient errors (deadlocks, leader switches, lost connections) for up to
+# max_transaction_retry_time. apoc.periodic.iterate catches deadlocks inside its own batches and
+# only reports them in errorMessages, so every load is sent with retries in its config (unless it
+# sets its own): apoc reruns a failed batch in a new transaction, which is safe for any load.
+# A load whose batches still fail, all with deadlocks, is rerun here with the same backoff. Its
+# batches commit in their own transactions, so nothing is rolled back and the rerun loads the whole
+# file again over them: only loads that get the same graph from that (MERGEs, ON CREATE SET,
+# values that don't come from the row) are rerun, the others run once in an auto-commit
+# transaction. The client loader's batches are real transactions and are retried one batch at a time.
+
+from concurrent.futures import ThreadPoolExecutor
+import random
+import time
+import re
+
+from neo4j import GraphDatabase
+
+from batch_tuner import with_retries
+from neo4j.exceptions import TransientError, ServiceUnavailable, SessionExpired
+
+pool_size = 16 # bolt connections, at least query_workers plus the readers
+max_transaction_retry_time = 60.0 # seconds the driver keeps retrying one transaction
+load_retries = 3 # reruns of a load whose failed batches were all deadlocks
+batch_retries = 10 # apoc.periodic.iterate retries of one failed batch, as the hand-written parallel loads
+backoff_seconds = 1.0 # first wait between reruns, doubled each time
+transient_messages = ('DeadlockDetected', 'LockClient', 'TransientError', 'ForsetiClient')
+rerun_clause_pattern = re.compile(r'(?<!\.)\b(ON\s+CREATE\s+SET|ON\s+MATCH\s+SET|SET|CREATE|DETACH\s+DELETE|DELETE|REMOVE|MERGE|MATCH|WITH|WHERE|RETURN|UNWIND|CALL)\b', re.IGNORECASE)
+nondeterministic_pattern = re.compile(r'\b(rand|randomUUID|timestamp|datetime|localdatetime|apoc\.create\.uuid|apoc\.coll\.shuffle|apoc\.coll\.randomItems?)\s*\(', re.IGNORECASE)
+property_assignment_pattern = re.compile(r'\w+\.\w+\s*(?:\+=|=)\s*(.*)', re.DOTALL)
+
+class FailedBatches(Exception):
+    def __init__(self, result):
+        self.result = result
+        self.error_messages = result.get('errorMessages') or result['operations'].get('errors') or {}
+        self.transient = all(any(name in message for name in transient_messages) for message in self.error_messages)
+        super().__init__(str(self.error_messages or 'failed batches'))
+
+############# RERUNNABLE LOADS #############
+# a periodic iterate load can be rerun over its committed batches when the rerun leaves the same
+# graph: no CREATE or DELETE, and what a plain SET writes doesn't come from the row (several rows
+# may MERGE the same relationship, and which row's value is left depends on batch order) or a
+# random/clock function
+def rerunnable(query):
+    pieces = rerun_clause_pattern.split(query)
+    for keyword, body in zip(pieces[1::2], pieces[2::2]):
+        keyword = ' '.join(keyword.upper().split())
+        if keyword in ('CREATE', 'DELETE', 'DETACH DELETE') and not re.match(r'\s*(CONSTRAINT|INDEX)\b', body, re.IGNORECASE):
+            return False
+        if keyword in ('SET', 'ON MATCH SET'):
+            for item in body.split(','):
+                assignment = property_assignment_pattern.match(item.strip())
+                if assignment and ('line.' in assignment.group(1) or nondeterministic_pattern.search(assignment.group(1))):
+                    return False
+    return not nondeterministic_pattern.search(query)
+
+############# POOL #############
+# uri is bolt://host:port, or neo4j://host:port for routing
+def open_pool(uri, user, pswd, size=pool_size):
+    return GraphDatabase.driver(uri, auth=(user, pswd), max_connection_pool_size=size,
+                                max_transaction_retry_time=max_transaction_retry_time)
+
+def close_pool(driver):
+    driver.close()
+
+############# MANAGED TRANSACTIONS #############
+# apoc.periodic.iterate reports failed batches in 'operations'
+def checked(result):
+    operations = result[0].get('operations') if result else None
+    if operations and operations.get('failed', 0) > 0:
+        raise FailedBatches(result[0])
+    return result
+
+# records are consumed inside the transaction, as dicts
+def transaction_work(query, parameters):
+    def work(tx):
+        return checked([record.data() for record in tx.run(query, parameters or {})])
+    return work
+
+def write_query(driver, query, parameters=None, retries=load_retries):
+    query = with_retries(query, batch_retries)
+    if 'apoc.periodic.iterate' in query and not rerunnable(query):
+        # a managed transaction would be retried by the driver as well
+        with driver.session() as session:
+            return checked([record.data() for record in session.run(query, parameters or {})])
+    return write_work(driver, transaction_work(query, parameters), retries)
+
+# several statements in one transaction, in order, with the same parameters
+# returns the records of each statement
+def write_statements(driver, queries, parameters=None, retries=load_retries):
+    works = [transaction_work(query, parameters) for query in queries]
+    return write_work(driver, lambda tx: [work(tx) for work in works], retries)
+
+def write_work(driver, work, retries=load_retries):
+    for attempt in range(retries + 1):
+        try:
+            with driver.session() as session:
+                return session.write_transaction(work)
+        except FailedBatches as e:
+            if not e.transient or attempt == retries:
+                raise
+        except (TransientError, ServiceUnavailable, SessionExpired):
+            if attempt == retries:
+                raise # the driver has already retried for max_transaction_retry_time
+        time.sleep(backoff_seconds * 2 ** attempt * (1 + random.random() / 2))
+
+def read_query(driver, query, parameters=None):
+    with driver.session() as session:
+        return session.read_transaction(transaction_work(query, parameters))
+
+# independent reads on concurrent sessions, results in the order of queries
+# queries is a list of query strings or (query, parameters)
+def read_many(driver, queries, workers=4):
+    queries = [(query, None) if isinstance(query, str) else query for query in queries]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(lambda query: read_query(driver, *query), queries))
+
+############# ONE SCHEDULED QUERY #############
+# same outcome as query_scheduler.run_query, for run_scheduled(driver, ..., run=run_pooled_query)
+def run_pooled_query(driver, index, query):
+    query_time_start = time.perf_counter()
+    outcome = {'index': index, 'ok': True, 'error': None, 'result': None}
+    try:
+        result = write_query(driver, query)
+        outcome['result'] = result[0] if result else None
+    except FailedBatches as e:
+        outcome['ok'] = False
+        outcome['error'] = str(e)
+        outcome['result'] = e.result
+    except Exception as e:
+        outcome['ok'] = False
+        outcome['error'] = repr(e)
+    outcome['seconds'] = time.perf_counter() - query_time_start
+    return outcome
@@ -53,22 +53,31 @@
     # If you don't have old files in your import folder, it'll just use the new files 
 
 # Now ready to run the script!
+# Without arguments it asks for the details in a gui window
+# To run headless (e.g. from cron), give the install choice and connection on the command line or in the environment:
+    # python database_update_script.py --mode fresh --password secret --reporter jsonl
+    # NEO4J_HOST, NEO4J_PORT, NEO4J_USER, NEO4J_PASSWORD, ONET_IMPORT_PATH, ONET_TEXT_RELEASE, ONET_BUILD_MODE, ONET_REPORTER, ONET_LOADER
+    # --loader client sends the csvs from this machine instead of the server reading its import folder
+    # --mode bulk --neo4j-home <neo4j folder> --force does a fresh install through neo4j-admin import (stops and restarts neo4j,
+    # moves the old database aside under data/databases/neo4j.before-import-<time>)
+    # python database_update_script.py --help lists them all
 # Make sure to deactivate venv after running is complete
 # Can change pyenv global back to 3.8.3 or other version after script is ran
 
 #BEFORE YOU UPDATE AN EXISTING DATABASE
 #CLONE THE DATABASE TO HAVE A BACKUP- JUST IN CASE :)
 
-from bs4 import BeautifulSoup
 import requests
 import re
 import os
 import sys
 from py2neo import Graph
-import PySimpleGUI as gui
+try:
+    import PySimpleGUI as gui # only needed for the optional gui front end
+except ImportError:
+    gui = None
+import argparse
 import time
-import xlrd
-import csv
 import pandas as pd
 from itertools import chain
 from nltk.tokenize import sent_tokenize
@@ -82,6 +91,68 @@ import nltk.data
 from nltk.stem import PorterStemmer
 from scipy import spatial
 import multiprocessing
+from onet_downloads import download_needed_files, record_conversion, manifest_file_name
+from xlsx_conversion import convert_workbooks, conversion_summary
+from onet_text_release import ingest_text_release, release_file_names
+from import_validation import validate_import_folder
+from snapshot_store import save_release
+from query_scheduler import build_dependency_graph, query_stages, run_scheduled, query_workers
+from build_checkpoint import checkpoint_file_name, load_checkpoint, query_keys, resumable_queries, record_completion, clear_checkpoint, schema_in_place
+from progress_reporter import make_reporter, reporter_kinds
+from query_metrics import new_run_id, run_metrics_path, metrics_record, append_record
+from batch_tuner import batch_profile_file_name, load_batch_profile, apply_batch_profile
+from database_driver import open_pool, close_pool, read_query, read_many, run_pooled_query
+from client_loader import client_runner, shared_scan_groups
+from bulk_import import bulk_folder_name, compile_import, write_import_files, run_admin_import, wait_for_database
+from index_advisor import advise_indexes, with_advised_indexes, database_indexes, without_existing_indexes
+from update_plans import alternate_title_key
+from employee_elements import resolve_employee_elements, resolution_lines
+from employee_elements import source_columns as employee_source_columns, derived_file_names as employee_derived_files
+from code_crosswalk import resolve_crosswalk_codes, crosswalk_resolution_lines
+from code_crosswalk import source_columns as crosswalk_source_columns, derived_file_names as crosswalk_derived_files
+from element_labels import element_label_query, resolve_element_labels, label_lines
+from element_labels import source_columns as label_source_columns, derived_file_names as label_derived_files
+
+# list of files used in script, used to filter out unnecessary files
+files_used = ['occupationdata.csv',
+    'contentmodelreference.csv',
+    'content_model_relationships.csv',
+    'SOCMajorGroup.csv',
+    'SOC_Level_With_Detailed.csv',
+    'SOC_Level_Without_Detailed.csv',
+    'DetailedOccupation.csv',
+    'scalesreference.csv',
+    'abilities.csv',
+    'alternatetitles.csv',
+    'iwareference.csv',
+    'dwareference.csv',
+    'educationtrainingandexperience.csv',
+    'interests.csv',
+    'jobzonereference.csv',
+    'jobzones.csv',
+    'knowledge.csv',
+    'skills.csv',
+    'taskstatements.csv',
+    'taskratings.csv',
+    'taskstodwas.csv',
+    'unspscreference.csv',
+    'technologyskills.csv',
+    'toolsused.csv',
+    'workactivities.csv',
+    'workstyles.csv',
+    'ncc_crosswalk.csv',
+    'Employees_2020-05-28.csv',
+    'Employees_2020-05-27.csv',
+    'elementAbilities.csv',
+    'elementBasicSkills.csv',
+    'elementCrossFunctionalSkills.csv',
+    'elementKnowledge.csv',
+    'elementTasks.csv',
+    'elementTechSkills.csv',
+    'elementWorkActivities.csv',
+    'FTE2020.csv',
+    'NASACompetencyLibrary.csv',
+    'OPMCompetencyLibrary.csv']
 
 
 ############# SIMPLE GUI TO TAKE BASIC ARGUMENTS #############
@@ -93,6 +164,7 @@ def present_gui():
                 [gui.Text('Database Username', font=(standard_font)), gui.InputText(font=(standard_font))], 
                 [gui.Text('Database Password', font=(standard_font)), gui.InputText(font=(standard_font))], 
                 [gui.Text('Path to Import Folder', font=(standard_font)), gui.InputText(assumed_path, font=(standard_font))],
+                [gui.Text('ONET Text Release (optional folder or .zip)', font=(standard_font)), gui.InputText(font=(standard_font))],
                 [gui.Text('Install Choice: ', font=(standard_font)),
                     gui.Radio('Fresh Install', 'install choice', font=(standard_font), default=False), 
                     gui.Radio('Update', 'install choice', font=(standard_font), default=False)], 
@@ -105,12 +177,13 @@ def present_gui():
             quit()
         # before updating, make sure to have the inputs you need - otherwise, send message and don't proceed
         if event == 'Start': 
-            if inputs[0] and inputs[1] and inputs[2] and (inputs[3] or inputs[4]):
+            if inputs[0] and inputs[1] and inputs[2] and inputs[3] and (inputs[5] or inputs[6]):
                 port = inputs[0]
                 user = inputs[1]
                 pswd = inputs[2]
                 path = inputs[3]
-                firstrun = inputs[4]
+                text_release = inputs[4]
+                firstrun = inputs[5]
                 window.close()
                 break
             else:
@@ -123,147 +196,107 @@ def present_gui():
                     missing = 'Password'
                 elif not inputs[3]:
                     missing = 'Path'
-                elif not inputs[4] or inputs[5]:
+                elif not (inputs[5] or inputs[6]):
                     missing = 'Install Choice'
                 # present alert box with the message
                 alert = gui.Window(' ', [[gui.Text('Missing ' + missing, font=(standard_font))]])
                 if alert.read() == gui.WIN_CLOSED:
                     alert.close()
-    return port, user, pswd, path, firstrun 
-
-############# SIMPLE GUI TO DISPLAY PROGRESS UPDATES #############
-############# INVOKED THROUGHOUT SCRIPT #############
+    return port, user, pswd, path, text_release, firstrun 
+
+############# COMMAND LINE AND ENVIRONMENT ARGUMENTS #############
+############# without --mode (or ONET_BUILD_MODE) the gui form asks for them instead #############
+def parse_arguments(argv=None):
+    assumed_path = os.path.abspath(os.path.join(os.path.dirname( __file__ ), '..', 'import'))
+    parser = argparse.ArgumentParser(description='Build or update the ONET Neo4j database.')
+    parser.add_argument('--host', default=os.environ.get('NEO4J_HOST', 'localhost'), help='database host (NEO4J_HOST)')
+    parser.add_argument('--port', default=os.environ.get('NEO4J_PORT', '7687'), help='bolt port (NEO4J_PORT)')
+    parser.add_argument('--user', default=os.environ.get('NEO4J_USER', 'neo4j'), help='database user (NEO4J_USER)')
+    parser.add_argument('--password', default=os.environ.get('NEO4J_PASSWORD'), help='database password (NEO4J_PASSWORD)')
+    parser.add_argument('--import-path', default=os.environ.get('ONET_IMPORT_PATH', assumed_path), help='neo4j import folder (ONET_IMPORT_PATH)')
+    parser.add_argument('--text-release', default=os.environ.get('ONET_TEXT_RELEASE', ''), help='ONET text release folder or .zip, skips downloading (ONET_TEXT_RELEASE)')
+    parser.add_argument('--mode', choices=('fresh', 'update', 'bulk'), default=os.environ.get('ONET_BUILD_MODE'), help='fresh install, update, or a fresh install through neo4j-admin import; runs headless (ONET_BUILD_MODE)')
+    parser.add_argument('--neo4j-home', default=os.environ.get('NEO4J_HOME'), help='neo4j installation, for --mode bulk (NEO4J_HOME)')
+    parser.add_argument('--force', action='store_true', help='let --mode bulk stop neo4j and move its database aside')
+    parser.add_argument('--loader', choices=('server', 'client'), default=os.environ.get('ONET_LOADER', 'server'), help='server reads file:/// with LOAD CSV once per load, client streams the csvs as UNWIND $rows batches and reads a file once for the loads that can share it (ONET_LOADER)')
+    parser.add_argument('--reset-checkpoint', action='store_true', help='ignore ' + checkpoint_file_name + ' and run every query')
+    parser.add_argument('--reporter', choices=reporter_kinds, default=os.environ.get('ONET_REPORTER', 'console'), help='progress output when headless (ONET_REPORTER)')
+    arguments = parser.parse_args(argv)
+    if arguments.mode and not arguments.password:
+        parser.error('--password or NEO4J_PASSWORD is required')
+    if arguments.mode == 'bulk' and not arguments.neo4j_home:
+        parser.error('--neo4j-home or NEO4J_HOME is required for --mode bulk')
+    if arguments.mode == 'bulk' and not arguments.force:
+        parser.error('--mode bulk stops neo4j and replaces its database, confirm with --force')
+    if not arguments.mode and gui is None:
+        parser.error('--mode is required when PySimpleGUI is not installed')
+    return arguments
+
+############# PROGRESS UPDATES #############
+############# INVOKED THROUGHOUT SCRIPT, goes to the log file and the reporter (console, jsonl or gui) #############
 def update(string=''):
-    print(string)
-    log_file.write(string)
-    # present message for a few seconds then auto-close
-    window = gui.Window('Progress Update', [[gui.Text(string, font=(standard_font))]]).Finalize()
-    time.sleep(3)
-    window.close()
+    log_file.write(string + '\n')
+    report('status', string)
+
+############# VALIDATE IMPORT FILES, EXIT ON PROBLEMS #############
+def validate_or_exit(path, file_names, query_list, report_name, extra_columns=None):
+    validation = validate_import_folder(path, file_names, query_list, os.path.join(log_path, report_name), extra_columns)
+    if not validation['ok']:
+        for problem in validation['problems']:
+            update(problem)
+        update('ERROR: ' + str(len(validation['problems'])) + ' problems in the import folder, see ' + report_name + ' under "logs" folder.')
+        log_file.close()
+        sys.exit(1)
 
 ############# IMPORT UPDATED .TXT FILES FROM ONET DATABASE #############
-def import_onet_data(path):
+def import_onet_data(path, text_release=''):
     update('Received details, starting updates.')
 
     # make sure that import folder under neo4j database exists
     if not os.path.exists(path):
         update('ERROR: Database import folder is required to update the database, but does not exist.')
-        quit()
+        sys.exit(1)
     else:
         update('SUCCESS: Database import folder exists, proceeding with file imports.')
 
-    #validate url, then process html doc from url
-    url = 'https://www.onetcenter.org/database.html#all-files'
-    try:
-        r = requests.get(url)
-    except requests.exceptions.RequestException as e:
-        update('ERROR: Could not access ONET Database URL. See console for exception details.')
-        raise SystemExit(e)
-    soup = BeautifulSoup(r.text, 'html.parser')
-    update('SUCCESS: Accessed ONET Database, starting to import files.')
-
-    #file importing status box initialization
-    layout = [  [gui.Text('IMPORTING AND CONVERTING FILES', font=(standard_font))],
-                [gui.Text(' ', size=(100, 1), font=(standard_font), key='recent_file')], 
-                [gui.Text(' ', size=(100, 1), font=(standard_font), key='import')],
-                [gui.Text(' ', size=(100, 1), font=(standard_font), key='skip')]]
-    window = gui.Window('Progress Updates', layout, finalize=True)
-
-    # list of files used in script, used to filter out unnecessary files
-    files_used = ['occupationdata.csv',
-        'contentmodelreference.csv',
-        'content_model_relationships.csv',
-        'SOCMajorGroup.csv',
-        'SOC_Level_With_Detailed.csv',
-        'SOC_Level_Without_Detailed.csv',
-        'DetailedOccupation.csv',
-        'scalesreference.csv',
-        'abilities.csv',
-        'alternatetitles.csv',
-        'iwareference.csv',
-        'dwareference.csv',
-        'educationtrainingandexperience.csv',
-        'interests.csv',
-        'jobzonereference.csv',
-        'jobzones.csv',
-        'knowledge.csv',
-        'skills.csv',
-        'taskstatements.csv',
-        'taskratings.csv',
-        'taskstodwas.csv',
-        'unspscreference.csv',
-        'technologyskills.csv',
-        'toolsused.csv',
-        'workactivities.csv',
-        'workstyles.csv',
-        'ncc_crosswalk.csv',
-        'Employees_2020-05-28.csv',
-        'Employees_2020-05-27.csv',
-        'elementAbilities.csv',
-        'elementBasicSkills.csv',
-        'elementCrossFunctionalSkills.csv',
-        'elementKnowledge.csv',
-        'elementTasks.csv',
-        'elementTechSkills.csv',
-        'elementWorkActivities.csv',
-        'FTE2020.csv',
-        'NASACompetencyLibrary.csv',
-        'OPMCompetencyLibrary.csv']
-
-    # scrape page for all links
-    import_count = 1
-    skip_count = 0
-    for link in soup.find_all('a'):
-        # if it's an href attribute & contains .xlsx, consider it
-        if 'href' in link.attrs:
-            if '.xlsx' in link.attrs['href']:
-                # extract the specific file_url and get the html of that specific .xlsx file page (aka file contents) by appending to the base ONET url
-                file_url = link.attrs['href']
-                response = requests.get('https://www.onetcenter.org' + file_url)
-                # create a sanitized xlsx_file_name
-                xlsx_file_name = re.search('[^/]+$', file_url).group(0)
-                xlsx_file_name = xlsx_file_name.replace('%20', '')
-                xlsx_file_name = xlsx_file_name.replace('%2C', '')
-                xlsx_file_name = xlsx_file_name.replace('-', '')
-                xlsx_file_name = xlsx_file_name.replace(',', '')
-                xlsx_file_name = xlsx_file_name.replace('_', '')
-                xlsx_file_name = xlsx_file_name.lower()
-                # only work with the file if it's actually used
-                if xlsx_file_name.replace('.xlsx', '.csv') in files_used:
-                    open(os.path.join(path, xlsx_file_name), 'wb').write(response.content)
-                    # open excel workbook and grab name of first sheet
-                    workbook = xlrd.open_workbook(os.path.join(path, xlsx_file_name))
-                    sheet = workbook.sheet_by_name(workbook.sheet_by_index(0).name)
-                    csv_file_name = xlsx_file_name.replace('.xlsx', '.csv') 
-                    csv_file = open(os.path.join(path, csv_file_name), 'w')
-                    wr = csv.writer(csv_file, quoting=csv.QUOTE_ALL)
-                    for rownum in range(sheet.nrows):
-                        wr.writerow(sheet.row_values(rownum))
-                    csv_file.close()
-                    # remove unnecessary xlsx
-                    os.remove(os.path.join(path, xlsx_file_name))
-                    #logging
-                    print('Imported ' + xlsx_file_name + ' and converted it to ' + csv_file_name) 
-                    print('Total Imported: ' + str(import_count))
-                    print('Total Skipped: ' + str(skip_count))
-                    window.read(timeout=0.1) #timeout was the make or break piece
-                    window['recent_file'].update('Imported ' + xlsx_file_name + ' and converted it to ' + csv_file_name)
-                    window['import'].update('Total Imported: ' + str(import_count))
-                    window['skip'].update('Total Skipped: ' + str(skip_count))
-                    import_count += 1 #record successful imports
-                else: # file isn't used
-                    #logging
-                    print('Skipped: ' + xlsx_file_name)
-                    print('Total Imported: ' + str(import_count))
-                    print('Total Skipped: ' + str(skip_count))
-                    window.read(timeout=0.1) #timeout was the make or break piece
-                    window['recent_file'].update('Skipped: ' + xlsx_file_name)
-                    window['import'].update('Total Imported: ' + str(import_count))
-                    window['skip'].update('Total Skipped: ' + str(skip_count))
-                    skip_count += 1 #record skipped files
-
-    time.sleep(5)
-    window.close()
+    if text_release:
+        # offline route: read the local text release, no scraping or workbooks involved
+        try:
+            conversions, skipped_files = ingest_text_release(text_release, path, files_used,
+                on_done=lambda conversion: report('file', 'Imported ' + conversion['source_file_name'] + ' and converted it to ' + conversion['csv_file_name'], **conversion))
+        except (ValueError, OSError) as e:
+            update('ERROR: Could not read the ONET text release. See console for exception details.')
+            raise SystemExit(e)
+        unchanged_files = []
+        failures = []
+        skip_count = len(skipped_files)
+    else:
+        # download only the workbooks in files_used, concurrently over one pooled session
+        try:
+            xlsx_file_names, unchanged_files, skipped_files = download_needed_files(path, files_used,
+                on_done=lambda name, status: report('file', ('Downloaded ' if status == 'downloaded' else 'Unchanged since last run: ') + name, source_file_name=name, status=status))
+        except requests.exceptions.RequestException as e:
+            update('ERROR: Could not download ONET Database files. See console for exception details.')
+            raise SystemExit(e)
+        for skipped_file in skipped_files:
+            report('file', 'Skipped: ' + skipped_file, source_file_name=skipped_file, status='skipped')
+        skip_count = len(skipped_files)
+        update('SUCCESS: Accessed ONET Database, downloaded ' + str(len(xlsx_file_names)) + ' files, ' + str(len(unchanged_files)) + ' unchanged.')
+
+        # convert the downloaded workbooks as a separate stage, one workbook per worker process
+        def converted(conversion):
+            record_conversion(path, conversion['source_file_name'])
+            report('file', 'Imported ' + conversion['source_file_name'] + ' and converted it to ' + conversion['csv_file_name']
+                + f' ({conversion["rows"]} rows, {conversion["rows_per_second"]:0.0f} rows/s)', **conversion)
+        conversions, failures = convert_workbooks(path, xlsx_file_names, on_done=converted)
+    summary = conversion_summary(conversions, failures)
+    for line in summary:
+        log_file.write(line + '\n')
+        report('file', line)
+    update('Total Imported: ' + str(len(conversions)) + ' (' + str(len(unchanged_files)) + ' unchanged), Total Skipped: ' + str(skip_count))
+    if failures:
+        update('ERROR: Could not convert ' + str(len(failures)) + ' files. See console for details.')
+        sys.exit(1)
 
     # if you need a file and it's not in the import folder, quit
     files_missing = []
@@ -273,20 +306,27 @@ def import_onet_data(path):
     if files_missing != []:
         for file_missing in files_missing:
             update('Missing '+file_missing+'. Cannot continue.')
-        quit()
-    # remove any files not actively used in script
+        sys.exit(1)
+    # remove any files not actively used in script (the manifest, folders and the text release are left alone,
+    # also when it was unpacked into the import folder)
+    files_kept = files_used + [manifest_file_name] + sorted(release_file_names(text_release, path))
     for file_included in os.listdir(path):
-        if file_included not in files_used:
+        if file_included not in files_kept and os.path.isfile(os.path.join(path, file_included)):
             update('Removing '+file_included+' because it is not needed for updating database.')
             os.remove(os.path.join(path, file_included))
 
+    # keep a compressed copy of this release's files in the snapshot store (named after the text release, else the date)
+    release = os.path.basename(os.path.normpath(text_release)).replace('.zip', '') if text_release else time.strftime('%Y-%m-%d')
+    snapshot_files = save_release(path, release, files_used)
+    log_file.write('Saved snapshot ' + release + ' of ' + str(len(snapshot_files)) + ' files.\n')
+
     update('Completed importing/converting/creating/removing files.')
 
 ############# CONNECT TO DATABASE #############
-def connect_to_database(port, user, pswd):
+def connect_to_database(port, user, pswd, host='localhost'):
     # Make sure the database is started first, otherwise attempt to connect will fail
     try:
-        graph = Graph('bolt://localhost:'+port, auth=(user, pswd))
+        graph = Graph('bolt://'+host+':'+port, auth=(user, pswd))
         update('SUCCESS: Connected to the Neo4j Database.')
         update('Starting cypher queries to create database; please do not interrupt process during runtime.')
     except Exception as e:
@@ -294,6 +334,31 @@ def connect_to_database(port, user, pswd):
         raise SystemExit(e)
     return graph
 
+############# FRESH INSTALL THROUGH NEO4J-ADMIN IMPORT #############
+############# compiles what it can of query_list into import files, returns the queries still to run #############
+def bulk_import_fresh_install(path, neo4j_home, port, user, pswd, host='localhost'):
+    update('Compiling the loads into neo4j-admin import files.')
+    def compiled(index, reason):
+        if reason:
+            log_file.write('Query ' + str(index + 1) + ' runs after the import: ' + reason + '\n')
+    bulk_graph, compiled_queries, remaining_queries = compile_import(query_list, path, on_done=compiled)
+    node_files, relationship_files = write_import_files(bulk_graph, os.path.join(path, bulk_folder_name))
+    update('Compiled ' + str(len(compiled_queries)) + ' queries into ' + str(len(bulk_graph['nodes'])) + ' nodes, '
+        + str(sum(len(relationships) for relationships in bulk_graph['relationships'].values())) + ' relationships ('
+        + str(bulk_graph['merged_rows']) + ' duplicate rows merged, ' + str(bulk_graph['skipped_rows']) + ' rows skipped).')
+    update('Stopping the database for neo4j-admin import.')
+    try:
+        admin_output, moved_folders = run_admin_import(neo4j_home, node_files, relationship_files)
+        log_file.write(admin_output)
+        for folder in moved_folders:
+            update('The old database is kept in ' + folder + ', delete it once the new one checks out.')
+        wait_for_database(lambda: Graph('bolt://'+host+':'+port, auth=(user, pswd)))
+    except Exception as e:
+        update('ERROR: neo4j-admin import failed. See console for details.')
+        raise SystemExit(e)
+    update('SUCCESS: Imported the database, ' + str(len(remaining_queries)) + ' constraints, indexes and queries left to run.')
+    return remaining_queries
+
 ############# APPEND THE QUERIES TO QUERY_LIST #############
 def append_queries(firstrun):
     #clear db if this is the first run
@@ -354,9 +419,8 @@ def append_queries(firstrun):
     query_list.append("""CREATE CONSTRAINT occ ON (occupation:Occupation) ASSERT occupation.onet_soc_code IS UNIQUE;""")
     query_list.append("""CREATE CONSTRAINT ele ON (element:Element) ASSERT element.elementID IS UNIQUE;""")
     query_list.append("""CREATE CONSTRAINT majgrp ON (majgrp:MajorGroup) ASSERT majgrp.onet_soc_code IS UNIQUE;""")
-    # CREATE CONSTRAINT ON (alttitles:AlternateTitles) ASSERT alttitles.title IS UNIQUE;
-    # CREATE CONSTRAINT ON (alttitles:AlternateTitles) ASSERT alttitles.shorttitle IS UNIQUE;
-    #don't think we need a constraint for alternate title sources
+    # one AlternateTitles node per occupation and title, keyed by alternate_title_key
+    query_list.append("""CREATE CONSTRAINT alttitleid ON (alttitles:AlternateTitles) ASSERT alttitles.titleID IS UNIQUE;""")
 
     # Import Occupation Data, known as SOC Level
     query_list.append("""CALL apoc.periodic.iterate("
@@ -368,7 +432,7 @@ def append_queries(firstrun):
     ON CREATE SET occupation.title = toLower(line.Title),
                 occupation.description = toLower(line.Description),
                 occupation.source = 'ONET'
-    ",{batchSize:1000, parallel:true, retries: 10}) YIELD operations""") 
+    ",{batchSize:1000, parallel:true, retries: 10})""") 
 
     # Load the reference model for the elements
     query_list.append("""CALL apoc.periodic.iterate("
@@ -380,7 +444,7 @@ def append_queries(firstrun):
     ON CREATE SET element.title = toLower(line.`Element Name`),
                 element.description = toLower(line.Description),
                 element.source = 'ONET'
-    ",{batchSize:1000, parallel:true, retries: 10}) YIELD operations""") 
+    ",{batchSize:1000, parallel:true, retries: 10})""") 
 
     # Load the relationships of the reference model. Self created
     query_list.append("""CALL apoc.periodic.iterate("
@@ -391,40 +455,10 @@ def append_queries(firstrun):
     MATCH (a:Element), (b:Element) 
     WHERE a.elementID = line.From AND b.elementID = line.To AND a.elementID <> b.elementID
     MERGE (a)<-[r:Sub_Element_Of]-(b)
-    ",{batchSize:1000}) YIELD operations""")
-
-    # Remove Element label and add others where appropriate
-    query_list.append("""MATCH (n:Element) WHERE n.elementID = '1' SET n:Worker_Characteristics;""")
-    query_list.append("""MATCH (a:Element) WHERE a.elementID CONTAINS('1.A') SET a:Abilities;""")
-    query_list.append("""MATCH (b:Element) WHERE b.elementID CONTAINS('1.B') SET b:Interests;""")
-    query_list.append("""MATCH (c:Element) WHERE c.elementID CONTAINS('1.C') SET c:Work_Styles;""")
-    query_list.append("""MATCH (n:Element) WHERE n.elementID = '2' SET n:Worker_Requirements;""")
-    query_list.append("""MATCH (a:Element) WHERE a.elementID CONTAINS('2.A') SET a:Basic_Skills;""")
-    query_list.append("""MATCH (b:Element) WHERE b.elementID CONTAINS('2.B') SET b:Cross_Functional_Skills;""")
-    query_list.append("""MATCH (c:Element) WHERE c.elementID CONTAINS('2.C') SET c:Knowledge;""")
-    query_list.append("""MATCH (d:Element) WHERE d.elementID CONTAINS('2.D') SET d:Education;""")
-    query_list.append("""MATCH (n:Element) WHERE n.elementID = '3' SET n:Experience_Requirements;""")
-    query_list.append("""MATCH (a:Element) WHERE a.elementID CONTAINS('3.A') SET a:Experience_And_Training;""")
-    query_list.append("""MATCH (b:Element) WHERE b.elementID CONTAINS('3.B') SET b:Basic_Skills_Entry_Requirement;""")
-    query_list.append("""MATCH (c:Element) WHERE c.elementID CONTAINS('3.C') SET c:Cross_Functional_Skills_Entry_Requirement;""")
-    query_list.append("""MATCH (d:Element) WHERE d.elementID CONTAINS('3.D') SET d:Licensing;""")
-    query_list.append("""MATCH (n:Element) WHERE n.elementID = '4' SET n:Occupational_Requirements;""")
-    query_list.append("""MATCH (a:Element) WHERE a.elementID CONTAINS('4.A') SET a:Generalized_Work_Activities;""")
-    query_list.append("""MATCH (b:Element) WHERE b.elementID CONTAINS('4.B') SET b:Organizational_Context;""")
-    query_list.append("""MATCH (c:Element) WHERE c.elementID CONTAINS('4.C') SET c:Work_Context;""")
-    query_list.append("""MATCH (d:Element) WHERE d.elementID CONTAINS('4.D') SET d:Detailed_Work_Activities;""")
-    query_list.append("""MATCH (e:Element) WHERE e.elementID CONTAINS('4.E') SET e:Intermediate_Work_Activities;""")
-    query_list.append("""MATCH (n:Element) WHERE n.elementID = '5' SET n:Occupation_Specific_Information;""")
-    query_list.append("""MATCH (a:Element) WHERE a.elementID CONTAINS('5.A') SET a:Task;""")
-    # There is no 5.B
-    query_list.append("""MATCH (c:Element) WHERE c.elementID CONTAINS('5.C') SET c:Title;""")
-    query_list.append("""MATCH (d:Element) WHERE d.elementID CONTAINS('5.D') SET d:Description;""")
-    query_list.append("""MATCH (e:Element) WHERE e.elementID CONTAINS('5.E') SET e:Alternate_Titles_ONET;""")
-    query_list.append("""MATCH (f:Element) WHERE f.elementID CONTAINS('5.F') SET f:Technology_Skills;""")
-    query_list.append("""MATCH (g:Element) WHERE g.elementID CONTAINS('5.G') SET g:Tools;""")
-    query_list.append("""MATCH (n:Element) WHERE n.elementID = '6' SET n:Workforce_Characteristics;""")
-    query_list.append("""MATCH (a:Element) WHERE a.elementID CONTAINS('6.A') SET a:Labor_Market_Information;""")
-    query_list.append("""MATCH (b:Element) WHERE b.elementID CONTAINS('6.B') SET b:Occupational_Outlook;""")
+    ",{batchSize:1000})""")
+
+    # Label the elements by content model branch, from element_labels.csv (written by element_labels.py)
+    query_list.append(element_label_query())
 
     # Load The SOC Major Group Occupation, Change label to MajorGroup
     query_list.append("""CALL apoc.periodic.iterate("
@@ -435,7 +469,7 @@ def append_queries(firstrun):
     MERGE (occupation:MajorGroup { onet_soc_code: line.SOCMajorGroupCode})
     ON CREATE SET occupation.title = toLower(line.SOCMajorGroupTitle),
                 occupation.source = 'ONET'
-    ",{batchSize:1000}) YIELD operations""")
+    ",{batchSize:1000})""")
 
     # Load SOC Level with Detail Occupations, Change label
     query_list.append("""CALL apoc.periodic.iterate("
@@ -447,7 +481,7 @@ def append_queries(firstrun):
     ON CREATE SET occupation.title = toLower(line.SOCLevelTitle),
                 occupation.description = toLower(line.SOCLevelDescription),
                 occupation.source = 'ONET'
-    ",{batchSize:1000, parallel:true, retries: 10}) YIELD operations""")
+    ",{batchSize:1000, parallel:true, retries: 10})""")
 
     query_list.append("""CALL apoc.periodic.iterate("
     LOAD CSV WITH HEADERS
@@ -457,7 +491,7 @@ def append_queries(firstrun):
     MATCH (a:MajorGroup), (b:Occupation)
     WHERE a.onet_soc_code = line.SOCMajorGroupCode AND b.onet_soc_code = line.SOCLevelCode AND a.onet_soc_code <> b.onet_soc_code
     MERGE (a)<-[r:IN_Major_Group]-(b)
-    ",{batchSize:1000}) YIELD operations""") 
+    ",{batchSize:1000})""") 
 
     # Load SOC Level without Detail Occupations, Change label
     query_list.append("""CALL apoc.periodic.iterate("
@@ -469,7 +503,7 @@ def append_queries(firstrun):
     ON CREATE SET occupation.title = toLower(line.SOCLevelTitle),
                 occupation.description = toLower(line.SOCLevelDescription),
                 occupation.source = 'ONET'
-    ",{batchSize:1000, parallel:true, retries: 10}) YIELD operations""")
+    ",{batchSize:1000, parallel:true, retries: 10})""")
 
     query_list.append("""CALL apoc.periodic.iterate("
     LOAD CSV WITH HEADERS
@@ -479,7 +513,7 @@ def append_queries(firstrun):
     MATCH (a:MajorGroup), (b:Occupation)
     WHERE a.onet_soc_code = line.SOCMajorGroupCode AND b.onet_soc_code = line.SOCLevelCode AND a.onet_soc_code <> b.onet_soc_code
     MERGE (a)<-[r:IN_Major_Group]-(b)
-    ",{batchSize:1000}) YIELD operations""")
+    ",{batchSize:1000})""")
 
     # Load Detailed Occupations, Change label to Detailed Occupation or something else
     query_list.append("""CALL apoc.periodic.iterate("
@@ -491,7 +525,7 @@ def append_queries(firstrun):
     ON CREATE SET occupation.title = toLower(line.SOCDetailTitle),
                 occupation.description = toLower(line.SOCDetailDescription),
                 occupation.source = 'ONET'
-    ",{batchSize:1000, parallel:true, retries: 10}) YIELD operations""") 
+    ",{batchSize:1000, parallel:true, retries: 10})""") 
 
     query_list.append("""CALL apoc.periodic.iterate("
     LOAD CSV WITH HEADERS
@@ -501,7 +535,7 @@ def append_queries(firstrun):
     MATCH (a:Occupation), (b:Workrole)
     WHERE a.onet_soc_code = line.SOCLevelCode AND b.onet_soc_code = line.SOCDetailCode AND a.onet_soc_code <> b.onet_soc_code
     MERGE (a)<-[r:IN_Occupation]-(b)
-    ",{batchSize:1000}) YIELD operations""")
+    ",{batchSize:1000})""")
 
     # Create Scale Nodes. Each element will have an edge to a scale with
     # associated statistical measures
@@ -514,7 +548,7 @@ def append_queries(firstrun):
     ON CREATE SET scale.title = toLower(line.`Scale Name`),
                 scale.min = toInteger(line.Minimum),
                 scale.max = toInteger(line.Maximum)
-    ",{batchSize:1000, parallel:true, retries: 10}) YIELD operations""")
+    ",{batchSize:1000, parallel:true, retries: 10})""")
 
     # The following section creates the relationships between the Elements and the Occuptions
     # Elements include abilities, knowledge, skills, and work activities
@@ -537,33 +571,25 @@ def append_queries(firstrun):
     ON CREATE SET f2.scale = toString(line.`Scale ID`), f2.element = 'ability'
     SET f1.datavalue = toFloat(line.`Data Value`)
     SET f2.datavalue = toFloat(line.`Data Value`)
-    ",{batchSize:10000}) YIELD operations""")
+    ",{batchSize:10000})""")
 
     # Add Alternative titles for Occupations and Workrole
+    # one pass: the node is merged on its key and linked in the same row (was a second 2099s pass
+    # re-matching every title by title/shorttitle/source)
     query_list.append("""CALL apoc.periodic.iterate("
     LOAD CSV WITH HEADERS
     FROM 'file:///alternatetitles.csv' AS line
     RETURN line
     ","
-    MERGE (t:AlternateTitles {title: line.`Alternate Title`,
-        shorttitle: line.`Short Title`, source: line.`Source(s)`})
-    ",{batchSize:1000}) YIELD operations""")
-
-    #takes a very long time- 2099s
-    query_list.append("""CALL apoc.periodic.iterate("
-    LOAD CSV WITH HEADERS
-    FROM 'file:///alternatetitles.csv' AS line
-    RETURN line
-    ","
-    MATCH (t:AlternateTitles {title: line.`Alternate Title`,
-        shorttitle: line.`Short Title`, source: line.`Source(s)`})
+    MERGE (t:AlternateTitles {titleID: """ + alternate_title_key + """})
+    SET t.title = line.`Alternate Title`, t.shorttitle = line.`Short Title`, t.source = line.`Source(s)`
     WITH t, line
     MATCH (a:Occupation {onet_soc_code: line.`O*NET-SOC Code`})
-    MATCH (b:Workrole {onet_soc_code: line.`O*NET-SOC Code`})
-    WITH t, a, b, line
     MERGE (a)-[:Equivalent_To]->(t)
+    WITH t, line
+    MATCH (b:Workrole {onet_soc_code: line.`O*NET-SOC Code`})
     MERGE (b)-[:Equivalent_To]->(t)
-    ",{batchSize:10000}) YIELD operations""")
+    ",{batchSize:10000})""")
 
     # Add IWA and DWA to Generalized Work Activities
     query_list.append("""CALL apoc.periodic.iterate("
@@ -575,7 +601,7 @@ def append_queries(firstrun):
     MERGE (b:Generalized_Work_Activities {elementID: line.`IWA ID`, title: line.`IWA Title`})
     WITH a, b, line
     MERGE (b)-[:Sub_Element_Of]->(a)
-    ",{batchSize:1000}) YIELD operations""") 
+    ",{batchSize:1000})""") 
 
     query_list.append("""CALL apoc.periodic.iterate("
     LOAD CSV WITH HEADERS
@@ -586,7 +612,7 @@ def append_queries(firstrun):
     MERGE (b:Generalized_Work_Activities {elementID: line.`DWA ID`, title: line.`DWA Title`})
     WITH a, b, line
     MERGE (b)-[:Sub_Element_Of]->(a)
-    ",{batchSize:1000}) YIELD operations""")
+    ",{batchSize:1000})""")
 
     # Add Education, Experience and Training relationships and measures
     # to Occupationa and workrole
@@ -605,7 +631,7 @@ def append_queries(firstrun):
     ON CREATE SET f2.scale = toString(line.`Scale ID`), f2.element = 'education'
     SET f1.datavalue = toFloat(line.`Data Value`)
     SET f2.datavalue = toFloat(line.`Data Value`)
-    ",{batchSize:10000}) YIELD operations""")
+    ",{batchSize:10000})""")
 
     query_list.append("""CALL apoc.periodic.iterate("
     LOAD CSV WITH HEADERS
@@ -622,7 +648,7 @@ def append_queries(firstrun):
     ON CREATE SET f2.scale = toString(line.`Scale ID`), f2.element = 'experience'
     SET f1.datavalue = toFloat(line.`Data Value`)
     SET f2.datavalue = toFloat(line.`Data Value`)
-    ",{batchSize:10000}) YIELD operations""")
+    ",{batchSize:10000})""")
 
     # Interests
     query_list.append("""CALL apoc.periodic.iterate("
@@ -640,7 +666,7 @@ def append_queries(firstrun):
     ON CREATE SET f2.scale = toString(line.`Scale ID`), f2.element = 'interest'
     SET f1.datavalue = toFloat(line.`Data Value`)
     SET f2.datavalue = toFloat(line.`Data Value`)
-    ",{batchSize:1000}) YIELD operations""")
+    ",{batchSize:1000})""")
 
     # Job Zones
     query_list.append("""CALL apoc.periodic.iterate("
@@ -656,7 +682,7 @@ def append_queries(firstrun):
         j.example = toLower(line.Examples),
         j.svpRange = line.`SVP Range`
     RETURN count(j)
-    ",{batchSize:1000}) YIELD operations""")
+    ",{batchSize:1000})""")
 
     query_list.append("""CALL apoc.periodic.iterate("
     LOAD CSV WITH HEADERS
@@ -667,7 +693,7 @@ def append_queries(firstrun):
     MATCH (o:Occupation {onet_soc_code: line.`O*NET-SOC Code`})
     WITH j, o, line
     MERGE (o)-[:In_Job_Zone {jobzone: line.`Job Zone`, date: line.Date}]->(j)
-    ",{batchSize:1000}) YIELD operations""") 
+    ",{batchSize:1000})""") 
 
     # Knowledge
     # Add relationships to Occupation and Workrole
@@ -686,7 +712,7 @@ def append_queries(firstrun):
     ON CREATE SET f2.scale = toString(line.`Scale ID`), f2.element = 'knowledge'
     SET f1.datavalue = toFloat(line.`Data Value`)
     SET f2.datavalue = toFloat(line.`Data Value`)
-    ",{batchSize:10000}) YIELD operations""")
+    ",{batchSize:10000})""")
 
     # Skills
     # Add relationships to Occupation and Workrole
@@ -705,7 +731,7 @@ def append_queries(firstrun):
     ON CREATE SET f2.scale = toString(line.`Scale ID`), f2.element = 'basic_skill'
     SET f1.datavalue = toFloat(line.`Data Value`)
     SET f2.datavalue = toFloat(line.`Data Value`)
-    ",{batchSize:10000}) YIELD operations""")
+    ",{batchSize:10000})""")
 
     query_list.append("""CALL apoc.periodic.iterate("
     LOAD CSV WITH HEADERS
@@ -722,7 +748,7 @@ def append_queries(firstrun):
     ON CREATE SET f2.scale = toString(line.`Scale ID`), f2.element = 'cf_skill'
     SET f1.datavalue = toFloat(line.`Data Value`)
     SET f2.datavalue = toFloat(line.`Data Value`)
-    ",{batchSize:10000}) YIELD operations""") 
+    ",{batchSize:10000})""") 
 
     # This sections will add task and their statements as nodes and create relationships to occupations.
     # Add relationships to Occupation and Workrole
@@ -739,7 +765,7 @@ def append_queries(firstrun):
                 task.date = line.Date,
                 task.domainsource = line.`Domain Source`,
                 task.source = 'ONET'
-    ",{batchSize:10000, parallel:true, retries: 10}) YIELD operations""")
+    ",{batchSize:10000, parallel:true, retries: 10})""")
 
     query_list.append("""CALL apoc.periodic.iterate("
     LOAD CSV WITH HEADERS
@@ -756,7 +782,7 @@ def append_queries(firstrun):
     ON CREATE SET f2.scale = toString(line.`Scale ID`), f2.element = 'task'
     SET f1.datavalue = toFloat(line.`Data Value`)
     SET f2.datavalue = toFloat(line.`Data Value`)
-    ",{batchSize:10000}) YIELD operations""")
+    ",{batchSize:10000})""")
 
     query_list.append("""CALL apoc.periodic.iterate("
     LOAD CSV WITH HEADERS
@@ -767,7 +793,7 @@ def append_queries(firstrun):
     MATCH (task:Task { taskID: toInteger(line.`Task ID`)})
     WITH a, task, line
     MERGE (task)-[:Task_For_DWA {date: line.Date, domainsource: line.`Domain Source`}]->(a)
-    ",{batchSize:10000}) YIELD operations""")
+    ",{batchSize:10000})""")
 
     # Commodities, to include tools and tech
     query_list.append("""CALL apoc.periodic.iterate("
@@ -782,7 +808,7 @@ def append_queries(firstrun):
     MERGE (s)<-[r:Sub_Segment]-(f)
     MERGE (f)<-[a:Sub_Segment]-(c)
     MERGE (c)<-[b:Sub_Segment]-(m)
-    ",{batchSize:1000}) YIELD operations""")
+    ",{batchSize:1000})""")
 
     query_list.append("""CALL apoc.periodic.iterate("
     LOAD CSV WITH HEADERS
@@ -802,7 +828,7 @@ def append_queries(firstrun):
     MERGE (s)-[:Found_In]->(o)
     MERGE (s)-[:Found_In]->(w)
     MERGE (s)-[:Sub_Element_Of]-(m)
-    ",{batchSize:10000}) YIELD operations""")
+    ",{batchSize:10000})""")
 
     # Tools
     query_list.append("""CALL apoc.periodic.iterate("
@@ -823,7 +849,7 @@ def append_queries(firstrun):
     MERGE (s)-[:Found_In]->(o)
     MERGE (s)-[:Found_In]->(w)
     MERGE (s)-[:Sub_Element_Of]-(m)
-    ",{batchSize:10000}) YIELD operations""")
+    ",{batchSize:10000})""")
 
     # Activities
     # Add relationships to Occupation and Workrole
@@ -842,7 +868,7 @@ def append_queries(firstrun):
     ON CREATE SET f2.scale = toString(line.`Scale ID`), f2.element = 'activity'
     SET f1.datavalue = toFloat(line.`Data Value`)
     SET f2.datavalue = toFloat(line.`Data Value`)
-    ",{batchSize:10000}) YIELD operations""")
+    ",{batchSize:10000})""")
 
     # Work Styles
     query_list.append("""CALL apoc.periodic.iterate("
@@ -860,7 +886,7 @@ def append_queries(firstrun):
     ON CREATE SET f2.scale = toString(line.`Scale ID`), f2.element = 'work_style'
     SET f1.datavalue = toFloat(line.`Data Value`)
     SET f2.datavalue = toFloat(line.`Data Value`)
-    ",{batchSize:1000}) YIELD operations""")
+    ",{batchSize:1000})""")
 
     ############# NCC OPM Crosswalk #############
     query_list.append("""CALL apoc.periodic.iterate("
@@ -882,42 +908,32 @@ def append_queries(firstrun):
     MERGE (opm)-[r1:IN_NCC_Class]->(ncc)
     MERGE (ncc)-[r:IN_NCC_GRP]->(nccgrp)
     MERGE (nccgrp)-[r2:IN_Skill_Mix_Grp]->(smg)
-    ",{batchSize:1000}) YIELD operations""")
+    ",{batchSize:1000})""")
 
     # OPM Series to ONET crosswalk
+    # ncc_crosswalk_codes.csv is written by code_crosswalk.py: every crosswalk row (and the links the
+    # crosswalk lacks) expanded to exact onet_soc_code/OPMSeries pairs, so both sides are constraint lookups;
+    # the added links (source 'patch') are for Occupations only
     query_list.append("""CALL apoc.periodic.iterate("
     LOAD CSV WITH HEADERS
-    FROM 'file:///ncc_crosswalk.csv' AS line
+    FROM 'file:///ncc_crosswalk_codes.csv' AS line
     RETURN line
     ","
-    MATCH (occ:Occupation), (opm:OPMSeries)
-    WHERE occ.onet_soc_code CONTAINS(line.`2010 SOC CODE`) AND opm.series = line.`OPMSeries`
-    MERGE (occ)-[r:IN_OPM_Series {censuscode: line.`2010 EEO TABULATION (CENSUS) CODE`, censustitle: toLower(line.`2010 EEO TABULATION (CENSUS) OCCUPATION TITLE`)}]->(opm)
-    ",{batchSize:1000}) YIELD operations""")
+    MATCH (occ:Occupation {onet_soc_code: line.onet_soc_code})
+    MATCH (opm:OPMSeries {series: line.OPMSeries})
+    MERGE (occ)-[r:IN_OPM_Series {censuscode: line.census_code, censustitle: toLower(line.census_title)}]->(opm)
+    ",{batchSize:1000})""")
 
     query_list.append("""CALL apoc.periodic.iterate("
     LOAD CSV WITH HEADERS
-    FROM 'file:///ncc_crosswalk.csv' AS line
+    FROM 'file:///ncc_crosswalk_codes.csv' AS line
     RETURN line
     ","
-    MATCH (occ:Workrole), (opm:OPMSeries)
-    WHERE occ.onet_soc_code CONTAINS(line.`2010 SOC CODE`) AND opm.series = line.`OPMSeries`
-    MERGE (occ)-[r:IN_OPM_Series {censuscode: line.`2010 EEO TABULATION (CENSUS) CODE`, censustitle: toLower(line.`2010 EEO TABULATION (CENSUS) OCCUPATION TITLE`)}]->(opm)
-    ",{batchSize:1000}) YIELD operations""")
-
-    # For a specific SOC
-    query_list.append("""MATCH (o:Occupation), (opm:OPMSeries) WHERE o.onet_soc_code = '17-2071.00' AND opm.series CONTAINS("855")
-                        MERGE (o)-[r:IN_OPM_Series {censuscode: '1410', censustitle: toLower('ELECTRICAL & ELECTRONIC ENGINEERS')}]->(opm);""")
-    query_list.append("""MATCH (o:Occupation), (opm:OPMSeries) WHERE o.onet_soc_code = '17-2072.00' AND opm.series CONTAINS("855")
-                        MERGE (o)-[r:IN_OPM_Series {censuscode: '1410', censustitle: toLower('ELECTRICAL & ELECTRONIC ENGINEERS')}]->(opm);""")
-    query_list.append("""MATCH (o:Occupation), (opm:OPMSeries) WHERE o.onet_soc_code = '17-2072.00' AND opm.series CONTAINS("855")
-                        MERGE (o)-[r:IN_OPM_Series {censuscode: '1410', censustitle: toLower('ELECTRICAL & ELECTRONIC ENGINEERS')}]->(opm);""")
-    query_list.append("""MATCH (o:Occupation), (opm:OPMSeries) WHERE o.onet_soc_code CONTAINS('17-206') AND opm.series CONTAINS("854")
-                        MERGE (o)-[r:IN_OPM_Series {censuscode: '1400', censustitle: toLower('COMPUTER HARDWARE ENGINEERS')}]->(opm);""")
-    query_list.append("""MATCH (o:Occupation), (opm:OPMSeries) WHERE o.onet_soc_code CONTAINS('15-1111') AND opm.series CONTAINS("1550")
-                        MERGE (o)-[r:IN_OPM_Series {censuscode: '1005', censustitle: toLower('COMPUTER & INFORMATION RESEARCH SCIENTISTS')}]->(opm);""")
-    query_list.append("""MATCH (opm:OPMSeries), (o:Occupation) WHERE opm.series CONTAINS('2210') AND o.onet_soc_code CONTAINS('15-1')
-                        MERGE (o)-[:IN_OPM_Series {censuscode: '1050', censustitle: toLower('COMPUTER SUPPORT SPECIALISTS')}]->(opm);""")
+    MATCH (occ:Workrole {onet_soc_code: line.onet_soc_code})
+    WHERE line.source = 'crosswalk'
+    MATCH (opm:OPMSeries {series: line.OPMSeries})
+    MERGE (occ)-[r:IN_OPM_Series {censuscode: line.census_code, censustitle: toLower(line.census_title)}]->(opm)
+    ",{batchSize:1000})""")
 
     ############# Employees #############
 
@@ -949,90 +965,90 @@ def append_queries(firstrun):
     MERGE (emp)-[:Located_At]->(center)
     MERGE (emp)-[:In_Organization]->(org)
     MERGE (org)-[:In_MAP]->(map)
-    ",{batchSize:5000}) YIELD operations""")
+    ",{batchSize:5000})""")
 
     query_list.append("""CALL apoc.periodic.iterate("
     LOAD CSV WITH HEADERS
-    FROM 'file:///Employees_2020-05-27.csv' AS line
+    FROM 'file:///Employees_2020-05-27_opm.csv' AS line
     RETURN line
     ","
-    MATCH (emp:Employee), (opm:OPMSeries)
-    WHERE emp.uupic = line.UUPIC and opm.series CONTAINS(line.`Occupational Series`)
+    MATCH (emp:Employee {uupic: line.UUPIC})
+    MATCH (opm:OPMSeries {series: line.OPMSeries})
     MERGE (emp)-[:IN_OPM_Series]->(opm)
-    ",{batchSize:10000}) YIELD operations""")
+    ",{batchSize:10000})""")
 
     # Map Elements to Employees
-    #long time- 2740s
+    # element<Kind>_ids.csv are written by employee_elements.py with the element/task id of each
+    # description, so these join on ids (matching on descriptions took 2222-2740s a file)
     query_list.append("""CALL apoc.periodic.iterate("
     LOAD CSV WITH HEADERS
-    FROM 'file:///elementAbilities.csv' AS line
+    FROM 'file:///elementAbilities_ids.csv' AS line
     RETURN line
     ","
-    MATCH (emp:Employee), (elem:Abilities)
-    WHERE emp.uupic = line.UUPIC AND elem.description = line.Abilities
+    MATCH (emp:Employee {uupic: line.UUPIC})
+    MATCH (elem:Abilities {elementID: line.`Element ID`})
     MERGE (emp)-[f:Found_In]->(elem)
     WITH toFloat(apoc.coll.shuffle(range(15,45,1))[0]*0.1) AS value, f
     SET f.datavalue = (round(100 * value) / 100),
         f.scale = 'IM',
         f.element = 'ability'
-    ",{batchSize:10000}) YIELD operations""")
+    ",{batchSize:10000})""")
 
-    #long time- 2222s
     query_list.append("""CALL apoc.periodic.iterate("
     LOAD CSV WITH HEADERS
-    FROM 'file:///elementBasicSkills.csv' AS line
+    FROM 'file:///elementBasicSkills_ids.csv' AS line
     RETURN line
     ","
-    MATCH (emp:Employee), (elem:Basic_Skills)
-    WHERE emp.uupic = line.UUPIC AND elem.description = line.BasicSkills
+    MATCH (emp:Employee {uupic: line.UUPIC})
+    MATCH (elem:Basic_Skills {elementID: line.`Element ID`})
     MERGE (emp)-[f:Found_In]->(elem)
     WITH toFloat(apoc.coll.shuffle(range(15,45,1))[0]*0.1) AS value, f
     SET f.datavalue = (round(100 * value) / 100),
         f.scale = 'IM',
         f.element = 'basic_skill'
-    ",{batchSize:10000}) YIELD operations""")
+    ",{batchSize:10000})""")
 
-    #long time- 2364s
     query_list.append("""CALL apoc.periodic.iterate("
     LOAD CSV WITH HEADERS
-    FROM 'file:///elementCrossFunctionalSkills.csv' AS line
+    FROM 'file:///elementCrossFunctionalSkills_ids.csv' AS line
     RETURN line
     ","
-    MATCH (emp:Employee), (elem:Cross_Functional_Skills)
-    WHERE emp.uupic = line.UUPIC AND elem.description = line.CrossFunctionalSkills
+    MATCH (emp:Employee {uupic: line.UUPIC})
+    MATCH (elem:Cross_Functional_Skills {elementID: line.`Element ID`})
     MERGE (emp)-[f:Found_In]->(elem)
     WITH toFloat(apoc.coll.shuffle(range(15,45,1))[0]*0.1) AS value, f
     SET f.datavalue = (round(100 * value) / 100),
         f.scale = 'IM',
         f.element = 'cf_skill'
-    ",{batchSize:10000}) YIELD operations""")
+    ",{batchSize:10000})""")
 
     query_list.append("""CALL apoc.periodic.iterate("
     LOAD CSV WITH HEADERS
-    FROM 'file:///elementKnowledge.csv' AS line
+    FROM 'file:///elementKnowledge_ids.csv' AS line
     RETURN line
     ","
-    MATCH (emp:Employee {uupic: line.UUPIC}), (elem:Knowledge {description: line.Knowledge})
+    MATCH (emp:Employee {uupic: line.UUPIC})
+    MATCH (elem:Knowledge {elementID: line.`Element ID`})
     MERGE (emp)-[f:Found_In]->(elem)
     WITH toFloat(apoc.coll.shuffle(range(15,45,1))[0]*0.1) AS value, f
     SET f.datavalue = (round(100 * value) / 100),
         f.scale = 'IM',
         f.element = 'knowledge'
-    ",{batchSize:10000}) YIELD operations""")
+    ",{batchSize:10000})""")
 
     query_list.append("""CALL apoc.periodic.iterate("
     LOAD CSV WITH HEADERS
-    FROM 'file:///elementTasks.csv' AS line
+    FROM 'file:///elementTasks_ids.csv' AS line
     RETURN line
     ","
-    MATCH (emp:Employee), (elem:Task)
-    WHERE emp.uupic = line.UUPIC AND elem.description = line.Tasks
+    MATCH (emp:Employee {uupic: line.UUPIC})
+    MATCH (elem:Task {taskID: toInteger(line.`Task ID`)})
     MERGE (emp)-[f:Found_In]->(elem)
     WITH toFloat(apoc.coll.shuffle(range(15,45,1))[0]*0.1) AS value, f
     SET f.datavalue = (round(100 * value) / 100),
         f.scale = 'IM',
         f.element = 'task'
-    ",{batchSize:10000}) YIELD operations""")
+    ",{batchSize:10000})""")
 
     query_list.append("""CALL apoc.periodic.iterate("
     LOAD CSV WITH HEADERS
@@ -1046,21 +1062,21 @@ def append_queries(firstrun):
     SET f.datavalue = (round(100 * value) / 100),
         f.scale = 'IM',
         f.element = 'tech_skill'
-    ",{batchSize:10000}) YIELD operations""")
+    ",{batchSize:10000})""")
 
     query_list.append("""CALL apoc.periodic.iterate("
     LOAD CSV WITH HEADERS
-    FROM 'file:///elementWorkActivities.csv' AS line
+    FROM 'file:///elementWorkActivities_ids.csv' AS line
     RETURN line
     ","
-    MATCH (emp:Employee), (elem:Generalized_Work_Activities)
-    WHERE emp.uupic = line.UUPIC AND elem.description = line.WorkActivities
+    MATCH (emp:Employee {uupic: line.UUPIC})
+    MATCH (elem:Generalized_Work_Activities {elementID: line.`Element ID`})
     MERGE (emp)-[f:Found_In]->(elem)
     WITH toFloat(apoc.coll.shuffle(range(15,45,1))[0]*0.1) AS value, f
     SET f.datavalue = (round(100 * value) / 100),
         f.scale = 'IM',
         f.element = 'activity'
-    ",{batchSize:10000}) YIELD operations""")
+    ",{batchSize:10000})""")
 
     # Update Center Inforation
     query_list.append("""MATCH (c:Center) WHERE c.center = 'HQ'SET c.title = 'Headquarters', c.business_area = toInteger(10);""")
@@ -1105,7 +1121,7 @@ def append_queries(firstrun):
     MERGE (project)-[:Charged_To]->(program)
     MERGE (program)-[:Charged_To]->(theme)
     MERGE (theme)-[:Charged_To]->(mis)
-    ",{batchSize:10000}) YIELD operations""")
+    ",{batchSize:10000})""")
 
     # Add NASA Competency Library
     query_list.append("""CALL apoc.periodic.iterate("
@@ -1133,7 +1149,7 @@ def append_queries(firstrun):
     MERGE (compsuite)-[:In_Comp_Type]->(comptype)
     MERGE (compdesg)-[:In_Comp_Suite]->(compsuite)
     MERGE (comp)-[:Has_Comp_Desgination]->(compdesg)
-    ",{batchSize:10000}) YIELD operations""")
+    ",{batchSize:10000})""")
 
     query_list.append("""CALL apoc.periodic.iterate("
     LOAD CSV WITH HEADERS
@@ -1144,7 +1160,7 @@ def append_queries(firstrun):
     ON CREATE SET comp.title = line.CompetencyTitle,
     comp.description = line.CompetencyDefinition,
     comp.source = 'OPM'
-    ",{batchSize:10000, parallel:true, retries: 10}) YIELD operations""")
+    ",{batchSize:10000, parallel:true, retries: 10})""")
 
 
     ############# DON'T UNCOMMENT #############
@@ -1169,49 +1185,61 @@ def append_queries(firstrun):
 
     return query_list
 
-############# EXECUTE QUERIES THROUGH A LOOP #############
-############# runs query, logs query execution time, sends update message about query progress #############
-
-def execute_queries():
-    # query status box initialization
-    layout = [[gui.Text('EXECUTING QUERIES', font=(standard_font))],
-            [gui.Text('', size=(50, 1), font=(standard_font), key='query_count')],
-            [gui.Text('', size=(50, 1), font=(standard_font), key='query_time')]]
-    window = gui.Window('Progress Updates', layout, finalize=True)
-
-    query_counter = 1 # number of queries, manually increment through loop
-    total_queries = len(query_list)
-    query_times = [0] # list to track execution time of queries (used for logging)
-
-    for query in query_list:
-        query_time_start = time.perf_counter() # start individual query exection timer
-        g = graph.begin() # open transaction
-        result = g.run(query).to_data_frame() # execute query
-        query_time_stop = time.perf_counter() # stop individual query exection timer
-        query_times.append(query_time_stop - query_time_start) # add query execution time to the list
-        try:
-            if result['operations'][0]['failed'] > 0:
-                #logging
-                print('Could not finish query ' + str(query_counter) + '/' + str(total_queries))
-                window.read(timeout=0.1) #timeout was the make or break piece
-                window['query_count'].update('Could not finish query ' + str(query_counter) + '/' + str(total_queries))
-            else:
-                g.commit() # close transaction
-                #logging
-                print('Completed query ' + str(query_counter) + '/' + str(total_queries) + f' in {query_times[query_counter]:0.4f} seconds.')
-                window.read(timeout=0.1) #timeout was the make or break piece
-                window['query_count'].update('Completed query ' + str(query_counter) + '/' + str(total_queries) + f' in {query_times[query_counter]:0.4f} seconds.')
-        except Exception as e:
-            update(e)
-            g.commit() # close transaction
-            #logging
-            print('Completed query ' + str(query_counter) + '/' + str(total_queries) + f' in {query_times[query_counter]:0.4f} seconds.')
-            window.read(timeout=0.1) #timeout was the make or break piece
-            window['query_count'].update('Completed query ' + str(query_counter) + '/' + str(total_queries) + f' in {query_times[query_counter]:0.4f} seconds.')
-        query_counter += 1
-    
-    time.sleep(5)
-    window.close()
+############# EXECUTE QUERIES ON A POOL OF SESSIONS #############
+############# runs independent queries concurrently, logs query execution time, sends update message about query progress #############
+
+def execute_queries(path):
+    # log the dependency graph, the number of stages is the critical path in queries
+    nodes = build_dependency_graph(query_list)
+    stages = query_stages(nodes)
+    log_file.write('Scheduling ' + str(len(query_list)) + ' queries in ' + str(len(stages)) + ' stages on ' + str(query_workers) + ' sessions.\n')
+
+    # resume an interrupted build: skip queries already recorded with the same text and input files
+    checkpoint_path = os.path.join(log_path, checkpoint_file_name)
+    if arguments.reset_checkpoint:
+        clear_checkpoint(checkpoint_path)
+    checkpoint = load_checkpoint(checkpoint_path)
+    keys = query_keys(query_list, path, checkpoint['file_hashes'])
+    skipped = resumable_queries(nodes, keys, checkpoint)
+    if skipped:
+        update('Resuming build, skipping ' + str(len(skipped)) + ' queries finished by the last run.')
+    failures = []
+    # one json line per query with the apoc counters, compare runs with: python query_metrics.py report <file>
+    run_id = new_run_id()
+    metrics_path = run_metrics_path(log_path, run_id)
+
+    def query_done(outcome, completed, total):
+        query_number = str(outcome['index'] + 1) + '/' + str(total)
+        append_record(metrics_path, metrics_record(run_id, outcome['index'], query_list[outcome['index']],
+            outcome['seconds'], outcome['ok'], outcome['result'], outcome['error']))
+        if outcome['ok']:
+            record_completion(checkpoint_path, checkpoint, keys[outcome['index']], outcome)
+            message = 'Completed query ' + query_number + f' in {outcome["seconds"]:0.4f} seconds.'
+        elif schema_in_place(query_list[outcome['index']], outcome['error']):
+            # constraints and indexes are already there on every update run
+            record_completion(checkpoint_path, checkpoint, keys[outcome['index']], outcome)
+            message = 'Query ' + query_number + ' already in place: ' + outcome['error']
+        else:
+            message = 'Could not finish query ' + query_number + ': ' + outcome['error']
+            failures.append(outcome)
+        #logging
+        log_file.write(message + '\n')
+        report('query', message, index=outcome['index'] + 1, seconds=outcome['seconds'], ok=outcome['ok'], completed=completed, total=total)
+
+    # the client loader streams the csvs from here, so the database host needs no import folder access
+    # and it reads a file once for all the loads that can share it (skills.csv, ncc_crosswalk.csv, ...);
+    # the server loader reads it once per load
+    if arguments.loader == 'client':
+        groups = shared_scan_groups(query_list, skipped)
+        run = client_runner(path, query_list, groups)
+        log_file.write('Sharing ' + str(len(groups)) + ' file scans between ' + str(sum(map(len, groups))) + ' loads.\n')
+    else:
+        groups = []
+        run = run_pooled_query
+    run_scheduled(pool, query_list, on_done=query_done, skip=skipped, run=run, groups=groups)
+    # a finished build starts over next time; after failures the checkpoint is kept to resume from
+    if not failures:
+        clear_checkpoint(checkpoint_path)
 
 ############# SIMILARITY RELATIONSHIPS #############
 def similar_relationships():
@@ -1361,19 +1389,21 @@ def cleanString(string):
                 words.append(w)
     return words
 
-def tag_node_descriptions(nodetype): #nodetype='Competency' or 'Element'
-    update('Tagging node descriptions for '+nodetype)
-
-    if nodetype == 'Element':
-        descriptions = graph.run("""
+description_queries = {'Element': """
             MATCH (n) WHERE EXISTS(n.elementID) RETURN DISTINCT n.title AS Title, n.description AS Description
             UNION MATCH (n) WHERE EXISTS(n.taskID) RETURN DISTINCT n.description AS Title, n.description AS Description
             UNION MATCH (n) WHERE EXISTS(n.commodityID) RETURN DISTINCT n.title AS Title, n.title AS Description
             UNION MATCH (n:Tech_Skill_Product) RETURN DISTINCT n.title AS Title, n.title AS Description
             UNION MATCH (n:Tool_Product) RETURN DISTINCT n.title AS Title, n.title AS Description
-        """).data()
-    elif nodetype == 'Competency':
-        descriptions = graph.run("""MATCH (n:Competency) RETURN n.title AS Title, n.description AS Description""").data()
+        """,
+        'Competency': """MATCH (n:Competency) RETURN n.title AS Title, n.description AS Description"""}
+
+# descriptions can be read ahead (read_many) and passed in, otherwise they're read here
+def tag_node_descriptions(nodetype, descriptions=None): #nodetype='Competency' or 'Element'
+    update('Tagging node descriptions for '+nodetype)
+
+    if descriptions is None:
+        descriptions = read_query(pool, description_queries[nodetype])
     tagged_descriptions = []
     description_titles = []
     for index, description in enumerate(descriptions):
@@ -1394,7 +1424,7 @@ def competency_relationships_csv(tagdoc1, tagdoc2, doctitles1, doctitles2):
     #loop through all docs
     for esent_id_1 in range(0, len(tagdoc1)-1): #620
         #loop through all docs
-        print("progressing: "+str(esent_id_1+1)+"/"+str(len(tagdoc1)))
+        report('status', "progressing: "+str(esent_id_1+1)+"/"+str(len(tagdoc1)), completed=esent_id_1+1, total=len(tagdoc1))
         for esent_id_2 in range(0, len(tagdoc2)-1): #about 2k
             #if docs aren't the same one, find similarity between them
             if esent_id_1 != esent_id_2:
@@ -1411,39 +1441,97 @@ def competency_relationships_csv(tagdoc1, tagdoc2, doctitles1, doctitles2):
     update('Finished creating dataframe with similarity relationships between competencies and ksatts.')
     return sim_dataframe
 
-def create_comp_ele_similarities():    
-    update('Creating similarity relationships.')
-    query = """CALL apoc.periodic.iterate("
+# module level so query_plans.py can plan it with the rest
+comp_ele_similarity_query = """CALL apoc.periodic.iterate("
     LOAD CSV WITH HEADERS 
     FROM 'file:///compentency_element_similarities.csv' AS line
     RETURN line
     ","
-    MATCH (a) WHERE a.title = (line.`Compentency1`)
+    MATCH (a:Competency) WHERE a.title = (line.`Compentency1`)
     MATCH (b) WHERE b.title = (line.`Compentency2`)
     MERGE (a)-[r:similarity]-(b) ON CREATE SET r.datavalue = (line.`Similarity`)
-    ",{batchSize:1000}) YIELD operations"""
+    ",{batchSize:1000})"""
+
+def create_comp_ele_similarities():    
+    update('Creating similarity relationships.')
     g = graph.begin() # open transaction
-    result = g.run(query).to_data_frame() # execute query
+    result = g.run(comp_ele_similarity_query).to_data_frame() # execute query
     g.commit() # close transaction
     update('Finished creating similarity relationships.')
 
 if __name__ == "__main__":
     standard_font = 'Courier', 16
     graph = None
+    pool = None
     query_list = []
     log_path = os.path.abspath(os.path.join(os.path.dirname( __file__ ), '..', 'logs'))
     log_file = open(os.path.join(log_path, 'script_log_file.txt'), 'w+') # create query exection time log file
 
-    port, user, pswd, path, firstrun = present_gui()
+    # headless when a mode is given on the command line or in ONET_BUILD_MODE, otherwise ask through the gui
+    arguments = parse_arguments()
+    if arguments.mode:
+        host, port, user, pswd, path, text_release = arguments.host, arguments.port, arguments.user, arguments.password, arguments.import_path, arguments.text_release
+        firstrun = arguments.mode in ('fresh', 'bulk')
+        report = make_reporter(arguments.reporter, gui, standard_font)
+    else:
+        host = arguments.host
+        port, user, pswd, path, text_release, firstrun = present_gui()
+        report = make_reporter('gui', gui, standard_font)
     total_program_time_start = time.perf_counter() # start timer to log total program time
     file_process_time_start = time.perf_counter() # start timer to log file processing time
-    import_onet_data(path)
+    import_onet_data(path, text_release)
+
+    query_list = append_queries(firstrun)
+    # indexes for every lookup key the loads use that no constraint or index covers yet
+    index_advice = advise_indexes(query_list + [comp_ele_similarity_query])
+    query_list = with_advised_indexes(query_list, index_advice['statements'])
+    for lookup in index_advice['unlabeled']:
+        log_file.write('Lookup on ' + lookup['property'] + ' without a label can\'t use an index: queries ' + ', '.join(map(str, lookup['queries'])) + '\n')
+    # batchSize/parallel found by batch_tuner.py for this hardware, where a load has been tuned
+    query_list, tuned_queries = apply_batch_profile(query_list, load_batch_profile(os.path.join(log_path, batch_profile_file_name)))
+    if tuned_queries:
+        log_file.write('Using tuned batch settings for ' + str(tuned_queries) + ' queries.\n')
+
+    # check every source file before the resolvers below read them, and before any database work
+    resolver_columns = {}
+    for columns in (employee_source_columns(), crosswalk_source_columns(), label_source_columns()):
+        for file_name, names in columns.items():
+            resolver_columns.setdefault(file_name, set()).update(names)
+    validate_or_exit(path, files_used, query_list, 'import_validation_report.json', resolver_columns)
+
+    # the employee element loads join on ids, resolved here from the descriptions in element<Kind>.csv
+    employee_elements = resolve_employee_elements(path, os.path.join(log_path, 'employee_element_report.json'))
+    for line in resolution_lines(employee_elements):
+        log_file.write(line + '\n')
+    if not employee_elements['ok']:
+        update('Some employee element descriptions match no element or task, see employee_element_report.json under "logs" folder.')
+    # the OPM crosswalk and employee series loads join on exact codes, expanded here from SOC patterns and series numbers
+    crosswalk_codes = resolve_crosswalk_codes(path, os.path.join(log_path, 'code_crosswalk_report.json'))
+    for line in crosswalk_resolution_lines(crosswalk_codes):
+        log_file.write(line + '\n')
+    if not crosswalk_codes['ok']:
+        update('Some SOC codes or OPM series match nothing, see code_crosswalk_report.json under "logs" folder.')
+    # the element labels come from each elementID's content model branch, worked out here in one pass
+    element_labels = resolve_element_labels(path, os.path.join(log_path, 'element_label_report.json'))
+    for line in label_lines(element_labels):
+        log_file.write(line + '\n')
+    if not element_labels['ok']:
+        update('Some content model elements are in no branch or outside their parent\'s branch, see element_label_report.json under "logs" folder.')
+    # then the files they wrote, against the queries that read them
+    validate_or_exit(path, employee_derived_files() + crosswalk_derived_files() + label_derived_files(), query_list, 'derived_validation_report.json')
     file_process_time_stop = time.perf_counter() # stop timer to log file processing time
 
     total_queries_time_start = time.perf_counter() # start timer to log query run time
-    graph = connect_to_database(port, user, pswd)
-    query_list = append_queries(firstrun)
-    execute_queries()
+    if arguments.mode == 'bulk':
+        query_list = bulk_import_fresh_install(path, arguments.neo4j_home, port, user, pswd, host)
+    graph = connect_to_database(port, user, pswd, host)
+    # advised indexes made by an earlier run are not created again (neo4j 4.0 has no IF NOT EXISTS)
+    queries_before = len(query_list)
+    query_list = without_existing_indexes(query_list, database_indexes(graph))
+    if len(query_list) < queries_before:
+        log_file.write('Skipping ' + str(queries_before - len(query_list)) + ' advised indexes already in the database.\n')
+    pool = open_pool('bolt://' + host + ':' + port, user, pswd) # query_list and the description reads run on pooled sessions
+    execute_queries(path)
     total_queries_time_stop = time.perf_counter() # stop timer to log query run time
 
     sim_rel_time_start = time.perf_counter() # start timer to log creation of similarity relationships
@@ -1456,8 +1544,10 @@ if __name__ == "__main__":
     current_path = os.path.abspath(os.path.join(os.path.dirname( __file__ )))
     if not os.path.exists(os.path.join(import_path, filename)):
         model = load_model()
-        tagdoc1, doctitles1 = tag_node_descriptions('Competency')
-        tagdoc2, doctitles2 = tag_node_descriptions('Element')
+        # both description reads run at once on their own sessions
+        competency_descriptions, element_descriptions = read_many(pool, [description_queries['Competency'], description_queries['Element']])
+        tagdoc1, doctitles1 = tag_node_descriptions('Competency', competency_descriptions)
+        tagdoc2, doctitles2 = tag_node_descriptions('Element', element_descriptions)
         compentency_element_similarities = competency_relationships_csv(tagdoc1, tagdoc2, doctitles1, doctitles2)
         compentency_element_similarities.to_csv(filename)
         os.rename(os.path.join(current_path, filename), os.path.join(import_path, filename))
@@ -1470,6 +1560,7 @@ if __name__ == "__main__":
 
     # finish clocking process time
     total_program_time_stop = time.perf_counter() # stop timer to log total program time
+    close_pool(pool)
 
     # final logs
     total_time_message = f'All updates took a total of: {total_program_time_stop - total_program_time_start:0.4f} seconds.\n'
@@ -1485,14 +1576,21 @@ if __name__ == "__main__":
     log_file.write(comp_ksatt_message)
     log_file.close()
 
-    print('SUCCESS: Completed building the database.')
-    success = gui.Window(' ', [[gui.Text('SUCCESS: Completed building the database.', font=(standard_font))],
-                                [gui.Text(total_time_message, font=(standard_font))],
-                                [gui.Text(file_time_message, font=(standard_font))],
-                                [gui.Text(query_time_message, font=(standard_font))],
-                                [gui.Text(sim_rel_message, font=(standard_font))],
-                                [gui.Text(comp_ksatt_message, font=(standard_font))],
-                                [gui.Text('Full log of individual query times and this summary in query_times_and_summary_logs.txt, under "logs" folder.', font=(standard_font))],
-                                [gui.Text('Close this window to finish program, and make sure to deactivate your virtualenv.', font=(standard_font))]])
-    if success.read() == gui.WIN_CLOSED:
-        success.close()
+    report('done', 'SUCCESS: Completed building the database.',
+        total_seconds=total_program_time_stop - total_program_time_start,
+        file_seconds=file_process_time_stop - file_process_time_start,
+        query_seconds=total_queries_time_stop - total_queries_time_start,
+        similarity_seconds=sim_rel_time_stop - sim_rel_time_start,
+        competency_seconds=comp_ksatt_time_stop - comp_ksatt_time_start)
+    # the gui front end ends on a summary window
+    if not arguments.mode:
+        success = gui.Window(' ', [[gui.Text('SUCCESS: Completed building the database.', font=(standard_font))],
+                                    [gui.Text(total_time_message, font=(standard_font))],
+                                    [gui.Text(file_time_message, font=(standard_font))],
+                                    [gui.Text(query_time_message, font=(standard_font))],
+                                    [gui.Text(sim_rel_message, font=(standard_font))],
+                                    [gui.Text(comp_ksatt_message, font=(standard_font))],
+                                    [gui.Text('Full log of individual query times and this summary in query_times_and_summary_logs.txt, under "logs" folder.', font=(standard_font))],
+                                    [gui.Text('Close this window to finish program, and make sure to deactivate your virtualenv.', font=(standard_font))]])
+        if success.read() == gui.WIN_CLOSED:
+            success.close()
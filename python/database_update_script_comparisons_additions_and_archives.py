@@ -65,6 +65,10 @@ import PySimpleGUI as gui
 import time
 import xlrd
 import csv
+from release_diff import diff_to_files
+from update_plans import apply_update_plans, clear_update_plans, alternate_title_key
+from snapshot_store import save_release
+from query_metrics import new_run_id, run_metrics_path, metrics_record, append_record, iterate_error
 
 
 ############# SIMPLE GUI TO TAKE BASIC ARGUMENTS #############
@@ -185,8 +189,13 @@ files_used = ['occupationdataadditions.csv',
 log_path = os.path.abspath(os.path.join(os.path.dirname( __file__ ), '..', 'logs'))
 comparison_counter = 1 # number of comparisons, manually increment through loop
 comparison_times = [0] # list to track execution time of comparisons (used for logging)
+diff_memory_limit = 512 * 1024 * 1024 # bytes a diff may hold in memory, bigger files are diffed on disk
 comparison_times_and_summary_log_file = open(os.path.join(log_path, 'comparison_times_and_summary_logs.txt'), 'w+') # create query exection time log file
 
+# plans left by the last update are stale, only this run's diffs may write new ones
+for plan_file_name in clear_update_plans(path):
+    print('Removing ' + plan_file_name + ' from the last update.')
+
 # scrape page for all links
 for link in soup.find_all('a'):
     # if it's an href attribute & contains .xlsx, consider it
@@ -263,26 +272,13 @@ for link in soup.find_all('a'):
                         csv_file.close()
                         # remove unnecessary xlsx
                         os.remove(os.path.join(path, xlsx_file_name))
-                        #diff archive and csv_file
-                        additions_file_name = csv_file_name.replace('.csv', 'additions.csv')
-                        archive_file = open(os.path.join(path, archive_file_name), 'r')
-                        archive_file_contents = archive_file.readlines()
-                        csv_file = open(os.path.join(path, csv_file_name), 'r')
-                        csv_file_contents = csv_file.readlines()
-                        additions_file = open(os.path.join(path, additions_file_name), 'w')
-                        # write differences to the new additions file
+                        #diff archive and csv_file by natural key -> additions, removals and changes files
                         diff_time_start = time.perf_counter() # start timer to log time it takes to get file diffs
-                        for line in csv_file_contents:
-                            # always write the first line (header)
-                            if line[0]:
-                                additions_file.write(line)
-                            if line not in archive_file_contents:
-                                additions_file.write(line)
+                        diff_counts = diff_to_files(os.path.join(path, archive_file_name), os.path.join(path, csv_file_name),
+                                                    path, csv_file_name.replace('.csv', ''), memory_limit=diff_memory_limit)
                         diff_time_stop = time.perf_counter() # stop timer to log time it takes to get file diffs
                         comparison_times.append(diff_time_stop - diff_time_start) # add comparison execution time to the list
-                        additions_file.close()
-                        csv_file.close()
-                        archive_file.close()
+                        comparison_times_and_summary_log_file.write(csv_file_name + f': {diff_counts["added"]} added, {diff_counts["removed"]} removed, {diff_counts["changed"]} changed.\n')
                         # remove old archive file, rename new csv_file to archive_file_name
                         os.remove(os.path.join(path, archive_file_name))
                         os.rename(os.path.join(path, csv_file_name), os.path.join(path, archive_file_name))
@@ -317,9 +313,9 @@ for file_used in files_used:
     if file_used not in os.listdir(path):
         update('Missing '+file_used+' needed for updating database, cannot continue without it.')
         quit()
-# remove any files not actively used in script
+# remove any files not actively used in script (archives, removals, changes and the snapshots folder are kept for the next diff/update)
 for file_included in os.listdir(path):
-    if file_included not in files_used:
+    if file_included not in files_used and not file_included.endswith(('archive.csv', 'removals.csv', 'changes.csv')) and os.path.isfile(os.path.join(path, file_included)):
         print('Removing '+file_included+' because it is not needed for updating database.')
         os.remove(os.path.join(path, file_included))
 
@@ -362,8 +358,7 @@ graph.run("""CREATE CONSTRAINT ON (ncc:NASAClassCode) ASSERT ncc.ncc_class_code
 graph.run("""CREATE CONSTRAINT ON (nccgrp:NCCGroup) ASSERT nccgrp.ncc_grp_num IS UNIQUE;""")
 graph.run("""CREATE CONSTRAINT ON (opm:OPMSeries) ASSERT opm.series IS UNIQUE;""")
 graph.run("""CREATE CONSTRAINT ON (smg:SkillMixGrp) ASSERT smg.title IS UNIQUE;""")
-graph.run("""CREATE CONSTRAINT ON (alttitles:AlternateTitles) ASSERT alttitles.title IS UNIQUE;""")
-graph.run("""CREATE CONSTRAINT ON (alttitles:AlternateTitles) ASSERT alttitles.shorttitle IS UNIQUE;""")
+graph.run("""CREATE CONSTRAINT ON (alttitles:AlternateTitles) ASSERT alttitles.titleID IS UNIQUE;""")
 graph.run("""CREATE CONSTRAINT ON (alttitles:Alternate_Titles) ASSERT alttitles.elementID IS UNIQUE;""")
 #don't think we need a constraint for alternate title sources
 graph.run("""CREATE CONSTRAINT ON (task:Task) ASSERT task.taskID IS UNIQUE;""")
@@ -719,26 +714,14 @@ LOAD CSV WITH HEADERS
 FROM 'file:///alternatetitlesadditions.csv' AS line
 RETURN line
 ","
-MERGE (t:AlternateTitles {title: line.`Alternate Title`,
-    shorttitle: line.`Short Title`, source: line.`Source(s)`})
+MERGE (t:AlternateTitles {titleID: """ + alternate_title_key + """})
+SET t.title = line.`Alternate Title`, t.shorttitle = line.`Short Title`, t.source = line.`Source(s)`
 WITH t, line
 MATCH (a:Occupation {onet_soc_code: line.`O*NET-SOC Code`})
-WITH t, a, line
 MERGE (a)-[:Equivalent_To]->(t)
-",{batchSize:10000})""") #56779	
-
-# Trying Match to see if the properties are not removed.
-query_list.append("""CALL apoc.periodic.iterate("
-LOAD CSV WITH HEADERS
-FROM 'file:///alternatetitlesadditions.csv' AS line
-RETURN line
-","
-MERGE (t:AlternateTitles {title: line.`Alternate Title`,
-    shorttitle: line.`Short Title`, source: line.`Source(s)`})
 WITH t, line
-MATCH (a:Workrole {onet_soc_code: line.`O*NET-SOC Code`})
-WITH t, a, line
-MERGE (a)-[:Equivalent_To]->(t)
+MATCH (b:Workrole {onet_soc_code: line.`O*NET-SOC Code`})
+MERGE (b)-[:Equivalent_To]->(t)
 ",{batchSize:10000})""") #56779	
 
 # Add IWA and DWA to Generalized Work Activities
@@ -1515,14 +1498,32 @@ layout = [[gui.Text('EXECUTING QUERIES', font=(standard_font))],
                     [gui.Text('', size=(50, 1), font=(standard_font), key='query_time')]]
 window = gui.Window('Progress Updates', layout, finalize=True)
 
+# on an update, apply removed and changed rows before the additions are loaded
+if updaterun:
+    def applied(base_name, kind, rows):
+        print('Applied ' + str(rows) + ' ' + kind + ' rows of ' + base_name)
+        query_times_and_summary_log_file.write('Applied ' + str(rows) + ' ' + kind + ' rows of ' + base_name + '\n')
+        window.read(timeout=0.1)
+        window['query_time'].update('Applied ' + str(rows) + ' ' + kind + ' rows of ' + base_name)
+    update_plan_time_start = time.perf_counter()
+    update_plan_rows = apply_update_plans(graph, path, on_done=applied)
+    query_times_and_summary_log_file.write(f'Applied {update_plan_rows} removed/changed rows in {time.perf_counter() - update_plan_time_start:0.4f} seconds.\n')
+
+run_id = new_run_id()
+metrics_path = run_metrics_path(log_path, run_id) # one json line per query with the apoc counters, see query_metrics.py
 for query in query_list:
     query_time_start = time.perf_counter() # start individual query exection timer
     g = graph.begin() # open transaction
-    g.run(query) # execute query
+    result = g.run(query).data() # execute query
     g.commit() # close transaction
     query_time_stop = time.perf_counter() # stop individual query exection timer
     query_times.append(query_time_stop - query_time_start) # add query execution time to the list
+    error = iterate_error(result[0] if result else None) # batches apoc.periodic.iterate couldn't commit
+    append_record(metrics_path, metrics_record(run_id, query_counter - 1, query, query_times[query_counter], error is None, result[0] if result else None, error))
     #logging
+    if error:
+        print('Query ' + str(query_counter) + '/' + str(total_queries) + ' had failed batches: ' + error)
+        query_times_and_summary_log_file.write('Query ' + str(query_counter) + '/' + str(total_queries) + ' had failed batches: ' + error + '\n')
     print('Completed query ' + str(query_counter) + '/' + str(total_queries) + f' in {query_times[query_counter]:0.4f} seconds.')
     query_times_and_summary_log_file.write('Completed query ' + str(query_counter) + '/' + str(total_queries) + f' in {query_times[query_counter]:0.4f} seconds.\n')
     window.read(timeout=0.1) #timeout was the make or break piece
@@ -1544,6 +1545,10 @@ if firstrun or (updaterun and not archive_exists):
         new_file_name = files.replace('additions','archive')
         os.rename(os.path.join(path, files), os.path.join(path, new_file_name))
 
+# keep a compressed copy of this release's files, so any two releases can be diffed or restored later
+snapshot_files = save_release(path, time.strftime('%Y-%m-%d'), [file_used.replace('additions.csv', 'archive.csv') for file_used in files_used])
+query_times_and_summary_log_file.write('Saved snapshot ' + time.strftime('%Y-%m-%d') + ' of ' + str(len(snapshot_files)) + ' files.\n')
+
 # log messages
 total_time_message = f'Updates took a total of: {total_program_time_stop - total_program_time_start:0.4f} seconds.\n'
 file_time_message = f'File processing took: {file_process_time_stop - file_process_time_start:0.4f} seconds.\n'
@@ -0,0 +1,150 @@
+############# CONTENT MODEL LABELS FOR THE ELEMENT NODES #############
+# Every Element gets the label of its content model branch (1.A Abilities, 4.C Work_Context...).
+# This used to be ~30 statements, each scanning all Elements with elementID CONTAINS('1.A'), which
+# also matches an id that only has '1.A' in the middle. Here the ids in content_model_relationships.csv
+# (and contentmodelreference.csv) are labelled in one pass: an id is in a branch when it is the
+# branch id or starts with it and a '.', and the roots ('1'...'6') are labelled alone, as before.
+# element_labels.csv gets one (elementID, label) row each, and element_label_query() sets every
+# label from it in one batched load, by the elementID constraint, with apoc.create.addLabels.
+# The IN list keeps the load to the known labels and tells the scheduler which ones it writes.
+# Hierarchy rows whose child isn't in its parent's branch are reported.
+#
+#   python element_labels.py [--import-path ...]    writes element_labels.csv and lists what didn't fit
+
+import argparse
+import json
+import csv
+import os
+
+relationship_file_name = 'content_model_relationships.csv'
+element_file_name = 'contentmodelreference.csv'
+labels_file_name = 'element_labels.csv'
+example_limit = 10 # unlabelled ids and mismatched rows kept in the report
+
+# root id: label, only the root itself gets it
+element_root_labels = {
+    '1': 'Worker_Characteristics',
+    '2': 'Worker_Requirements',
+    '3': 'Experience_Requirements',
+    '4': 'Occupational_Requirements',
+    '5': 'Occupation_Specific_Information',
+    '6': 'Workforce_Characteristics'}
+
+# branch id: label, the branch and everything under it get it
+element_branch_labels = {
+    '1.A': 'Abilities',
+    '1.B': 'Interests',
+    '1.C': 'Work_Styles',
+    '2.A': 'Basic_Skills',
+    '2.B': 'Cross_Functional_Skills',
+    '2.C': 'Knowledge',
+    '2.D': 'Education',
+    '3.A': 'Experience_And_Training',
+    '3.B': 'Basic_Skills_Entry_Requirement',
+    '3.C': 'Cross_Functional_Skills_Entry_Requirement',
+    '3.D': 'Licensing',
+    '4.A': 'Generalized_Work_Activities',
+    '4.B': 'Organizational_Context',
+    '4.C': 'Work_Context',
+    '4.D': 'Detailed_Work_Activities',
+    '4.E': 'Intermediate_Work_Activities',
+    '5.A': 'Task',
+    # There is no 5.B
+    '5.C': 'Title',
+    '5.D': 'Description',
+    '5.E': 'Alternate_Titles_ONET',
+    '5.F': 'Technology_Skills',
+    '5.G': 'Tools',
+    '6.A': 'Labor_Market_Information',
+    '6.B': 'Occupational_Outlook'}
+
+def in_branch(element_id, branch):
+    return element_id == branch or element_id.startswith(branch + '.')
+
+# the label of one id, None when it's in no branch
+def element_label(element_id):
+    if element_id in element_root_labels:
+        return element_root_labels[element_id]
+    for branch, label in element_branch_labels.items():
+        if in_branch(element_id, branch):
+            return label
+    return None
+
+# columns each source file needs, checked by import_validation before anything is resolved
+def source_columns():
+    return {relationship_file_name: {'From', 'To'}, element_file_name: {'Element ID'}}
+
+def derived_file_names():
+    return [labels_file_name]
+
+############# QUERIES #############
+# one batched load for every label; a label outside element_root/branch_labels is skipped
+def element_label_query():
+    labels = list(element_root_labels.values()) + list(element_branch_labels.values())
+    return """CALL apoc.periodic.iterate("
+    LOAD CSV WITH HEADERS
+    FROM 'file:///""" + labels_file_name + """' AS line
+    RETURN line
+    ","
+    MATCH (e:Element {elementID: line.elementID})
+    WHERE line.label IN [""" + ', '.join("'" + label + "'" for label in labels) + """]
+    CALL apoc.create.addLabels(e, [line.label]) YIELD node
+    RETURN count(*)
+    ",{batchSize:1000})"""
+
+############# WRITE THE LABEL FILE #############
+# writes element_labels.csv and a json report, returns the report
+# report = {'ok': every id labelled and in its parent's branch, 'ids', 'labelled', 'unlabelled', 'mismatched', 'labels': {label: count}}
+def resolve_element_labels(path, report_path=None):
+    report = {'ok': True, 'ids': 0, 'labelled': 0, 'unlabelled': [], 'mismatched': [], 'labels': {}}
+    labels = {} # elementID: label, in file order
+    def add(element_id):
+        if element_id and element_id not in labels:
+            labels[element_id] = element_label(element_id)
+    with open(os.path.join(path, relationship_file_name), 'r', newline='', encoding='utf-8-sig') as f:
+        for row in csv.DictReader(f):
+            add(row['From'])
+            add(row['To'])
+            # below the roots a child stays in its parent's branch
+            if row['From'] not in element_root_labels and row['From'] and row['To'] and labels[row['From']] != labels[row['To']]:
+                report['ok'] = False
+                if len(report['mismatched']) < example_limit:
+                    report['mismatched'].append(row['From'] + ' -> ' + row['To'])
+    with open(os.path.join(path, element_file_name), 'r', newline='', encoding='utf-8-sig') as f:
+        for row in csv.DictReader(f):
+            add(row['Element ID'])
+    with open(os.path.join(path, labels_file_name), 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['elementID', 'label'])
+        for element_id, label in labels.items():
+            if label is None:
+                report['ok'] = False
+                if len(report['unlabelled']) < example_limit:
+                    report['unlabelled'].append(element_id)
+                continue
+            writer.writerow([element_id, label])
+            report['labelled'] += 1
+            report['labels'][label] = report['labels'].get(label, 0) + 1
+    report['ids'] = len(labels)
+    if report_path:
+        with open(report_path, 'w') as report_file:
+            json.dump(report, report_file, indent=2)
+    return report
+
+def label_lines(report):
+    lines = [labels_file_name + ': ' + str(report['labelled']) + ' of ' + str(report['ids']) + ' elements labelled with '
+             + str(len(report['labels'])) + ' labels']
+    for element_id in report['unlabelled']:
+        lines.append('    in no branch: ' + element_id)
+    for pair in report['mismatched']:
+        lines.append('    child outside its parent\'s branch: ' + pair)
+    return lines
+
+############# COMMAND LINE #############
+if __name__ == '__main__':
+    assumed_path = os.path.abspath(os.path.join(os.path.dirname( __file__ ), '..', 'import'))
+    parser = argparse.ArgumentParser(description='Label the content model elements by branch.')
+    parser.add_argument('--import-path', default=os.environ.get('ONET_IMPORT_PATH', assumed_path), help='neo4j import folder (ONET_IMPORT_PATH)')
+    arguments = parser.parse_args()
+    for line in label_lines(resolve_element_labels(arguments.import_path)):
+        print(line)
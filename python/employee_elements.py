@@ -0,0 +1,131 @@
+############# RESOLVE EMPLOYEE ELEMENT DESCRIPTIONS TO IDS #############
+# The element<Kind>.csv files pair an employee (UUPIC) with the description of an ability, skill,
+# knowledge, task or work activity. Matching those descriptions in the graph scanned every node's
+# description per row (2222-2740s per file). Instead each description is looked up here, once, in
+# dictionaries built from contentmodelreference.csv (elementID) and taskstatements.csv (taskID),
+# and element<Kind>_ids.csv is written with UUPIC and the id, so the loads join on indexed ids.
+# Descriptions are compared lower-cased with whitespace collapsed, the way the graph stores them
+# (toLower). A description shared by several elements maps to all of them, as the MATCH did.
+# Rows whose description doesn't resolve are counted and reported, they used to match nothing.
+#
+#   python employee_elements.py [--import-path ...]    writes the id files and lists what didn't resolve
+
+import argparse
+import json
+import csv
+import os
+
+from element_labels import in_branch
+
+element_file_name = 'contentmodelreference.csv'
+task_file_name = 'taskstatements.csv'
+example_limit = 10 # unresolved descriptions kept per file in the report
+
+# source file: (description column, content model branch or 'task')
+employee_element_files = {
+    'elementAbilities.csv': ('Abilities', '1.A'),
+    'elementBasicSkills.csv': ('BasicSkills', '2.A'),
+    'elementCrossFunctionalSkills.csv': ('CrossFunctionalSkills', '2.B'),
+    'elementKnowledge.csv': ('Knowledge', '2.C'),
+    'elementTasks.csv': ('Tasks', 'task'),
+    'elementWorkActivities.csv': ('WorkActivities', '4.A')}
+
+def ids_file_name(file_name):
+    return file_name.replace('.csv', '_ids.csv')
+
+# columns each source file needs, checked by import_validation before anything is resolved
+def source_columns():
+    columns = {element_file_name: {'Element ID', 'Description'}, task_file_name: {'Task ID', 'Task'}}
+    for file_name, (column, branch) in employee_element_files.items():
+        columns[file_name] = {'UUPIC', column}
+    return columns
+
+def derived_file_names():
+    return [ids_file_name(file_name) for file_name in employee_element_files]
+
+def normalize_description(text):
+    return ' '.join(text.lower().split())
+
+############# DESCRIPTION -> IDS DICTIONARIES #############
+# {branch: {description: [elementID]}}, an element belongs to a branch when its id starts with it
+def element_ids(path, branches):
+    ids = {branch: {} for branch in branches}
+    with open(os.path.join(path, element_file_name), 'r', newline='', encoding='utf-8-sig') as f:
+        for row in csv.DictReader(f):
+            for branch in branches:
+                if in_branch(row['Element ID'], branch):
+                    ids[branch].setdefault(normalize_description(row['Description']), []).append(row['Element ID'])
+    return ids
+
+# {description: [taskID]}, the same statement is a separate task for every occupation it's rated for
+def task_ids(path):
+    ids = {}
+    with open(os.path.join(path, task_file_name), 'r', newline='', encoding='utf-8-sig') as f:
+        for row in csv.DictReader(f):
+            task_list = ids.setdefault(normalize_description(row['Task']), [])
+            if row['Task ID'] not in task_list:
+                task_list.append(row['Task ID'])
+    return ids
+
+############# WRITE THE ID FILES #############
+# returns {'rows', 'resolved', 'unresolved', 'pairs', 'examples'} for one file
+def resolve_file(path, file_name, column, lookup, id_column):
+    result = {'rows': 0, 'resolved': 0, 'unresolved': 0, 'pairs': 0, 'examples': []}
+    seen = set()
+    with open(os.path.join(path, file_name), 'r', newline='', encoding='utf-8-sig') as source, \
+            open(os.path.join(path, ids_file_name(file_name)), 'w', newline='', encoding='utf-8') as target:
+        writer = csv.writer(target)
+        writer.writerow(['UUPIC', id_column])
+        for row in csv.DictReader(source):
+            result['rows'] += 1
+            ids = lookup.get(normalize_description(row.get(column) or ''))
+            if not ids:
+                result['unresolved'] += 1
+                if len(result['examples']) < example_limit and row.get(column) not in result['examples']:
+                    result['examples'].append(row.get(column))
+                continue
+            result['resolved'] += 1
+            for id_value in ids:
+                if (row['UUPIC'], id_value) not in seen:
+                    seen.add((row['UUPIC'], id_value))
+                    writer.writerow([row['UUPIC'], id_value])
+                    result['pairs'] += 1
+    return result
+
+# writes every element<Kind>_ids.csv and a json report, returns the report
+# report = {'ok': no unresolved rows, 'files': {file_name: result}}
+def resolve_employee_elements(path, report_path=None):
+    branches = [branch for column, branch in employee_element_files.values() if branch != 'task']
+    elements = element_ids(path, branches)
+    tasks = task_ids(path)
+    report = {'ok': True, 'files': {}}
+    for file_name, (column, branch) in employee_element_files.items():
+        if branch == 'task':
+            result = resolve_file(path, file_name, column, tasks, 'Task ID')
+        else:
+            result = resolve_file(path, file_name, column, elements[branch], 'Element ID')
+        report['files'][file_name] = result
+        if result['unresolved']:
+            report['ok'] = False
+    if report_path:
+        with open(report_path, 'w') as report_file:
+            json.dump(report, report_file, indent=2)
+    return report
+
+def resolution_lines(report):
+    lines = []
+    for file_name, result in report['files'].items():
+        lines.append(file_name + ': ' + str(result['resolved']) + ' of ' + str(result['rows']) + ' rows resolved to '
+                     + str(result['pairs']) + ' employee/id pairs, ' + str(result['unresolved']) + ' unresolved')
+        for example in result['examples']:
+            lines.append('    unresolved: ' + str(example))
+    return lines
+
+############# COMMAND LINE #############
+if __name__ == '__main__':
+    assumed_path = os.path.abspath(os.path.join(os.path.dirname( __file__ ), '..', 'import'))
+    parser = argparse.ArgumentParser(description='Resolve the employee element descriptions to element and task ids.')
+    parser.add_argument('--import-path', default=os.environ.get('ONET_IMPORT_PATH', assumed_path), help='neo4j import folder (ONET_IMPORT_PATH)')
+    arguments = parser.parse_args()
+    for line in resolution_lines(resolve_employee_elements(arguments.import_path)):
+        print(line)
@@ -0,0 +1,119 @@
+############# PRE-FLIGHT VALIDATION OF THE IMPORT FOLDER #############
+# One streaming pass over every file in files_used before any database work:
+# - the header must have every column the queries read from that file (line.`Column`)
+# - every row must have as many fields as the header
+# - 'Data Value' must be numeric and 'Scale ID' must be a scale from scalesreference.csv
+# Rows are counted on the way. The result is written as a json report, and the caller
+# exits non-zero when report['ok'] is False instead of failing part way through a LOAD CSV.
+# The build validates the source files first, with the columns the resolvers (employee_elements,
+# code_crosswalk, element_labels) read added, and the files those write after they ran.
+
+import json
+import csv
+import re
+import os
+
+example_limit = 10 # example line numbers/values kept per problem in the report
+scales_file_name = 'scalesreference.csv'
+
+file_pattern = re.compile(r"file:///([^'\"]+)")
+line_column_pattern = re.compile(r"line\.(?:`([^`]+)`|(\w+))")
+
+############# COLUMNS EACH FILE MUST HAVE, TAKEN FROM THE QUERIES #############
+def referenced_columns(query_list):
+    columns = {}
+    for query in query_list:
+        file_names = file_pattern.findall(query)
+        if not file_names:
+            continue
+        query_columns = set(quoted or bare for quoted, bare in line_column_pattern.findall(query))
+        for file_name in file_names:
+            columns.setdefault(file_name, set()).update(query_columns)
+    return columns
+
+def is_number(value):
+    try:
+        float(value)
+    except ValueError:
+        return False
+    return True
+
+def add_example(problem, example):
+    problem['count'] += 1
+    if len(problem['examples']) < example_limit:
+        problem['examples'].append(example)
+
+############# STREAM ONE FILE #############
+# scale_ids is None while scalesreference.csv itself is being read
+def validate_file(file_path, required_columns, scale_ids=None):
+    result = {'exists': os.path.exists(file_path),
+            'rows': 0,
+            'missing_columns': [],
+            'bad_rows': {'count': 0, 'examples': []},
+            'non_numeric_data_values': {'count': 0, 'examples': []},
+            'unknown_scale_ids': {'count': 0, 'examples': []}}
+    if not result['exists']:
+        return result
+    # utf-8-sig drops the byte order mark some of the hand-made csvs start with
+    with open(file_path, 'r', newline='', encoding='utf-8-sig') as csv_file:
+        reader = csv.reader(csv_file)
+        header = next(reader, [])
+        result['missing_columns'] = sorted(set(required_columns) - set(header))
+        data_value_index = header.index('Data Value') if 'Data Value' in header else None
+        scale_id_index = header.index('Scale ID') if 'Scale ID' in header else None
+        for values in reader:
+            result['rows'] += 1
+            line_number = reader.line_num
+            if len(values) != len(header):
+                add_example(result['bad_rows'], line_number)
+                continue
+            if data_value_index is not None and not is_number(values[data_value_index]):
+                add_example(result['non_numeric_data_values'], [line_number, values[data_value_index]])
+            if scale_id_index is not None:
+                scale_id = values[scale_id_index]
+                if not scale_id or (scale_ids is not None and scale_id not in scale_ids):
+                    add_example(result['unknown_scale_ids'], [line_number, scale_id])
+    return result
+
+def read_scale_ids(path):
+    scales_path = os.path.join(path, scales_file_name)
+    if not os.path.exists(scales_path):
+        return None
+    with open(scales_path, 'r', newline='', encoding='utf-8-sig') as scales_file:
+        return set(row['Scale ID'] for row in csv.DictReader(scales_file) if row.get('Scale ID'))
+
+# human readable lines for the console and the progress window
+def file_problems(file_name, result):
+    problems = []
+    if not result['exists']:
+        return [file_name + ' is missing.']
+    if result['missing_columns']:
+        problems.append(file_name + ' is missing columns: ' + ', '.join(result['missing_columns']))
+    if result['bad_rows']['count']:
+        problems.append(file_name + ' has ' + str(result['bad_rows']['count']) + ' rows with the wrong number of fields, e.g. lines ' + str(result['bad_rows']['examples']))
+    if result['non_numeric_data_values']['count']:
+        problems.append(file_name + ' has ' + str(result['non_numeric_data_values']['count']) + ' non-numeric Data Values, e.g. ' + str(result['non_numeric_data_values']['examples']))
+    if result['unknown_scale_ids']['count']:
+        problems.append(file_name + ' has ' + str(result['unknown_scale_ids']['count']) + ' unknown Scale IDs, e.g. ' + str(result['unknown_scale_ids']['examples']))
+    if result['rows'] == 0:
+        problems.append(file_name + ' has no data rows.')
+    return problems
+
+############# VALIDATE EVERY FILE AND WRITE THE REPORT #############
+# extra_columns: {file_name: columns} read by something other than the queries
+def validate_import_folder(path, files_used, query_list, report_path, extra_columns=None):
+    required = referenced_columns(query_list)
+    for file_name, columns in (extra_columns or {}).items():
+        required.setdefault(file_name, set()).update(columns)
+    scale_ids = read_scale_ids(path)
+    report = {'ok': True, 'path': path, 'files': {}, 'problems': []}
+    for file_name in files_used:
+        result = validate_file(os.path.join(path, file_name), required.get(file_name, set()),
+                            None if file_name == scales_file_name else scale_ids)
+        result['required_columns'] = sorted(required.get(file_name, set()))
+        report['files'][file_name] = result
+        report['problems'].extend(file_problems(file_name, result))
+    report['ok'] = not report['problems']
+    with open(report_path, 'w') as report_file:
+        json.dump(report, report_file, indent=2)
+    return report
@@ -0,0 +1,149 @@
+############# INDEX ADVISOR FOR QUERY_LIST LOOKUP KEYS #############
+# Lists every (label, properties) a query looks nodes up by: MATCH/MERGE property maps and
+# v.p = ... / v.p CONTAINS ... in WHERE. A key is covered when one of its properties has a
+# uniqueness constraint or an index on that label (one indexed property is enough for a seek), or
+# a composite index has exactly its properties. For every uncovered key an index is generated,
+# single-property or composite for map lookups like AlternateTitles {title, shorttitle, source}.
+# with_advised_indexes puts them right after the constraints at the top of query_list, followed by
+# db.awaitIndexes, so they are online before the first load that needs them.
+# neo4j 4.0 has no CREATE INDEX ... IF NOT EXISTS, so once connected without_existing_indexes drops
+# the advised statements whose name or (label, properties) db.indexes() already lists.
+# Lookups on unlabeled nodes (MATCH (a) WHERE a.title = ...) can't use an index and are listed apart.
+#
+#   python index_advisor.py    the lookup keys, what covers them, and the indexes to add
+
+import re
+
+from query_scheduler import clause_pattern, schema_pattern
+from bulk_import import mask_literals, split_top_level, wipe_queries
+from query_plans import iterate_pattern
+
+await_seconds = 300
+node_map_pattern = re.compile(r'\(\s*(\w*)\s*((?::\s*`?\w+`?\s*)*)(\{[^{}]*\})?\s*\)')
+where_pattern = re.compile(r'\b(\w+)\.(\w+)\s*(=|CONTAINS\b)', re.IGNORECASE)
+constraint_pattern = re.compile(r'CREATE\s+CONSTRAINT\s+\w*\s*ON\s*\(\s*\w+\s*:\s*(\w+)\s*\)\s*ASSERT\s+\w+\.(\w+)\s+IS\s+UNIQUE', re.IGNORECASE)
+advised_pattern = re.compile(r'CREATE\s+INDEX\s+(advised_\w+)\s+FOR\s*\(\s*\w+\s*:\s*(\w+)\s*\)\s*ON\s*\(([^)]*)\)', re.IGNORECASE)
+index_pattern = re.compile(r'CREATE\s+INDEX\s+\w*\s*FOR\s*\(\s*\w+\s*:\s*(\w+)\s*\)\s*ON\s*\(([^)]*)\)', re.IGNORECASE)
+
+############# WHAT THE SCHEMA STATEMENTS ALREADY INDEX #############
+# returns a set of (label, (properties,)), constraints count as single-property indexes
+def existing_indexes(query_list):
+    indexes = set()
+    for query in query_list:
+        for label, name in constraint_pattern.findall(query):
+            indexes.add((label, (name,)))
+        for label, names in index_pattern.findall(query):
+            indexes.add((label, tuple(name.split('.')[-1].strip() for name in names.split(','))))
+    return indexes
+
+############# LOOKUP KEYS OF ONE QUERY #############
+# returns (keys, unlabeled): keys is a set of (label, (properties,)), unlabeled a set of properties
+def lookup_keys(query):
+    iterate = iterate_pattern.search(query)
+    text, literals = mask_literals(iterate.group(2) if iterate else query) # the action of apoc.periodic.iterate
+    pieces = clause_pattern.split(text)
+    labels = {} # variable -> first label it was bound with
+    keys = set()
+    unlabeled = set()
+    for keyword, body in zip(pieces[1::2], pieces[2::2]):
+        keyword = ' '.join(keyword.upper().split())
+        if keyword in ('MATCH', 'OPTIONAL MATCH', 'MERGE'):
+            for variable, node_labels, properties in node_map_pattern.findall(body):
+                label = re.findall(r'\w+', node_labels)[:1]
+                if variable and label:
+                    labels.setdefault(variable, label[0])
+                if properties and label:
+                    names = tuple(sorted(entry.split(':', 1)[0].strip().strip('`') for entry in split_top_level(properties[1:-1])))
+                    keys.add((label[0], names))
+        elif keyword == 'WHERE':
+            grouped = {}
+            for variable, name, operator in where_pattern.findall(body):
+                if variable == 'line':
+                    continue
+                if variable in labels:
+                    grouped.setdefault(variable, set()).add(name)
+                else:
+                    unlabeled.add(name)
+            for variable, names in grouped.items():
+                keys.add((labels[variable], tuple(sorted(names))))
+    return keys, unlabeled
+
+############# ADVICE FOR THE WHOLE LIST #############
+def is_covered(key, indexes):
+    label, names = key
+    return any(index_label == label and (len(index_names) == 1 and index_names[0] in names or index_names == names)
+               for index_label, index_names in indexes)
+
+def index_statement(key):
+    label, names = key
+    return ('CREATE INDEX advised_' + label.lower() + '_' + '_'.join(names).lower()
+            + ' FOR (n:' + label + ') ON (' + ', '.join('n.' + name for name in names) + ')')
+
+# returns {'keys': [{'label', 'properties', 'queries', 'covered'}], 'unlabeled': [{'property', 'queries'}], 'statements'}
+def advise_indexes(query_list):
+    indexes = existing_indexes(query_list)
+    used = {}
+    unlabeled = {}
+    for number, query in enumerate(query_list, 1):
+        if schema_pattern.search(query):
+            continue
+        keys, names = lookup_keys(query)
+        for key in keys:
+            used.setdefault(key, []).append(number)
+        for name in names:
+            unlabeled.setdefault(name, []).append(number)
+    advice = {'keys': [], 'unlabeled': [], 'statements': []}
+    # fewest properties first, so an advised single-property index covers the wider keys after it
+    for key in sorted(used, key=lambda key: (len(key[1]), key)):
+        covered = is_covered(key, indexes)
+        advice['keys'].append({'label': key[0], 'properties': list(key[1]), 'queries': used[key], 'covered': covered})
+        if not covered:
+            advice['statements'].append(index_statement(key))
+            indexes.add(key)
+    advice['unlabeled'] = [{'property': name, 'queries': numbers} for name, numbers in sorted(unlabeled.items())]
+    return advice
+
+# statements go after the schema block at the top of query_list (a fresh install's wipe comes first)
+def with_advised_indexes(query_list, statements):
+    if not statements:
+        return list(query_list)
+    position = 0
+    while position < len(query_list) and (schema_pattern.search(query_list[position]) or query_list[position].strip() in wipe_queries):
+        position += 1
+    return query_list[:position] + statements + ['CALL db.awaitIndexes(' + str(await_seconds) + ')'] + query_list[position:]
+
+############# INDEXES ALREADY IN THE DATABASE #############
+# returns (names, keys): keys is a set of (label, (properties,)), constraint-backed indexes included
+def database_indexes(graph):
+    names = set()
+    keys = set()
+    for index in graph.run('CALL db.indexes() YIELD name, labelsOrTypes, properties RETURN name, labelsOrTypes, properties').data():
+        names.add(index['name'])
+        for label in index['labelsOrTypes'] or []:
+            keys.add((label, tuple(sorted(index['properties'] or []))))
+    return names, keys
+
+# query_list without the advised statements an earlier run already created
+def without_existing_indexes(query_list, indexes):
+    names, keys = indexes
+    kept = []
+    for query in query_list:
+        advised = advised_pattern.fullmatch(query.strip())
+        if advised and (advised.group(1) in names
+                        or (advised.group(2), tuple(sorted(name.split('.')[-1].strip() for name in advised.group(3).split(',')))) in keys):
+            continue
+        kept.append(query)
+    return kept
+
+############# COMMAND LINE #############
+if __name__ == '__main__':
+    # the build script holds the statements; importing it doesn't start a build
+    import database_update_script as build
+    build.query_list = []
+    advice = advise_indexes(build.append_queries(False) + [build.comp_ele_similarity_query])
+    for key in advice['keys']:
+        print(('covered   ' if key['covered'] else 'MISSING   ') + key['label'] + '(' + ', '.join(key['properties']) + ')  queries ' + ', '.join(map(str, key['queries'])))
+    for lookup in advice['unlabeled']:
+        print('UNLABELED ' + lookup['property'] + '  queries ' + ', '.join(map(str, lookup['queries'])) + '  (no label, can\'t use an index)')
+    for statement in advice['statements']:
+        print(statement)
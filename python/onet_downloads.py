@@ -0,0 +1,187 @@
+############# DOWNLOAD STAGE FOR ONET .XLSX WORKBOOKS #############
+# Scrapes the ONET database page once, keeps only the workbooks the loader needs,
+# then fetches them concurrently over a shared, pooled requests.Session.
+# index_url can point at a local stand-in (e.g. python -m http.server serving a saved
+# copy of database.html and the workbooks) - links are resolved relative to it.
+# A manifest in the import folder records ETag, Last-Modified, size and sha256 of every
+# workbook, so unchanged workbooks are neither downloaded nor converted again, and
+# interrupted downloads resume from their .part file with a Range request.
+
+from bs4 import BeautifulSoup
+import requests
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urljoin
+import threading
+import hashlib
+import json
+import re
+import os
+
+onet_index_url = 'https://www.onetcenter.org/database.html#all-files'
+download_workers = 8 # size of the worker pool and of the keep-alive connection pool
+manifest_file_name = 'onet_manifest.json'
+chunk_size = 1024 * 1024 # bytes streamed to disk per write
+manifest_lock = threading.Lock() # download threads share one manifest
+
+############# SANITIZE LINK INTO THE FILE NAME USED IN THE IMPORT FOLDER #############
+def sanitize_file_name(file_url):
+    xlsx_file_name = re.search('[^/]+$', file_url).group(0)
+    xlsx_file_name = xlsx_file_name.replace('%20', '')
+    xlsx_file_name = xlsx_file_name.replace('%2C', '')
+    xlsx_file_name = xlsx_file_name.replace('-', '')
+    xlsx_file_name = xlsx_file_name.replace(',', '')
+    xlsx_file_name = xlsx_file_name.replace('_', '')
+    xlsx_file_name = xlsx_file_name.lower()
+    return xlsx_file_name
+
+############# FILTER PAGE LINKS AGAINST THE FILES THE SCRIPT USES #############
+# returns (needed, skipped): needed is a list of (absolute file_url, xlsx_file_name)
+def find_needed_links(html, index_url, files_used):
+    soup = BeautifulSoup(html, 'html.parser')
+    needed = []
+    skipped = []
+    seen = set()
+    for link in soup.find_all('a'):
+        # if it's an href attribute & contains .xlsx, consider it
+        if 'href' in link.attrs and '.xlsx' in link.attrs['href']:
+            file_url = urljoin(index_url, link.attrs['href'])
+            xlsx_file_name = sanitize_file_name(file_url)
+            if xlsx_file_name in seen: # page links some workbooks more than once
+                continue
+            seen.add(xlsx_file_name)
+            # only download the file if it's actually used
+            if xlsx_file_name.replace('.xlsx', '.csv') in files_used:
+                needed.append((file_url, xlsx_file_name))
+            else:
+                skipped.append(xlsx_file_name)
+    return needed, skipped
+
+############# SHARED SESSION WITH A CONNECTION POOL SIZED TO THE WORKERS #############
+def create_session(workers=download_workers):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers, max_retries=3)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+############# MANIFEST OF SOURCE FILES IN THE IMPORT FOLDER #############
+def load_manifest(path):
+    manifest_path = os.path.join(path, manifest_file_name)
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path, 'r') as manifest_file:
+        return json.load(manifest_file)
+
+# write to a temp file first so an interrupted run never leaves a half-written manifest
+def save_manifest(path, manifest):
+    manifest_path = os.path.join(path, manifest_file_name)
+    with open(manifest_path + '.tmp', 'w') as manifest_file:
+        json.dump(manifest, manifest_file, indent=2, sort_keys=True)
+    os.replace(manifest_path + '.tmp', manifest_path)
+
+def update_manifest_entry(path, manifest, xlsx_file_name, entry):
+    with manifest_lock:
+        manifest[xlsx_file_name] = entry
+        save_manifest(path, manifest)
+
+def file_sha256(file_path):
+    sha = hashlib.sha256()
+    with open(file_path, 'rb') as source_file:
+        for chunk in iter(lambda: source_file.read(chunk_size), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+# a file counts as converted only if the csv exists and was made from the recorded download
+def is_converted(path, xlsx_file_name, entry):
+    csv_file_name = xlsx_file_name.replace('.xlsx', '.csv')
+    return bool(entry.get('sha256')) and entry.get('converted_sha256') == entry.get('sha256') \
+        and os.path.exists(os.path.join(path, csv_file_name))
+
+# called by the conversion stage once a workbook's csv has been written
+def record_conversion(path, xlsx_file_name):
+    manifest = load_manifest(path)
+    if xlsx_file_name in manifest:
+        manifest[xlsx_file_name]['converted_sha256'] = manifest[xlsx_file_name]['sha256']
+        save_manifest(path, manifest)
+
+############# CONDITIONAL, RESUMABLE DOWNLOAD OF ONE WORKBOOK #############
+# returns (xlsx_file_name, status) with status 'downloaded' or 'unchanged'
+def download_file(session, file_url, path, xlsx_file_name, manifest):
+    entry = dict(manifest.get(xlsx_file_name, {}))
+    xlsx_path = os.path.join(path, xlsx_file_name)
+    part_path = xlsx_path + '.part'
+    headers = {}
+    # only ask for a 304 if the csv we'd otherwise rebuild is already there
+    if is_converted(path, xlsx_file_name, entry):
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+    # resume an interrupted download, as long as the server still has the same file
+    resume_from = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    if resume_from and (entry.get('partial_etag') or entry.get('partial_last_modified')):
+        headers['Range'] = 'bytes=' + str(resume_from) + '-'
+        headers['If-Range'] = entry.get('partial_etag') or entry.get('partial_last_modified')
+
+    with session.get(file_url, headers=headers, stream=True) as response:
+        if response.status_code == 304:
+            return xlsx_file_name, 'unchanged'
+        if response.status_code == 416: # stale .part, start over
+            os.remove(part_path)
+            entry.pop('partial_etag', None)
+            entry.pop('partial_last_modified', None)
+            update_manifest_entry(path, manifest, xlsx_file_name, entry)
+            return download_file(session, file_url, path, xlsx_file_name, manifest)
+        response.raise_for_status()
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        # remember what the .part belongs to before writing to it
+        entry['partial_etag'] = etag
+        entry['partial_last_modified'] = last_modified
+        update_manifest_entry(path, manifest, xlsx_file_name, entry)
+        # 206 means the server honoured the range, anything else is the whole file
+        mode = 'ab' if response.status_code == 206 else 'wb'
+        with open(part_path, mode) as part_file:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                part_file.write(chunk)
+
+    os.replace(part_path, xlsx_path)
+    entry = {'url': file_url,
+            'etag': etag,
+            'last_modified': last_modified,
+            'size': os.path.getsize(xlsx_path),
+            'sha256': file_sha256(xlsx_path),
+            'converted_sha256': entry.get('converted_sha256')}
+    update_manifest_entry(path, manifest, xlsx_file_name, entry)
+    # servers without validators still get caught by the content hash
+    if is_converted(path, xlsx_file_name, entry):
+        os.remove(xlsx_path)
+        return xlsx_file_name, 'unchanged'
+    return xlsx_file_name, 'downloaded'
+
+############# FETCH THE INDEX PAGE, THEN THE NEEDED WORKBOOKS IN PARALLEL #############
+# on_done(xlsx_file_name, status) is called from the calling thread as each download finishes
+# returns (downloaded, unchanged, skipped), all sorted so the summary is the same on every run
+def download_needed_files(path, files_used, index_url=onet_index_url, workers=download_workers, on_done=None):
+    manifest = load_manifest(path)
+    session = create_session(workers)
+    try:
+        index_response = session.get(index_url)
+        index_response.raise_for_status()
+        needed, skipped = find_needed_links(index_response.text, index_url, files_used)
+        downloaded = []
+        unchanged = []
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(download_file, session, file_url, path, xlsx_file_name, manifest) for file_url, xlsx_file_name in needed]
+            for future in as_completed(futures):
+                xlsx_file_name, status = future.result() # re-raises download errors in the calling thread
+                if status == 'unchanged':
+                    unchanged.append(xlsx_file_name)
+                else:
+                    downloaded.append(xlsx_file_name)
+                if on_done:
+                    on_done(xlsx_file_name, status)
+    finally:
+        session.close()
+    return sorted(downloaded), sorted(unchanged), sorted(skipped)
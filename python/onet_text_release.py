@@ -0,0 +1,108 @@
+############# OFFLINE INGEST FROM THE ONET TAB-DELIMITED TEXT RELEASE #############
+# Takes an unpacked text release directory (e.g. db_24_3_text/) or the release zip, and writes
+# the files the loader uses into the import folder as the same .csv names the .xlsx route produces.
+# Nothing is scraped or downloaded and no workbook is opened, so it works on air-gapped hosts.
+# The text files are not quoted and contain bare double quotes, so they are read with QUOTE_NONE.
+
+import zipfile
+import time
+import csv
+import io
+import os
+
+from onet_downloads import load_manifest, save_manifest
+
+chunk_rows = 5000 # rows buffered before each write to the csv
+
+# text release names that don't sanitize to the name the loader expects
+text_name_aliases = {'educationtrainingexperience': 'educationtrainingandexperience'}
+
+############# MAP A RELEASE FILE NAME TO THE CSV NAME IN THE IMPORT FOLDER #############
+# 'Education, Training, and Experience.txt' -> 'educationtrainingandexperience.csv'
+def text_csv_file_name(text_file_name):
+    name = os.path.basename(text_file_name)[:-len('.txt')]
+    for character in (' ', '-', ',', '_'):
+        name = name.replace(character, '')
+    name = name.lower()
+    return text_name_aliases.get(name, name) + '.csv'
+
+############# LIST THE .TXT FILES IN A RELEASE DIRECTORY OR ZIP #############
+# yields (text_file_name, open_function) so both sources are read the same way
+def iter_release_files(source):
+    if zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source) as release_zip:
+            for member in sorted(release_zip.namelist()):
+                if member.lower().endswith('.txt') and not os.path.basename(member).startswith('.'):
+                    yield member, lambda member=member: io.TextIOWrapper(release_zip.open(member), encoding='utf-8-sig', newline='')
+    elif os.path.isdir(source):
+        for text_file_name in sorted(os.listdir(source)):
+            if text_file_name.lower().endswith('.txt'):
+                text_path = os.path.join(source, text_file_name)
+                yield text_file_name, lambda text_path=text_path: open(text_path, 'r', encoding='utf-8-sig', newline='')
+    else:
+        raise ValueError(source + ' is not a text release directory or zip file.')
+
+############# RELEASE FILES INSIDE THE IMPORT FOLDER #############
+# names in the import folder that belong to the release and must survive the cleanup of unused
+# files: the zip or folder itself, and every .txt file when the release was unpacked into it
+def release_file_names(source, path):
+    if not source:
+        return set()
+    source = os.path.realpath(source)
+    path = os.path.realpath(path)
+    names = set()
+    if os.path.dirname(source) == path:
+        names.add(os.path.basename(source))
+    if source == path:
+        names.update(os.path.basename(text_file_name) for text_file_name, open_text_file in iter_release_files(source))
+    return names
+
+############# REWRITE ONE TAB-DELIMITED FILE AS A QUOTED CSV #############
+def convert_text_file(text_file, csv_path):
+    rows = 0
+    reader = csv.reader(text_file, delimiter='\t', quoting=csv.QUOTE_NONE)
+    with open(csv_path, 'w', newline='', encoding='utf-8') as csv_file:
+        wr = csv.writer(csv_file, quoting=csv.QUOTE_ALL)
+        chunk = []
+        for values in reader:
+            chunk.append(values)
+            if len(chunk) == chunk_rows:
+                wr.writerows(chunk)
+                rows += len(chunk)
+                chunk = []
+        wr.writerows(chunk)
+        rows += len(chunk)
+    return rows
+
+############# INGEST EVERY USED FILE FROM THE RELEASE #############
+# returns (conversions, skipped), sorted by file name
+def ingest_text_release(source, path, files_used, on_done=None):
+    conversions = []
+    skipped = []
+    for text_file_name, open_text_file in iter_release_files(source):
+        csv_file_name = text_csv_file_name(text_file_name)
+        if csv_file_name not in files_used:
+            skipped.append(os.path.basename(text_file_name))
+            continue
+        start = time.perf_counter()
+        with open_text_file() as text_file:
+            rows = convert_text_file(text_file, os.path.join(path, csv_file_name))
+        seconds = time.perf_counter() - start
+        conversion = {'source_file_name': os.path.basename(text_file_name),
+                    'csv_file_name': csv_file_name,
+                    'rows': rows,
+                    'seconds': seconds,
+                    'rows_per_second': rows / seconds if seconds > 0 else float(rows)}
+        conversions.append(conversion)
+        if on_done:
+            on_done(conversion)
+
+    # these csvs no longer come from the recorded downloads, so the next online run must not skip them
+    manifest = load_manifest(path)
+    for conversion in conversions:
+        manifest.pop(conversion['csv_file_name'].replace('.csv', '.xlsx'), None)
+    if manifest:
+        save_manifest(path, manifest)
+
+    conversions.sort(key=lambda conversion: conversion['csv_file_name'])
+    return conversions, sorted(skipped)
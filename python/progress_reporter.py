@@ -0,0 +1,54 @@
+############# NON-BLOCKING PROGRESS REPORTERS #############
+# Everything the build wants to tell the user goes through report(event, message, **fields):
+#   'status' - a step started/finished or an error, 'file' - a file was downloaded/converted,
+#   'query'  - a query finished (index, seconds, ok, completed, total), 'done' - the build finished
+# console prints the message, jsonl writes one json object per event (for log shippers and CI),
+# gui repaints one progress window with read(timeout=0). None of them sleep or wait for input.
+
+import json
+import time
+import sys
+
+reporter_kinds = ('console', 'jsonl', 'gui')
+
+def console_reporter(stream=None):
+    def report(event, message='', **fields):
+        print(message, file=stream or sys.stdout, flush=True)
+    return report
+
+def json_lines_reporter(stream=None):
+    def report(event, message='', **fields):
+        record = {'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'event': event, 'message': message}
+        record.update(fields)
+        out = stream or sys.stdout
+        out.write(json.dumps(record, default=str) + '\n')
+        out.flush()
+    return report
+
+# gui is the PySimpleGUI module, passed in so headless installs never import it
+def gui_reporter(gui, font):
+    windows = {}
+    def report(event, message='', **fields):
+        print(message, flush=True)
+        if 'progress' not in windows:
+            layout = [[gui.Text('PROGRESS UPDATES', font=(font))],
+                    [gui.Text(' ', size=(100, 1), font=(font), key='status')],
+                    [gui.Text(' ', size=(100, 1), font=(font), key='detail')],
+                    [gui.Text(' ', size=(100, 1), font=(font), key='count')]]
+            windows['progress'] = gui.Window('Progress Updates', layout, finalize=True)
+        window = windows['progress']
+        window['status' if event in ('status', 'done') else 'detail'].update(message)
+        if 'completed' in fields:
+            window['count'].update(str(fields['completed']) + '/' + str(fields['total']) + ' finished')
+        window.read(timeout=0)
+        if event == 'done':
+            window.close()
+            del windows['progress']
+    return report
+
+def make_reporter(kind, gui=None, font=None):
+    if kind == 'jsonl':
+        return json_lines_reporter()
+    if kind == 'gui':
+        return gui_reporter(gui, font)
+    return console_reporter()
@@ -0,0 +1,131 @@
+############# STRUCTURED PER-QUERY METRICS #############
+# One json line per executed query under logs/, with everything apoc.periodic.iterate returns
+# (batches, total, timeTaken, committedOperations, failedOperations, failedBatches, retries,
+# errorMessages) next to our own wall time, input file and rows per second.
+# Queries are matched between runs by a hash of their text, so adding a query doesn't shift the rest.
+#
+#   python query_metrics.py report <run.jsonl> [baseline.jsonl]   flag regressions against the baseline
+#   python query_metrics.py baseline <run.jsonl> [baseline.jsonl]  store a run as the baseline
+
+import hashlib
+import shutil
+import json
+import time
+import sys
+import os
+
+from import_validation import file_pattern
+
+metrics_file_prefix = 'query_metrics_'
+baseline_file_name = 'query_metrics_baseline.jsonl'
+apoc_counters = ('batches', 'total', 'timeTaken', 'committedOperations', 'failedOperations',
+                'failedBatches', 'retries', 'errorMessages')
+
+# a query is slower than its baseline by this factor and at least min_seconds
+slowdown_factor = 1.25
+min_seconds = 1.0
+
+def query_key(query):
+    return hashlib.sha256(query.encode('utf-8')).hexdigest()[:16]
+
+def run_metrics_path(log_path, run_id):
+    return os.path.join(log_path, metrics_file_prefix + run_id + '.jsonl')
+
+def new_run_id():
+    return time.strftime('%Y%m%d-%H%M%S')
+
+############# FAILED BATCHES #############
+# the error of an apoc.periodic.iterate result that reports failed batches or error messages, else None
+# result is the first row the query returned, or None
+def iterate_error(result):
+    result = result or {}
+    operations = result.get('operations') or {}
+    failed = result.get('failedBatches') or result.get('failedOperations') or operations.get('failed')
+    messages = result.get('errorMessages') or operations.get('errors')
+    if failed or messages:
+        return str(messages or 'failed batches')
+    return None
+
+############# ONE RECORD PER QUERY #############
+# result is the first row the query returned (the apoc counters), or None
+def metrics_record(run_id, index, query, seconds, ok, result=None, error=None):
+    input_files = sorted(set(file_pattern.findall(query)))
+    record = {'run_id': run_id,
+            'query': index + 1,
+            'query_key': query_key(query),
+            'input_file': input_files[0] if input_files else None,
+            'seconds': seconds,
+            'ok': ok,
+            'error': error}
+    result = result or {}
+    for counter in apoc_counters:
+        record[counter] = result.get(counter)
+    # older calls yield only 'operations' ({total, committed, failed, errors})
+    operations = result.get('operations') or {}
+    if record['committedOperations'] is None and operations:
+        record['committedOperations'] = operations.get('committed')
+        record['failedOperations'] = operations.get('failed')
+    record['rows'] = record['total']
+    record['rows_per_second'] = record['rows'] / seconds if record['rows'] is not None and seconds > 0 else None
+    return record
+
+def append_record(metrics_path, record):
+    with open(metrics_path, 'a') as metrics_file:
+        metrics_file.write(json.dumps(record, default=str) + '\n')
+
+def read_records(metrics_path):
+    with open(metrics_path, 'r') as metrics_file:
+        return [json.loads(line) for line in metrics_file if line.strip()]
+
+############# COMPARE A RUN WITH THE BASELINE #############
+# returns a list of {'query', 'query_key', 'input_file', 'problem'}
+def find_regressions(records, baseline_records, factor=slowdown_factor, minimum_seconds=min_seconds):
+    baseline = {record['query_key']: record for record in baseline_records}
+    regressions = []
+    for record in records:
+        problems = []
+        base = baseline.get(record['query_key'])
+        if not record['ok']:
+            problems.append('failed: ' + str(record['error']))
+        if (record.get('failedBatches') or 0) > 0:
+            problems.append(str(record['failedBatches']) + ' failed batches: ' + str(record.get('errorMessages')))
+        if base:
+            if record['seconds'] > base['seconds'] * factor and record['seconds'] - base['seconds'] >= minimum_seconds:
+                problems.append(f'{record["seconds"]:0.2f}s vs {base["seconds"]:0.2f}s baseline')
+            if (record.get('retries') or 0) > (base.get('retries') or 0):
+                problems.append(str(record['retries']) + ' retries vs ' + str(base.get('retries') or 0) + ' baseline')
+            if record.get('rows') is not None and base.get('rows') is not None and record['rows'] < base['rows']:
+                problems.append(str(record['rows']) + ' rows vs ' + str(base['rows']) + ' baseline')
+        for problem in problems:
+            regressions.append({'query': record['query'], 'query_key': record['query_key'],
+                                'input_file': record['input_file'], 'problem': problem})
+    return regressions
+
+def report_lines(records, baseline_records):
+    lines = []
+    total_seconds = sum(record['seconds'] for record in records)
+    baseline_seconds = sum(record['seconds'] for record in baseline_records)
+    lines.append(f'{len(records)} queries in {total_seconds:0.2f}s (baseline {len(baseline_records)} queries in {baseline_seconds:0.2f}s)')
+    regressions = find_regressions(records, baseline_records)
+    for regression in regressions:
+        lines.append('REGRESSION query ' + str(regression['query']) + ' (' + str(regression['input_file'] or regression['query_key']) + '): ' + regression['problem'])
+    lines.append(str(len(regressions)) + ' regressions.')
+    return lines, regressions
+
+############# COMMAND LINE #############
+if __name__ == '__main__':
+    log_path = os.path.abspath(os.path.join(os.path.dirname( __file__ ), '..', 'logs'))
+    arguments = sys.argv[1:]
+    if len(arguments) >= 2 and arguments[0] in ('report', 'baseline'):
+        baseline_path = arguments[2] if len(arguments) > 2 else os.path.join(log_path, baseline_file_name)
+        if arguments[0] == 'baseline':
+            shutil.copyfile(arguments[1], baseline_path)
+            print('Saved ' + arguments[1] + ' as the baseline.')
+            sys.exit(0)
+        baseline_records = read_records(baseline_path) if os.path.exists(baseline_path) else []
+        lines, regressions = report_lines(read_records(arguments[1]), baseline_records)
+        for line in lines:
+            print(line)
+        sys.exit(1 if regressions else 0)
+    print('usage: query_metrics.py report <run.jsonl> [baseline.jsonl] | baseline <run.jsonl> [baseline.jsonl]')
+    sys.exit(2)
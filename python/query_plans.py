@@ -0,0 +1,230 @@
+############# QUERY PLAN PROFILING HARNESS #############
+# Runs every statement the build executes under EXPLAIN or PROFILE against a small fixture
+# database and records the operator tree and db hits of each one, so a badly planned load shows
+# up in a test run instead of as a 40 minute production build.
+# apoc.periodic.iterate only shows up as a ProcedureCall, so its action statement is planned on its
+# own as UNWIND $rows AS line <action>, with rows sampled from the fixture copy of its csv.
+# PROFILE executes the statement, always inside a transaction that is rolled back.
+# Flagged operators: CartesianProduct, AllNodesScan, and NodeByLabelScan under a Filter
+# (a label scan filtered on a property, where an index or constraint lookup was wanted).
+#
+#   python query_plans.py fixture <fixture folder> [rows]   first rows of every import file, build a test database from it with
+#                                                            python database_update_script.py --mode fresh --import-path <fixture folder>
+#   python query_plans.py explain|profile [--password ...]   plan every statement, write logs/query_plan_report.json
+#   python query_plans.py baseline                           keep the last report as logs/query_plan_baseline.json
+# explain/profile exit 1 when a statement has a flag its baseline didn't have, or (profile) its db hits grew.
+
+import argparse
+import shutil
+import json
+import csv
+import sys
+import os
+import re
+
+from import_validation import file_pattern
+from query_scheduler import schema_pattern
+from query_metrics import query_key
+
+fixture_rows = 200 # rows kept per file in the fixture import folder
+sample_rows = 50 # rows per UNWIND $rows when planning an apoc action
+db_hits_factor = 1.5 # profile db hits may grow this much before it's a regression
+report_file_name = 'query_plan_report.json'
+baseline_file_name = 'query_plan_baseline.json'
+
+iterate_pattern = re.compile(r'apoc\.periodic\.iterate\(\s*"(.*?)"\s*,\s*"(.*?)"\s*,\s*\{', re.DOTALL)
+
+############# FIXTURE DATASET #############
+# the first rows of every file the queries read, with the header
+def write_fixture(path, fixture_path, file_names, rows=fixture_rows):
+    os.makedirs(fixture_path, exist_ok=True)
+    written = []
+    for file_name in file_names:
+        if not os.path.isfile(os.path.join(path, file_name)):
+            continue
+        with open(os.path.join(path, file_name), 'r', newline='', encoding='utf-8-sig') as source, \
+                open(os.path.join(fixture_path, file_name), 'w', newline='', encoding='utf-8') as fixture:
+            for line_number, line in enumerate(source):
+                if line_number > rows:
+                    break
+                fixture.write(line)
+        written.append(file_name)
+    return written
+
+# LOAD CSV WITH HEADERS gives strings, and null for empty fields
+def read_sample_rows(path, file_name, rows=sample_rows):
+    file_path = os.path.join(path, file_name)
+    if not os.path.isfile(file_path):
+        return []
+    sample = []
+    with open(file_path, 'r', newline='', encoding='utf-8-sig') as f:
+        for row in csv.DictReader(f):
+            if len(sample) >= rows:
+                break
+            sample.append({column: (value if value != '' else None) for column, value in row.items()})
+    return sample
+
+############# STATEMENTS TO PLAN #############
+# returns [{'query', 'query_key', 'input_file', 'statement', 'rows'}], rows is None for plain statements
+# schema statements can't be planned and are left out
+def plan_statements(query_list, path):
+    statements = []
+    for index, query in enumerate(query_list):
+        if schema_pattern.search(query):
+            continue
+        input_files = file_pattern.findall(query)
+        entry = {'query': index + 1, 'query_key': query_key(query), 'input_file': input_files[0] if input_files else None}
+        iterate = iterate_pattern.search(query)
+        if iterate:
+            entry['statement'] = 'UNWIND $rows AS line\n' + iterate.group(2)
+            entry['rows'] = read_sample_rows(path, entry['input_file']) if entry['input_file'] else []
+        else:
+            entry['statement'] = query
+            entry['rows'] = None
+        statements.append(entry)
+    return statements
+
+############# OPERATOR TREES #############
+# py2neo hands back plan objects (or dicts from older drivers); keep the parts worth comparing
+def plan_tree(plan):
+    def field(*names):
+        for name in names:
+            value = plan.get(name) if isinstance(plan, dict) else getattr(plan, name, None)
+            if value is not None:
+                return value
+        return None
+    arguments = field('args', 'arguments') or {}
+    return {'operator': str(field('operator_type', 'operatorType')).split('@')[0],
+            'identifiers': sorted(field('identifiers') or []),
+            'details': str(arguments.get('Details') or arguments.get('ExpandExpression') or arguments.get('LegacyExpression') or ''),
+            'db_hits': field('db_hits', 'dbHits'),
+            'rows': field('rows'),
+            'children': [plan_tree(child) for child in field('children') or []]}
+
+def total_db_hits(tree):
+    return (tree['db_hits'] or 0) + sum(total_db_hits(child) for child in tree['children'])
+
+# returns a sorted list of 'CartesianProduct', 'AllNodesScan', 'NodeByLabelScan under Filter'
+def plan_flags(tree, under_filter=False):
+    flags = set()
+    if tree['operator'] in ('CartesianProduct', 'AllNodesScan'):
+        flags.add(tree['operator'])
+    if tree['operator'] == 'NodeByLabelScan' and under_filter:
+        flags.add('NodeByLabelScan under Filter')
+    for child in tree['children']:
+        flags.update(plan_flags(child, under_filter or tree['operator'] == 'Filter'))
+    return sorted(flags)
+
+def plan_lines(tree, depth=0):
+    lines = ['  ' * depth + tree['operator'] + (' ' + tree['details'] if tree['details'] else '')
+             + (' (' + str(tree['db_hits']) + ' db hits)' if tree['db_hits'] is not None else '')]
+    for child in tree['children']:
+        lines.extend(plan_lines(child, depth + 1))
+    return lines
+
+############# PLAN ONE STATEMENT #############
+# mode is 'EXPLAIN' or 'PROFILE'; returns the entry with 'plan', 'db_hits', 'flags' and 'error' added
+def plan_statement(graph, entry, mode='EXPLAIN'):
+    result = {key: value for key, value in entry.items() if key != 'rows'}
+    result.update({'mode': mode, 'plan': None, 'db_hits': None, 'flags': [], 'error': None})
+    parameters = {'rows': entry['rows']} if entry['rows'] is not None else {}
+    tx = graph.begin()
+    try:
+        cursor = tx.run(mode + ' ' + entry['statement'], parameters)
+        cursor.data()
+        tree = plan_tree(cursor.plan())
+        result['plan'] = tree
+        result['db_hits'] = total_db_hits(tree) if mode == 'PROFILE' else None
+        result['flags'] = plan_flags(tree)
+    except Exception as e:
+        result['error'] = repr(e)
+    finally:
+        if not tx.finished():
+            tx.rollback() # PROFILE wrote to the fixture, never keep it
+    return result
+
+def plan_all(graph, query_list, path, mode='EXPLAIN', on_done=None):
+    results = []
+    for entry in plan_statements(query_list, path):
+        results.append(plan_statement(graph, entry, mode))
+        if on_done:
+            on_done(results[-1])
+    return results
+
+############# COMPARE WITH THE BASELINE #############
+# returns a list of {'query', 'input_file', 'problem'}
+def find_plan_regressions(results, baseline_results, factor=db_hits_factor):
+    baseline = {result['query_key']: result for result in baseline_results}
+    regressions = []
+    for result in results:
+        base = baseline.get(result['query_key'])
+        problems = []
+        if result['error']:
+            problems.append('could not plan: ' + result['error'])
+        for flag in result['flags']:
+            if base is None or flag not in base['flags']:
+                problems.append(flag)
+        if base and result['db_hits'] is not None and base.get('db_hits') is not None \
+                and result['db_hits'] > base['db_hits'] * factor:
+            problems.append(str(result['db_hits']) + ' db hits vs ' + str(base['db_hits']) + ' baseline')
+        for problem in problems:
+            regressions.append({'query': result['query'], 'input_file': result['input_file'], 'problem': problem})
+    return regressions
+
+def read_results(report_path):
+    if not os.path.exists(report_path):
+        return []
+    with open(report_path, 'r') as report_file:
+        return json.load(report_file)
+
+############# COMMAND LINE #############
+if __name__ == '__main__':
+    assumed_path = os.path.abspath(os.path.join(os.path.dirname( __file__ ), '..', 'import'))
+    log_path = os.path.abspath(os.path.join(os.path.dirname( __file__ ), '..', 'logs'))
+    report_path = os.path.join(log_path, report_file_name)
+    baseline_path = os.path.join(log_path, baseline_file_name)
+    parser = argparse.ArgumentParser(description='Plan every build statement against a fixture database.')
+    parser.add_argument('command', choices=('fixture', 'explain', 'profile', 'baseline'))
+    parser.add_argument('fixture_path', nargs='?', help='fixture import folder (fixture command)')
+    parser.add_argument('rows', nargs='?', type=int, default=fixture_rows, help='rows per file (fixture command)')
+    parser.add_argument('--host', default=os.environ.get('NEO4J_HOST', 'localhost'), help='fixture database host (NEO4J_HOST)')
+    parser.add_argument('--port', default=os.environ.get('NEO4J_PORT', '7687'), help='bolt port (NEO4J_PORT)')
+    parser.add_argument('--user', default=os.environ.get('NEO4J_USER', 'neo4j'), help='database user (NEO4J_USER)')
+    parser.add_argument('--password', default=os.environ.get('NEO4J_PASSWORD'), help='database password (NEO4J_PASSWORD)')
+    parser.add_argument('--import-path', default=os.environ.get('ONET_IMPORT_PATH', assumed_path), help='import folder the sample rows come from (ONET_IMPORT_PATH)')
+    arguments = parser.parse_args()
+
+    # the build script holds the statements; importing it doesn't start a build
+    import database_update_script as build
+
+    if arguments.command == 'fixture':
+        if not arguments.fixture_path:
+            parser.error('fixture needs a fixture folder')
+        for file_name in write_fixture(arguments.import_path, arguments.fixture_path, build.files_used, arguments.rows):
+            print('Wrote ' + file_name)
+        sys.exit(0)
+    if arguments.command == 'baseline':
+        shutil.copyfile(report_path, baseline_path)
+        print('Saved ' + report_path + ' as the baseline.')
+        sys.exit(0)
+
+    from py2neo import Graph
+    graph = Graph('bolt://' + arguments.host + ':' + arguments.port, auth=(arguments.user, arguments.password))
+    build.query_list = []
+    query_list = build.append_queries(False) + [build.comp_ele_similarity_query]
+
+    def planned(result):
+        print('Query ' + str(result['query']) + ' (' + str(result['input_file']) + '): '
+              + (result['error'] or ', '.join(result['flags']) or 'ok')
+              + (' ' + str(result['db_hits']) + ' db hits' if result['db_hits'] is not None else ''))
+        if result['flags']:
+            for line in plan_lines(result['plan']):
+                print('    ' + line)
+    results = plan_all(graph, query_list, arguments.import_path, arguments.command.upper(), on_done=planned)
+    with open(report_path, 'w') as report_file:
+        json.dump(results, report_file, indent=2, default=str)
+    regressions = find_plan_regressions(results, read_results(baseline_path))
+    for regression in regressions:
+        print('REGRESSION query ' + str(regression['query']) + ' (' + str(regression['input_file']) + '): ' + regression['problem'])
+    print(str(len(results)) + ' statements planned, ' + str(len(regressions)) + ' regressions. Report: ' + report_path)
+    sys.exit(1 if regressions else 0)
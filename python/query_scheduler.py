@@ -0,0 +1,170 @@
+############# DEPENDENCY-AWARE PARALLEL SCHEDULER FOR QUERY_LIST #############
+# Every query is declared with the node labels it reads and writes. By default the declaration is
+# taken from the cypher itself: labels in MATCH patterns are read, labels in MERGE/CREATE patterns,
+# SET n:Label and nodes whose properties are SET or that are DELETEd are written. declared_labels overrides that per query.
+# A relationship MERGE/CREATE locks both of its end nodes, so the labels they were bound with are
+# written too: two loads that add edges to the same Occupation/Workrole nodes never run together.
+# apoc.create.addLabels(n, [...]) writes its literal labels; a label taken from the row writes the
+# labels of the IN [...] list it is checked against, and without one the query is a barrier.
+# A query depends on every earlier query it conflicts with (one writes a label the other reads
+# or writes). Schema statements (constraints, indexes, apoc.schema) and queries without labels
+# (MATCH (n) DETACH DELETE n) are barriers that run alone, in list order.
+# run_scheduled starts each query as soon as its dependencies have finished, on a pool of
+# sessions, so a build is bounded by the critical path instead of the sum of all query times.
+
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import time
+import re
+
+query_workers = 4 # concurrent sessions
+
+clause_pattern = re.compile(r'(?<!\.)\b(OPTIONAL\s+MATCH|MATCH|MERGE|CREATE|ON\s+CREATE\s+SET|ON\s+MATCH\s+SET|SET|REMOVE|DETACH\s+DELETE|DELETE|WITH|WHERE|RETURN|UNWIND|CALL|YIELD|LOAD\s+CSV)\b', re.IGNORECASE)
+add_labels_pattern = re.compile(r'apoc\.create\.addLabels\(\s*\w+\s*,\s*\[([^\]]*)\]\s*\)', re.IGNORECASE)
+node_pattern = re.compile(r'\(\s*(\w*)\s*((?::\s*`?\w+`?\s*)+)')
+label_pattern = re.compile(r':\s*`?(\w+)`?')
+relationship_pattern = re.compile(r'<?-\s*\[|\]\s*->?|<?--')
+node_variable_pattern = re.compile(r'\(\s*(\w+)\s*[:){]')
+set_label_pattern = re.compile(r'\b(\w+)((?:\s*:\s*`?\w+`?)+)')
+updated_variable_pattern = re.compile(r'\b(\w+)\s*(?:\.|\+=|=)')
+schema_pattern = re.compile(r'\b(CREATE\s+CONSTRAINT|DROP\s+CONSTRAINT|CREATE\s+INDEX|DROP\s+INDEX|apoc\.schema\.|db\.index\.|db\.awaitIndexes)', re.IGNORECASE)
+
+# {query text: (reads, writes)} for queries the cypher alone doesn't describe well
+declared_labels = {}
+
+############# LABELS READ AND WRITTEN BY ONE QUERY #############
+# returns (reads, writes, barrier)
+def query_labels(query):
+    if query in declared_labels:
+        reads, writes = declared_labels[query]
+        return set(reads), set(writes), False
+    if schema_pattern.search(query):
+        return set(), set(), True
+    reads = set()
+    writes = set()
+    variables = {} # variable -> labels it was bound with
+    # property maps and the apoc config map can't hold labels, but look like n:Label inside SET
+    clauses = clause_pattern.split(re.sub(r'\{[^{}]*\}', '{}', query))
+    # split() gives [text before the first clause, keyword, text, keyword, text, ...]
+    for keyword, text in zip(clauses[1::2], clauses[2::2]):
+        keyword = ' '.join(keyword.upper().split())
+        if keyword in ('MATCH', 'OPTIONAL MATCH', 'MERGE', 'CREATE'):
+            for variable, labels in node_pattern.findall(text):
+                labels = set(label_pattern.findall(labels))
+                if variable:
+                    variables.setdefault(variable, set()).update(labels)
+                (reads if keyword.endswith('MATCH') else writes).update(labels)
+            if keyword in ('MERGE', 'CREATE') and relationship_pattern.search(text):
+                for variable in node_variable_pattern.findall(text):
+                    writes.update(variables.get(variable, ()))
+        elif keyword in ('SET', 'ON CREATE SET', 'ON MATCH SET', 'REMOVE'):
+            # adding a label only changes which nodes match that label
+            for variable, labels in set_label_pattern.findall(text):
+                writes.update(label_pattern.findall(labels))
+            for variable in updated_variable_pattern.findall(text):
+                writes.update(variables.get(variable, ()))
+        elif keyword in ('DELETE', 'DETACH DELETE'):
+            for variable in re.findall(r'\w+', text):
+                if variable in variables and not variables[variable]:
+                    return set(), set(), True # deletes unlabeled nodes
+                writes.update(variables.get(variable, ()))
+    for items in add_labels_pattern.findall(query):
+        for item in items.split(','):
+            item = item.strip()
+            if re.fullmatch(r"'\w+'", item):
+                writes.add(item[1:-1])
+                continue
+            allowed = re.search(re.escape(item) + r'\s+IN\s*\[([^\]]*)\]', query)
+            if not allowed:
+                return set(), set(), True # labels only known when it runs
+            writes.update(re.findall(r"'(\w+)'", allowed.group(1)))
+    if not reads and not writes:
+        return set(), set(), True
+    return reads, writes, False
+
+############# DEPENDENCY GRAPH #############
+# returns [{'index', 'query', 'reads', 'writes', 'barrier', 'depends_on'}] in query_list order
+# groups are lists of indexes that run as one unit (client_loader's shared scans): the first of a
+# group waits for everything any of them depends on, the others wait for the ones before them
+def build_dependency_graph(query_list, groups=()):
+    nodes = []
+    for index, query in enumerate(query_list):
+        reads, writes, barrier = query_labels(query)
+        depends_on = set()
+        for earlier in nodes:
+            if barrier or earlier['barrier'] \
+                    or earlier['writes'] & (reads | writes) \
+                    or earlier['reads'] & writes:
+                depends_on.add(earlier['index'])
+        nodes.append({'index': index, 'query': query, 'reads': reads, 'writes': writes,
+                      'barrier': barrier, 'depends_on': depends_on})
+    for group in groups:
+        outside = set().union(*(nodes[index]['depends_on'] for index in group)) - set(group)
+        for position, index in enumerate(sorted(group)):
+            nodes[index]['depends_on'] |= outside | set(sorted(group)[:position])
+    return nodes
+
+# level of each query: 0 has no dependencies, n runs after something on level n-1
+# the number of levels is the length of the critical path in queries
+def query_stages(nodes):
+    levels = []
+    for node in nodes:
+        levels.append(1 + max((levels[index] for index in node['depends_on']), default=-1))
+    stages = [[] for level in range(max(levels, default=-1) + 1)]
+    for node, level in zip(nodes, levels):
+        stages[level].append(node['index'])
+    return stages
+
+############# RUN ONE QUERY IN ITS OWN TRANSACTION #############
+# returns {'index', 'seconds', 'ok', 'error', 'result'}, result is the first row returned (the apoc counters)
+# apoc.periodic.iterate reports failed batches in 'operations'
+def run_query(graph, index, query):
+    query_time_start = time.perf_counter()
+    outcome = {'index': index, 'ok': True, 'error': None, 'result': None}
+    tx = graph.begin()
+    try:
+        result = tx.run(query).data()
+        outcome['result'] = result[0] if result else None
+        if result and 'operations' in result[0] and result[0]['operations']['failed'] > 0:
+            outcome['ok'] = False
+            outcome['error'] = str(result[0]['operations'].get('errorMessages') or 'failed batches')
+            tx.rollback()
+        else:
+            tx.commit()
+    except Exception as e:
+        outcome['ok'] = False
+        outcome['error'] = repr(e)
+        if not tx.finished():
+            tx.rollback()
+    outcome['seconds'] = time.perf_counter() - query_time_start
+    return outcome
+
+############# RUN QUERY_LIST ON A POOL OF SESSIONS #############
+# on_done(outcome, completed, total) is called in the calling thread, so it may update the GUI
+# like the sequential loop, a failed query is reported and the build carries on
+# skip holds indexes finished by an earlier run (see build_checkpoint), they count as done
+# run(graph, index, query) executes one query, database_driver.run_pooled_query runs it on a pooled driver
+# groups are passed on to build_dependency_graph
+# returns the outcomes in query_list order
+def run_scheduled(graph, query_list, workers=query_workers, on_done=None, skip=(), run=run_query, groups=()):
+    nodes = build_dependency_graph(query_list, groups)
+    waiting = {node['index']: set(node['depends_on']) - set(skip) for node in nodes if node['index'] not in skip}
+    outcomes = {index: {'index': index, 'ok': True, 'error': None, 'seconds': 0.0, 'skipped': True} for index in skip}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        running = {}
+        while waiting or running:
+            # barriers depend on everything before them and everything after depends on them,
+            # so they never become ready while another query is running
+            for index in sorted(waiting):
+                if not waiting[index]:
+                    del waiting[index]
+                    running[pool.submit(run, graph, index, query_list[index])] = index
+            done, pending = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                outcome = future.result()
+                del running[future]
+                outcomes[outcome['index']] = outcome
+                for dependencies in waiting.values():
+                    dependencies.discard(outcome['index'])
+                if on_done:
+                    on_done(outcome, len(outcomes), len(query_list))
+    return [outcomes[index] for index in range(len(query_list))]
@@ -0,0 +1,260 @@
+############# KEY-AWARE DIFF BETWEEN AN ARCHIVED AND A NEW RELEASE FILE #############
+# Rows are keyed by the file's natural key (e.g. O*NET-SOC Code, Element ID, Scale ID for ratings)
+# and compared through a dict, so a diff is linear in the size of both files.
+# Values are compared by column name after normalizing whitespace and numbers ('8823.0' == '8823'),
+# so re-quoting, reordered columns or xlsx vs text formatting don't show up as changes.
+# Output is split into <base>additions.csv, <base>removals.csv and <base>changes.csv.
+# Inputs too big for memory_limit are hash-partitioned by key into spill files on disk,
+# each partition is diffed on its own, and the results are merged back in file order,
+# so diff_to_files gives the same output whichever engine runs.
+
+import tempfile
+import hashlib
+import heapq
+import math
+import zlib
+import csv
+import os
+
+# natural key columns per file, by base name (no additions/archive suffix, no .csv)
+rating_key = ['O*NET-SOC Code', 'Element ID', 'Scale ID']
+natural_keys = {'abilities': rating_key,
+    'interests': rating_key,
+    'knowledge': rating_key,
+    'skills': rating_key,
+    'workactivities': rating_key,
+    'workstyles': rating_key,
+    'educationtrainingandexperience': rating_key + ['Category'],
+    'taskratings': ['O*NET-SOC Code', 'Task ID', 'Scale ID', 'Category'],
+    'occupationdata': ['O*NET-SOC Code'],
+    'contentmodelreference': ['Element ID'],
+    'scalesreference': ['Scale ID'],
+    'alternatetitles': ['O*NET-SOC Code', 'Alternate Title'],
+    'iwareference': ['IWA ID'],
+    'dwareference': ['DWA ID'],
+    'jobzonereference': ['Job Zone'],
+    'jobzones': ['O*NET-SOC Code'],
+    'taskstatements': ['O*NET-SOC Code', 'Task ID'],
+    'taskstodwas': ['O*NET-SOC Code', 'Task ID', 'DWA ID'],
+    'unspscreference': ['Commodity Code'],
+    'technologyskills': ['O*NET-SOC Code', 'Example', 'Commodity Code'],
+    'toolsused': ['O*NET-SOC Code', 'Example', 'Commodity Code']}
+
+diff_suffixes = {'added': 'additions.csv', 'removed': 'removals.csv', 'changed': 'changes.csv'}
+
+# rough bytes of python objects per byte of csv while a partition is held in memory
+memory_per_file_byte = 16
+max_partitions = 256 # open spill files per kind during the merge
+
+# 'abilitiesarchive.csv' / 'abilities.csv' -> ['O*NET-SOC Code', 'Element ID', 'Scale ID']
+# files without a known key are keyed by the whole row, so they only ever add or remove
+def natural_key_columns(file_name):
+    base_name = os.path.basename(file_name).replace('.csv', '')
+    for suffix in ('additions', 'archive'):
+        if base_name.endswith(suffix):
+            base_name = base_name[:-len(suffix)]
+    return natural_keys.get(base_name)
+
+def normalize_value(value):
+    value = value.strip()
+    try:
+        number = float(value)
+    except ValueError:
+        return value
+    if number != number or number in (float('inf'), float('-inf')): # nan/inf stay as text
+        return value
+    return str(int(number)) if number.is_integer() else repr(number)
+
+# digest of the non-key values, by column name so column order doesn't matter
+def row_digest(row, value_columns):
+    digest = hashlib.blake2b(digest_size=16)
+    for column in value_columns:
+        digest.update(normalize_value(row.get(column) or '').encode('utf-8'))
+        digest.update(b'\x1f')
+    return digest.digest()
+
+def row_key(row, key_columns):
+    return tuple(normalize_value(row.get(column) or '') for column in key_columns)
+
+############# READ ONE FILE INTO {key: (digest, row)} #############
+# repeated keys are kept apart by their occurrence number
+def read_keyed_rows(file_path, key_columns, value_columns):
+    keyed_rows = {}
+    occurrences = {}
+    with open(file_path, 'r', newline='', encoding='utf-8-sig') as csv_file:
+        for row in csv.DictReader(csv_file):
+            key = row_key(row, key_columns)
+            occurrence = occurrences.get(key, 0)
+            occurrences[key] = occurrence + 1
+            keyed_rows[(key, occurrence)] = (row_digest(row, value_columns), row)
+    return keyed_rows
+
+def read_header(file_path):
+    with open(file_path, 'r', newline='', encoding='utf-8-sig') as csv_file:
+        return next(csv.reader(csv_file), [])
+
+# only columns present in both files are compared; the key must be in both
+def diff_columns(archive_header, new_header, key_columns):
+    shared = [column for column in new_header if column in archive_header]
+    if key_columns is None or not all(column in shared for column in key_columns):
+        key_columns = shared
+    value_columns = sorted(column for column in shared if column not in key_columns)
+    return key_columns, value_columns
+
+############# DIFF TWO FILES #############
+# returns {'header', 'archive_header', 'key_columns', 'added', 'removed', 'changed'}
+# added/changed hold rows from the new file, removed holds rows from the archive
+def diff_files(archive_path, new_path, key_columns=None):
+    if key_columns is None:
+        key_columns = natural_key_columns(new_path)
+    archive_header = read_header(archive_path)
+    new_header = read_header(new_path)
+    key_columns, value_columns = diff_columns(archive_header, new_header, key_columns)
+
+    archive_rows = read_keyed_rows(archive_path, key_columns, value_columns)
+    added = []
+    changed = []
+    with open(new_path, 'r', newline='', encoding='utf-8-sig') as csv_file:
+        occurrences = {}
+        for row in csv.DictReader(csv_file):
+            key = row_key(row, key_columns)
+            occurrence = occurrences.get(key, 0)
+            occurrences[key] = occurrence + 1
+            archived = archive_rows.pop((key, occurrence), None)
+            if archived is None:
+                added.append(row)
+            elif archived[0] != row_digest(row, value_columns):
+                changed.append(row)
+    # whatever is left in the archive is gone from the new release
+    removed = [row for digest, row in archive_rows.values()]
+    return {'header': new_header,
+            'archive_header': archive_header,
+            'key_columns': key_columns,
+            'added': added,
+            'removed': removed,
+            'changed': changed}
+
+############# WRITE ADDITIONS, REMOVALS AND CHANGES #############
+# base_name is the csv name without .csv, e.g. 'abilities' -> abilitiesadditions.csv, ...
+def write_diff(diff, path, base_name):
+    counts = {}
+    for kind, suffix in diff_suffixes.items():
+        header = diff['archive_header'] if kind == 'removed' else diff['header']
+        with open(os.path.join(path, base_name + suffix), 'w', newline='', encoding='utf-8') as diff_file:
+            wr = csv.DictWriter(diff_file, fieldnames=header, quoting=csv.QUOTE_ALL, extrasaction='ignore')
+            wr.writeheader()
+            wr.writerows(diff[kind])
+        counts[kind] = len(diff[kind])
+    return counts
+
+############# EXTERNAL-MEMORY DIFF #############
+# Rows go to partitions by a hash of their normalized key, so every occurrence of a key
+# lands in the same partition, in file order. Spill rows are [sequence, values in header order].
+def partition_count(archive_path, new_path, memory_limit):
+    file_bytes = max(os.path.getsize(archive_path), os.path.getsize(new_path))
+    return min(max_partitions, max(1, math.ceil(file_bytes * memory_per_file_byte / memory_limit)))
+
+def partition_file(file_path, header, key_columns, partitions, spill_paths):
+    spill_files = [open(spill_path, 'w', newline='', encoding='utf-8') for spill_path in spill_paths]
+    try:
+        writers = [csv.writer(spill_file) for spill_file in spill_files]
+        with open(file_path, 'r', newline='', encoding='utf-8-sig') as csv_file:
+            for sequence, row in enumerate(csv.DictReader(csv_file)):
+                partition = zlib.crc32('\x1f'.join(row_key(row, key_columns)).encode('utf-8')) % partitions
+                writers[partition].writerow([sequence] + [row.get(column) for column in header])
+    finally:
+        for spill_file in spill_files:
+            spill_file.close()
+
+def iter_spill_rows(spill_path, header):
+    with open(spill_path, 'r', newline='', encoding='utf-8') as spill_file:
+        for values in csv.reader(spill_file):
+            yield int(values[0]), dict(zip(header, values[1:]))
+
+# same rules as diff_files, on one partition; results are written as spill rows in file order
+def diff_partition(archive_spill, new_spill, result_spills, diff):
+    key_columns = diff['key_columns']
+    value_columns = diff['value_columns']
+    archive_rows = {} # {(key, occurrence): (digest, sequence)}, rows are re-read for removals
+    occurrences = {}
+    for sequence, row in iter_spill_rows(archive_spill, diff['archive_header']):
+        key = row_key(row, key_columns)
+        occurrence = occurrences.get(key, 0)
+        occurrences[key] = occurrence + 1
+        archive_rows[(key, occurrence)] = (row_digest(row, value_columns), sequence)
+
+    counts = {'added': 0, 'removed': 0, 'changed': 0}
+    with open(result_spills['added'], 'w', newline='', encoding='utf-8') as added_file, \
+            open(result_spills['changed'], 'w', newline='', encoding='utf-8') as changed_file:
+        writers = {'added': csv.writer(added_file), 'changed': csv.writer(changed_file)}
+        occurrences = {}
+        for sequence, row in iter_spill_rows(new_spill, diff['header']):
+            key = row_key(row, key_columns)
+            occurrence = occurrences.get(key, 0)
+            occurrences[key] = occurrence + 1
+            archived = archive_rows.pop((key, occurrence), None)
+            if archived is None:
+                kind = 'added'
+            elif archived[0] != row_digest(row, value_columns):
+                kind = 'changed'
+            else:
+                continue
+            writers[kind].writerow([sequence] + [row[column] for column in diff['header']])
+            counts[kind] += 1
+
+    removed_sequences = set(sequence for digest, sequence in archive_rows.values())
+    archive_rows = None
+    with open(result_spills['removed'], 'w', newline='', encoding='utf-8') as removed_file:
+        wr = csv.writer(removed_file)
+        for sequence, row in iter_spill_rows(archive_spill, diff['archive_header']):
+            if sequence in removed_sequences:
+                wr.writerow([sequence] + [row[column] for column in diff['archive_header']])
+                counts['removed'] += 1
+    return counts
+
+# returns the same counts as write_diff and writes byte-identical files
+def diff_files_external(archive_path, new_path, path, base_name, key_columns=None, memory_limit=256 * 1024 * 1024, temp_dir=None):
+    if key_columns is None:
+        key_columns = natural_key_columns(new_path)
+    archive_header = read_header(archive_path)
+    new_header = read_header(new_path)
+    key_columns, value_columns = diff_columns(archive_header, new_header, key_columns)
+    diff = {'header': new_header,
+            'archive_header': archive_header,
+            'key_columns': key_columns,
+            'value_columns': value_columns}
+    partitions = partition_count(archive_path, new_path, memory_limit)
+
+    with tempfile.TemporaryDirectory(prefix=base_name + '_diff_', dir=temp_dir) as spill_dir:
+        archive_spills = [os.path.join(spill_dir, 'archive' + str(partition)) for partition in range(partitions)]
+        new_spills = [os.path.join(spill_dir, 'new' + str(partition)) for partition in range(partitions)]
+        partition_file(archive_path, archive_header, key_columns, partitions, archive_spills)
+        partition_file(new_path, new_header, key_columns, partitions, new_spills)
+
+        result_spills = [{kind: os.path.join(spill_dir, kind + str(partition)) for kind in diff_suffixes}
+                        for partition in range(partitions)]
+        counts = {'added': 0, 'removed': 0, 'changed': 0}
+        for partition in range(partitions):
+            partition_counts = diff_partition(archive_spills[partition], new_spills[partition], result_spills[partition], diff)
+            os.remove(archive_spills[partition])
+            os.remove(new_spills[partition])
+            for kind in counts:
+                counts[kind] += partition_counts[kind]
+
+        # merge the partitions back into file order
+        for kind, suffix in diff_suffixes.items():
+            header = archive_header if kind == 'removed' else new_header
+            spill_iters = [iter_spill_rows(spills[kind], header) for spills in result_spills]
+            with open(os.path.join(path, base_name + suffix), 'w', newline='', encoding='utf-8') as diff_file:
+                wr = csv.DictWriter(diff_file, fieldnames=header, quoting=csv.QUOTE_ALL, extrasaction='ignore')
+                wr.writeheader()
+                for sequence, row in heapq.merge(*spill_iters, key=lambda item: item[0]):
+                    wr.writerow(row)
+    return counts
+
+############# DIFF TWO FILES AND WRITE THE RESULT #############
+# memory_limit in bytes; None always diffs in memory, otherwise big inputs are diffed on disk
+def diff_to_files(archive_path, new_path, path, base_name, key_columns=None, memory_limit=None, temp_dir=None):
+    if memory_limit is not None and partition_count(archive_path, new_path, memory_limit) > 1:
+        return diff_files_external(archive_path, new_path, path, base_name, key_columns, memory_limit, temp_dir)
+    return write_diff(diff_files(archive_path, new_path, key_columns), path, base_name)
@@ -0,0 +1,155 @@
+############# VERSIONED, CONTENT-ADDRESSED SNAPSHOTS OF RELEASE FILES #############
+# Keeps every release's csvs under <import>/snapshots/ instead of a single *archive.csv per file:
+#   objects/ab/ab12...ef.csv.gz   gzip of a csv, named by the sha256 of its uncompressed bytes
+#   index.json                    {release: {'date': 'YYYY-MM-DD', 'files': {file_name: sha256}}}
+# A file that doesn't change between releases is stored once. File names are stored without
+# the additions/archive suffix (abilities.csv), so releases from either script line up.
+# Any two stored releases can be diffed, and a past release can be restored without downloading.
+#
+#   python snapshot_store.py list [import folder]
+#   python snapshot_store.py restore <release> <destination> [import folder]
+#   python snapshot_store.py diff <old release> <new release> <destination> [import folder]
+
+import tempfile
+import hashlib
+import shutil
+import json
+import gzip
+import time
+import sys
+import os
+
+from release_diff import diff_to_files, natural_key_columns
+
+snapshot_folder_name = 'snapshots'
+index_file_name = 'index.json'
+chunk_size = 1024 * 1024 # bytes hashed/compressed per read
+
+############# LOCATIONS AND INDEX #############
+def store_path(path):
+    return os.path.join(path, snapshot_folder_name)
+
+def object_path(path, sha256):
+    return os.path.join(store_path(path), 'objects', sha256[:2], sha256 + '.csv.gz')
+
+def load_index(path):
+    index_path = os.path.join(store_path(path), index_file_name)
+    if not os.path.exists(index_path):
+        return {}
+    with open(index_path, 'r') as index_file:
+        return json.load(index_file)
+
+# write to a temp file first so an interrupted run never leaves a half-written index
+def save_index(path, index):
+    index_path = os.path.join(store_path(path), index_file_name)
+    with open(index_path + '.tmp', 'w') as index_file:
+        json.dump(index, index_file, indent=2, sort_keys=True)
+    os.replace(index_path + '.tmp', index_path)
+
+# 'abilitiesarchive.csv' / 'abilitiesadditions.csv' -> 'abilities.csv'
+def snapshot_file_name(file_name):
+    for suffix in ('additions.csv', 'archive.csv'):
+        if file_name.endswith(suffix):
+            return file_name[:-len(suffix)] + '.csv'
+    return file_name
+
+# releases sorted oldest first: [(release, date)]
+def list_releases(path):
+    index = load_index(path)
+    return sorted(((release, entry['date']) for release, entry in index.items()), key=lambda item: (item[1], item[0]))
+
+def releases_on(path, date):
+    return [release for release, release_date in list_releases(path) if release_date == date]
+
+############# ADD FILES #############
+def file_sha256(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+# stores the file once per distinct content and returns its sha256
+def add_object(path, file_path):
+    sha256 = file_sha256(file_path)
+    stored_path = object_path(path, sha256)
+    if not os.path.exists(stored_path):
+        os.makedirs(os.path.dirname(stored_path), exist_ok=True)
+        with open(file_path, 'rb') as source, gzip.open(stored_path + '.tmp', 'wb') as stored:
+            shutil.copyfileobj(source, stored, chunk_size)
+        os.replace(stored_path + '.tmp', stored_path)
+    return sha256
+
+# snapshot the files of one release; files missing from the folder are left out
+# saving a release name again replaces its entry, the objects stay shared
+def save_release(path, release, file_names, date=None):
+    files = {}
+    for file_name in file_names:
+        file_path = os.path.join(path, file_name)
+        if os.path.isfile(file_path):
+            files[snapshot_file_name(file_name)] = add_object(path, file_path)
+    index = load_index(path)
+    index[release] = {'date': date or time.strftime('%Y-%m-%d'), 'files': files}
+    save_index(path, index)
+    return files
+
+############# READ RELEASES BACK #############
+def restore_file(path, release, file_name, destination_path):
+    sha256 = load_index(path)[release]['files'][file_name]
+    with gzip.open(object_path(path, sha256), 'rb') as stored, open(destination_path + '.tmp', 'wb') as destination:
+        shutil.copyfileobj(stored, destination, chunk_size)
+    os.replace(destination_path + '.tmp', destination_path)
+
+# writes every file of a release into destination, e.g. to rebuild the database from it
+# suffix='archive' gives the names the comparisons script diffs against
+def restore_release(path, release, destination, suffix=''):
+    restored = []
+    os.makedirs(destination, exist_ok=True)
+    for file_name in sorted(load_index(path)[release]['files']):
+        restored_file_name = file_name.replace('.csv', suffix + '.csv')
+        restore_file(path, release, file_name, os.path.join(destination, restored_file_name))
+        restored.append(restored_file_name)
+    return restored
+
+# diff every file of two stored releases into <file>additions/removals/changes.csv in destination
+# files only in the new release come out as all additions, files only in the old one are left out
+# returns {file_name: counts}
+def diff_releases(path, old_release, new_release, destination, memory_limit=None):
+    index = load_index(path)
+    old_files = index[old_release]['files']
+    new_files = index[new_release]['files']
+    results = {}
+    os.makedirs(destination, exist_ok=True)
+    with tempfile.TemporaryDirectory(prefix='release_diff_') as work_dir:
+        for file_name in sorted(new_files):
+            new_path = os.path.join(work_dir, 'new_' + file_name)
+            old_path = os.path.join(work_dir, 'old_' + file_name)
+            restore_file(path, new_release, file_name, new_path)
+            if file_name in old_files:
+                restore_file(path, old_release, file_name, old_path)
+            else:
+                with open(new_path, 'r', newline='', encoding='utf-8-sig') as new_file, open(old_path, 'w', newline='', encoding='utf-8') as old_file:
+                    old_file.write(new_file.readline()) # header only
+            results[file_name] = diff_to_files(old_path, new_path, destination, file_name.replace('.csv', ''),
+                                            natural_key_columns(file_name), memory_limit)
+            os.remove(new_path)
+            os.remove(old_path)
+    return results
+
+############# COMMAND LINE #############
+if __name__ == '__main__':
+    assumed_path = os.path.abspath(os.path.join(os.path.dirname( __file__ ), '..', 'import'))
+    arguments = sys.argv[1:]
+    if arguments[:1] == ['list']:
+        for release, date in list_releases(arguments[1] if len(arguments) > 1 else assumed_path):
+            print(date + '  ' + release)
+    elif arguments[:1] == ['restore'] and len(arguments) >= 3:
+        for restored in restore_release(arguments[3] if len(arguments) > 3 else assumed_path, arguments[1], arguments[2]):
+            print('Restored ' + restored)
+    elif arguments[:1] == ['diff'] and len(arguments) >= 4:
+        results = diff_releases(arguments[4] if len(arguments) > 4 else assumed_path, arguments[1], arguments[2], arguments[3])
+        for file_name, counts in results.items():
+            print(file_name + f': {counts["added"]} added, {counts["removed"]} removed, {counts["changed"]} changed.')
+    else:
+        print('usage: snapshot_store.py list | restore <release> <destination> | diff <old release> <new release> <destination> [import folder]')
+        sys.exit(2)
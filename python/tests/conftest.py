@@ -0,0 +1,5 @@
+# the modules live in python/, next to this folder, and are imported by name as the scripts do
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
@@ -0,0 +1,88 @@
+# the in-memory compile of query_list for --mode bulk, and the neo4j-admin import step
+
+import os
+import stat
+
+import pytest
+
+pytest.importorskip('neo4j') # bulk_import shares the client loader's conversions
+
+from bulk_import import compile_query, compile_import, new_graph, run_admin_import, NotCompilable, wipe_queries
+from query_scheduler import schema_pattern
+
+def build_queries():
+    for module in ('py2neo', 'pandas', 'nltk', 'gensim', 'scipy', 'bs4'):
+        pytest.importorskip(module)
+    import database_update_script as build
+    build.query_list = []
+    return build.append_queries(True)
+
+def test_every_fresh_install_query_compiles_or_is_left_to_cypher():
+    not_compiled = {}
+    for index, query in enumerate(build_queries()):
+        if schema_pattern.search(query) or query.strip() in wipe_queries:
+            continue
+        try:
+            compile_query(query, new_graph())
+        except NotCompilable as e:
+            not_compiled[index] = str(e)
+    # only the employee Found_In loads with a random datavalue run against the database after the import
+    assert not_compiled
+    assert all('apoc.coll.shuffle' in reason for reason in not_compiled.values())
+
+def test_loads_merge_and_label_like_cypher(tmp_path):
+    (tmp_path / 'elements.csv').write_text('Element ID,Element Name\n1.A,Abilities\n1.A,Abilities\n1.A.1,Cognitive\n,Blank\n')
+    (tmp_path / 'links.csv').write_text('From,To\n1.A,1.A.1\n1.A,1.A.1\n')
+    query_list = ["""CALL apoc.periodic.iterate("
+    LOAD CSV WITH HEADERS
+    FROM 'file:///elements.csv' AS line
+    RETURN line
+    ","
+    MERGE (e:Element {elementID: line.`Element ID`})
+    ON CREATE SET e.title = toLower(line.`Element Name`)
+    ",{batchSize:1000})""", """CALL apoc.periodic.iterate("
+    LOAD CSV WITH HEADERS
+    FROM 'file:///links.csv' AS line
+    RETURN line
+    ","
+    MATCH (a:Element), (b:Element)
+    WHERE a.elementID = line.From AND b.elementID = line.To
+    MERGE (a)<-[r:Sub_Element_Of]-(b)
+    ",{batchSize:1000})""", """MATCH (n:Element) WHERE n.elementID CONTAINS '1.A' SET n:Abilities"""]
+    graph, compiled, remaining = compile_import(query_list, str(tmp_path))
+    assert compiled == {0, 1, 2} and remaining == []
+    assert sorted(node['properties']['elementID'] for node in graph['nodes']) == ['1.A', '1.A.1']
+    assert all(node['labels'] == {'Element', 'Abilities'} for node in graph['nodes'])
+    assert sum(len(relationships) for relationships in graph['relationships'].values()) == 1
+    assert graph['merged_rows'] == 1 and graph['skipped_rows'] == 1 # the duplicate and the blank id
+
+def test_a_query_after_an_uncompiled_one_waits_for_it(tmp_path):
+    query_list = ["MATCH (n:Element) REMOVE n:Abilities", "MATCH (n:Abilities) SET n.flag = 'x'"]
+    graph, compiled, remaining = compile_import(query_list, str(tmp_path))
+    assert compiled == set() and remaining == query_list
+
+def fake_neo4j_home(tmp_path, admin_exit=0):
+    bin_path = tmp_path / 'bin'
+    bin_path.mkdir()
+    for name, code in (('neo4j', 0), ('neo4j-admin', admin_exit)):
+        script = bin_path / name
+        script.write_text('#!/bin/sh\necho ' + name + ' "$@"\nexit ' + str(code) + '\n')
+        script.chmod(script.stat().st_mode | stat.S_IEXEC)
+    for folder in ('databases', 'transactions'):
+        (tmp_path / 'data' / folder / 'neo4j').mkdir(parents=True)
+        (tmp_path / 'data' / folder / 'neo4j' / 'store').write_text('old')
+    return str(tmp_path)
+
+def test_admin_import_moves_the_old_database_aside(tmp_path):
+    neo4j_home = fake_neo4j_home(tmp_path)
+    output, moved = run_admin_import(neo4j_home, ['nodes.csv'], ['relationships.csv'])
+    assert 'import --database=neo4j' in output and '--nodes=nodes.csv' in output
+    assert len(moved) == 2
+    for folder in moved:
+        assert open(os.path.join(folder, 'store')).read() == 'old'
+    assert not os.path.exists(os.path.join(neo4j_home, 'data', 'databases', 'neo4j'))
+
+def test_failed_admin_import_says_where_the_old_database_is(tmp_path):
+    neo4j_home = fake_neo4j_home(tmp_path, admin_exit=1)
+    with pytest.raises(RuntimeError, match='before-import-'):
+        run_admin_import(neo4j_home, ['nodes.csv'], [])
@@ -0,0 +1,40 @@
+# index_advisor: advised indexes an earlier run created are dropped from query_list, by name or by
+# the (label, properties) db.indexes() lists for them
+
+import pytest
+
+pytest.importorskip('neo4j') # index_advisor reads queries with bulk_import's parser
+
+from index_advisor import index_statement, with_advised_indexes, database_indexes, without_existing_indexes
+
+class Result:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def data(self):
+        return self.rows
+
+class IndexedGraph:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def run(self, query):
+        assert 'db.indexes()' in query
+        return Result(self.rows)
+
+def test_advised_indexes_already_in_the_database_are_dropped():
+    constraint = 'CREATE CONSTRAINT ON (o:Occupation) ASSERT o.onet_soc_code IS UNIQUE'
+    load = "MATCH (t:AlternateTitles {title: 'x', shorttitle: 'y'}) RETURN t"
+    statements = [index_statement(('AlternateTitles', ('shorttitle', 'title'))),
+                  index_statement(('Task', ('taskID',))),
+                  index_statement(('Commodity', ('commodityID',)))]
+    query_list = with_advised_indexes([constraint, load], statements)
+    graph = IndexedGraph([
+        {'name': 'advised_alternatetitles_shorttitle_title', 'labelsOrTypes': ['AlternateTitles'], 'properties': ['shorttitle', 'title']},
+        {'name': 'index_1234', 'labelsOrTypes': ['Task'], 'properties': ['taskID']}, # same schema, another name
+        {'name': 'constraint_5678', 'labelsOrTypes': ['Occupation'], 'properties': ['onet_soc_code']}])
+    kept = without_existing_indexes(query_list, database_indexes(graph))
+    assert kept == [constraint, statements[2], query_list[-2], load]
+    assert 'db.awaitIndexes' in kept[2]
+    # nothing there yet: every statement stays
+    assert without_existing_indexes(query_list, database_indexes(IndexedGraph([]))) == query_list
@@ -0,0 +1,105 @@
+# onet_downloads against a local http.server stand-in for onetcenter.org: full download,
+# resume from a .part file, restart after a 416, and the manifest short-circuit
+
+from http.server import HTTPServer, BaseHTTPRequestHandler
+import threading
+import hashlib
+import json
+import os
+
+import pytest
+
+from onet_downloads import download_needed_files, record_conversion, manifest_file_name
+
+workbook = bytes(range(256)) * 64 # 16KB stand-in for an .xlsx
+etag = '"' + hashlib.md5(workbook).hexdigest() + '"'
+index_html = '<html><body><a href="files/Abilities.xlsx">Abilities</a><a href="files/Unused.xlsx">Unused</a></body></html>'
+
+class StandIn(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.seen.append((self.path, dict(self.headers)))
+        if self.path == '/database.html':
+            return self.reply(200, index_html.encode('utf-8'), {})
+        if self.path != '/files/Abilities.xlsx':
+            return self.reply(404, b'', {})
+        if self.headers.get('If-None-Match') == etag:
+            return self.reply(304, b'', {'ETag': etag})
+        requested = self.headers.get('Range')
+        if requested and self.headers.get('If-Range') == etag:
+            start = int(requested.split('=')[1].rstrip('-'))
+            if start >= len(workbook):
+                return self.reply(416, b'', {'Content-Range': 'bytes */' + str(len(workbook))})
+            return self.reply(206, workbook[start:], {'ETag': etag, 'Content-Range': 'bytes ' + str(start) + '-' + str(len(workbook) - 1) + '/' + str(len(workbook))})
+        self.reply(200, workbook, {'ETag': etag})
+
+    def reply(self, status, body, headers):
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def index_url():
+    server = HTTPServer(('127.0.0.1', 0), StandIn)
+    server.seen = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield 'http://127.0.0.1:' + str(server.server_address[1]) + '/database.html', server.seen
+    server.shutdown()
+    server.server_close()
+
+def workbook_requests(seen):
+    return [headers for path, headers in seen if path == '/files/Abilities.xlsx']
+
+def download(path, url):
+    return download_needed_files(str(path), ['abilities.csv'], index_url=url, workers=2)
+
+def read_manifest(path):
+    with open(os.path.join(str(path), manifest_file_name)) as manifest_file:
+        return json.load(manifest_file)
+
+def test_full_download(tmp_path, index_url):
+    url, seen = index_url
+    assert download(tmp_path, url) == (['abilities.xlsx'], [], ['unused.xlsx'])
+    assert (tmp_path / 'abilities.xlsx').read_bytes() == workbook
+    assert not (tmp_path / 'abilities.xlsx.part').exists()
+    entry = read_manifest(tmp_path)['abilities.xlsx']
+    assert entry['etag'] == etag
+    assert entry['size'] == len(workbook)
+    assert entry['sha256'] == hashlib.sha256(workbook).hexdigest()
+    assert 'Range' not in workbook_requests(seen)[0]
+
+def test_resume_from_part_file(tmp_path, index_url):
+    url, seen = index_url
+    (tmp_path / 'abilities.xlsx.part').write_bytes(workbook[:5000])
+    (tmp_path / manifest_file_name).write_text(json.dumps({'abilities.xlsx': {'partial_etag': etag}}))
+    assert download(tmp_path, url)[0] == ['abilities.xlsx']
+    assert (tmp_path / 'abilities.xlsx').read_bytes() == workbook
+    headers = workbook_requests(seen)[0]
+    assert headers['Range'] == 'bytes=5000-'
+    assert headers['If-Range'] == etag
+
+def test_restart_after_416(tmp_path, index_url):
+    url, seen = index_url
+    # a .part longer than the file can't be resumed
+    (tmp_path / 'abilities.xlsx.part').write_bytes(workbook + b'stale')
+    (tmp_path / manifest_file_name).write_text(json.dumps({'abilities.xlsx': {'partial_etag': etag}}))
+    assert download(tmp_path, url)[0] == ['abilities.xlsx']
+    assert (tmp_path / 'abilities.xlsx').read_bytes() == workbook
+    first, second = workbook_requests(seen)
+    assert 'Range' in first and 'Range' not in second
+
+def test_unchanged_manifest_skips_download(tmp_path, index_url):
+    url, seen = index_url
+    download(tmp_path, url)
+    (tmp_path / 'abilities.csv').write_text('converted')
+    record_conversion(str(tmp_path), 'abilities.xlsx')
+    os.remove(str(tmp_path / 'abilities.xlsx'))
+    assert download(tmp_path, url) == ([], ['abilities.xlsx'], ['unused.xlsx'])
+    assert not (tmp_path / 'abilities.xlsx').exists()
+    assert workbook_requests(seen)[-1]['If-None-Match'] == etag
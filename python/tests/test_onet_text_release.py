@@ -0,0 +1,43 @@
+# onet_text_release: the release files that survive the import folder cleanup, also when the
+# release was unpacked into the import folder itself
+
+import zipfile
+import os
+
+from onet_text_release import ingest_text_release, release_file_names
+
+abilities_text = 'O*NET-SOC Code\tElement ID\tData Value\n11-1011.00\t1.A.1.a.1\t4.5\n'
+
+def write_release(folder):
+    for text_file_name in ('Abilities.txt', 'Work Styles.txt'):
+        with open(os.path.join(folder, text_file_name), 'w', encoding='utf-8') as text_file:
+            text_file.write(abilities_text)
+
+def test_a_release_unpacked_into_the_import_folder_is_kept(tmp_path):
+    write_release(tmp_path)
+    (tmp_path / 'stale.csv').write_text('left over from an older build\n')
+    conversions, skipped = ingest_text_release(str(tmp_path), str(tmp_path), ['abilities.csv'])
+    assert [conversion['csv_file_name'] for conversion in conversions] == ['abilities.csv']
+    assert skipped == ['Work Styles.txt']
+    kept = release_file_names(str(tmp_path), str(tmp_path))
+    assert kept == {'Abilities.txt', 'Work Styles.txt'}
+    assert 'stale.csv' not in kept and 'abilities.csv' not in kept
+
+def test_a_release_zip_or_folder_in_the_import_folder_is_kept(tmp_path):
+    release_folder = tmp_path / 'db_24_3_text'
+    release_folder.mkdir()
+    write_release(release_folder)
+    with zipfile.ZipFile(tmp_path / 'db_24_3_text.zip', 'w') as release_zip:
+        release_zip.writestr('db_24_3_text/Abilities.txt', abilities_text)
+    assert release_file_names(str(release_folder), str(tmp_path)) == {'db_24_3_text'}
+    assert release_file_names(str(tmp_path / 'db_24_3_text.zip'), str(tmp_path)) == {'db_24_3_text.zip'}
+
+def test_a_release_elsewhere_keeps_nothing_in_the_import_folder(tmp_path):
+    release_folder = tmp_path / 'release'
+    import_folder = tmp_path / 'import'
+    release_folder.mkdir()
+    import_folder.mkdir()
+    write_release(release_folder)
+    (import_folder / 'Abilities.txt').write_text(abilities_text)
+    assert release_file_names(str(release_folder), str(import_folder)) == set()
+    assert release_file_names('', str(import_folder)) == set()
@@ -0,0 +1,73 @@
+# plan flags and regressions from recorded operator trees, no database needed
+
+from query_plans import plan_tree, plan_flags, plan_statement, find_plan_regressions
+
+def operator(name, children=(), db_hits=None, details=''):
+    return {'operatorType': name + '@neo4j', 'identifiers': ['a'], 'args': {'Details': details},
+            'dbHits': db_hits, 'rows': 1, 'children': list(children)}
+
+# MATCH (a:Element), (b:Element) WHERE a.elementID = line.From ... planned without the constraint
+recorded_plan = operator('ProduceResults', [
+    operator('Filter', [
+        operator('CartesianProduct', [
+            operator('NodeByLabelScan', db_hits=586, details='a:Element'),
+            operator('AllNodesScan', db_hits=40000, details='b')])])])
+
+indexed_plan = operator('ProduceResults', [
+    operator('NodeUniqueIndexSeek', db_hits=2, details='a:Element(elementID)')])
+
+class RecordedCursor:
+    def __init__(self, plan):
+        self.recorded = plan
+    def data(self):
+        return []
+    def plan(self):
+        return self.recorded
+
+class RecordedTransaction:
+    def __init__(self, plan):
+        self.recorded = plan
+        self.rolled_back = False
+    def run(self, statement, parameters):
+        return RecordedCursor(self.recorded)
+    def finished(self):
+        return self.rolled_back
+    def rollback(self):
+        self.rolled_back = True
+
+class RecordedGraph:
+    def __init__(self, plan):
+        self.tx = RecordedTransaction(plan)
+    def begin(self):
+        return self.tx
+
+def entry(query=1, rows=None):
+    return {'query': query, 'query_key': 'key' + str(query), 'input_file': 'content_model_relationships.csv',
+            'statement': 'UNWIND $rows AS line MATCH (a:Element) RETURN a', 'rows': rows}
+
+def test_every_bad_operator_is_flagged():
+    tree = plan_tree(recorded_plan)
+    assert tree['operator'] == 'ProduceResults'
+    assert plan_flags(tree) == ['AllNodesScan', 'CartesianProduct', 'NodeByLabelScan under Filter']
+
+def test_label_scan_without_filter_and_index_seek_are_fine():
+    assert plan_flags(plan_tree(operator('ProduceResults', [operator('NodeByLabelScan')]))) == []
+    assert plan_flags(plan_tree(indexed_plan)) == []
+
+def test_profile_records_flags_and_rolls_back():
+    graph = RecordedGraph(recorded_plan)
+    result = plan_statement(graph, entry(rows=[{'From': '1', 'To': '1.A'}]), 'PROFILE')
+    assert result['error'] is None
+    assert result['db_hits'] == 40586
+    assert result['flags'] == ['AllNodesScan', 'CartesianProduct', 'NodeByLabelScan under Filter']
+    assert graph.tx.rolled_back
+
+def test_new_flags_and_db_hits_are_regressions():
+    baseline = [plan_statement(RecordedGraph(indexed_plan), entry(), 'PROFILE')]
+    results = [plan_statement(RecordedGraph(recorded_plan), entry(), 'PROFILE')]
+    problems = [regression['problem'] for regression in find_plan_regressions(results, baseline)]
+    assert problems == ['AllNodesScan', 'CartesianProduct', 'NodeByLabelScan under Filter', '40586 db hits vs 2 baseline']
+
+def test_flags_already_in_the_baseline_are_not_regressions():
+    results = [plan_statement(RecordedGraph(recorded_plan), entry(), 'EXPLAIN')]
+    assert find_plan_regressions(results, results) == []
@@ -0,0 +1,100 @@
+# release_diff: per-file natural keys, value normalization and occurrence numbering, and the
+# on-disk hash-partitioned engine writing the same files as the in-memory one
+
+import csv
+import os
+
+from release_diff import diff_files, diff_files_external, write_diff, partition_count, diff_suffixes, natural_key_columns, normalize_value
+
+header = ['O*NET-SOC Code', 'Element ID', 'Element Name', 'Scale ID', 'Data Value']
+
+def write_rows(file_path, rows, columns=header):
+    with open(file_path, 'w', newline='', encoding='utf-8') as csv_file:
+        wr = csv.writer(csv_file, quoting=csv.QUOTE_ALL)
+        wr.writerow(columns)
+        wr.writerows(rows)
+
+# 40 occupations x 5 elements, then the new release changes, drops and adds some of them;
+# '11-1011.00' / '1.A.1' / 'IM' is repeated, and its second occurrence changes
+def release_pair(tmp_path):
+    archive = []
+    for occupation in range(40):
+        for element in range(5):
+            archive.append(['11-%04d.00' % occupation, '1.A.' + str(element), 'Element ' + str(element), 'IM', str(occupation % 5 + 1)])
+    archive += [['11-1011.00', '1.A.1', 'Element 1', 'IM', '2.0'], ['11-1011.00', '1.A.1', 'Element 1', 'IM', '3.0']]
+    new = []
+    for position, row in enumerate(archive[:-2]):
+        if position % 17 == 0:
+            continue # removed
+        if position % 11 == 0:
+            row = row[:4] + [str(float(row[4]) + 0.5)] # changed
+        new.append(row)
+    new += [['11-1011.00', '1.A.1', 'Element 1', 'IM', '2'], ['11-1011.00', '1.A.1', 'Element 1', 'IM', '4.0'],
+            ['11-1011.00', '1.A.1', 'Element 1', 'IM', '5.0']] # same, changed, added
+    new += [['13-%04d.00' % occupation, '1.A.0', 'Element 0', 'IM', '1'] for occupation in range(30)] # added
+    archive_path = str(tmp_path / 'abilitiesarchive.csv')
+    new_path = str(tmp_path / 'abilities.csv')
+    write_rows(archive_path, archive)
+    write_rows(new_path, new)
+    return archive_path, new_path
+
+def read_bytes(file_path):
+    with open(file_path, 'rb') as diff_file:
+        return diff_file.read()
+
+def test_external_diff_matches_the_in_memory_diff(tmp_path):
+    archive_path, new_path = release_pair(tmp_path)
+    in_memory = tmp_path / 'in_memory'
+    external = tmp_path / 'external'
+    in_memory.mkdir()
+    external.mkdir()
+    memory_limit = 4096
+    assert partition_count(archive_path, new_path, memory_limit) > 8
+
+    memory_counts = write_diff(diff_files(archive_path, new_path), str(in_memory), 'abilities')
+    external_counts = diff_files_external(archive_path, new_path, str(external), 'abilities',
+                                          memory_limit=memory_limit, temp_dir=str(tmp_path))
+    assert external_counts == memory_counts
+    assert memory_counts['added'] > 30 and memory_counts['removed'] > 10 and memory_counts['changed'] > 10
+    for suffix in diff_suffixes.values():
+        assert read_bytes(str(external / ('abilities' + suffix))) == read_bytes(str(in_memory / ('abilities' + suffix)))
+    # the spill files are gone
+    assert sorted(os.listdir(str(tmp_path))) == ['abilities.csv', 'abilitiesarchive.csv', 'external', 'in_memory']
+
+def test_ratings_are_keyed_by_occupation_element_and_scale(tmp_path):
+    assert natural_key_columns('abilitiesarchive.csv') == ['O*NET-SOC Code', 'Element ID', 'Scale ID']
+    assert natural_key_columns('/import/taskratingsadditions.csv') == ['O*NET-SOC Code', 'Task ID', 'Scale ID', 'Category']
+    archive_path, new_path = str(tmp_path / 'abilitiesarchive.csv'), str(tmp_path / 'abilities.csv')
+    write_rows(archive_path, [['11-1011.00', '1.A.1', 'Oral', 'IM', '4.5'], ['11-1011.00', '1.A.1', 'Oral', 'LV', '3'], ['11-1011.00', '1.A.2', 'Written', 'IM', '4']])
+    # new columns order, one rating changed, one gone, one new
+    write_rows(new_path, [['1.A.1', '11-1011.00', 'LV', '3.5', 'Oral'], ['1.A.1', '11-1011.00', 'IM', '4.5', 'Oral'], ['1.A.3', '11-1011.00', 'IM', '2', 'Deductive']],
+               ['Element ID', 'O*NET-SOC Code', 'Scale ID', 'Data Value', 'Element Name'])
+    diff = diff_files(archive_path, new_path)
+    assert diff['key_columns'] == ['O*NET-SOC Code', 'Element ID', 'Scale ID']
+    assert [(row['Element ID'], row['Scale ID'], row['Data Value']) for row in diff['changed']] == [('1.A.1', 'LV', '3.5')]
+    assert [row['Element ID'] for row in diff['added']] == ['1.A.3']
+    assert [row['Element ID'] for row in diff['removed']] == ['1.A.2']
+
+def test_a_file_without_a_natural_key_only_adds_and_removes(tmp_path):
+    assert natural_key_columns('careerchangersmatrix.csv') is None
+    archive_path, new_path = str(tmp_path / 'careerchangersmatrixarchive.csv'), str(tmp_path / 'careerchangersmatrix.csv')
+    columns = ['O*NET-SOC Code', 'Related O*NET-SOC Code']
+    write_rows(archive_path, [['11-1011.00', '11-1021.00'], ['11-1011.00', '11-2011.00'], ['11-1011.00', '11-1021.00']], columns)
+    write_rows(new_path, [['11-1011.00', '11-1021.00'], ['11-1011.00', '11-3011.00']], columns)
+    diff = diff_files(archive_path, new_path)
+    assert diff['key_columns'] == columns # the whole row
+    assert diff['changed'] == []
+    assert [row['Related O*NET-SOC Code'] for row in diff['added']] == ['11-3011.00']
+    # the repeated row is numbered by occurrence, so only its second copy is removed
+    assert [row['Related O*NET-SOC Code'] for row in diff['removed']] == ['11-2011.00', '11-1021.00']
+
+def test_whitespace_and_number_formatting_are_not_changes(tmp_path):
+    assert normalize_value(' 8823.0 ') == '8823'
+    assert normalize_value('4.50') == '4.5'
+    assert normalize_value('nan') == 'nan'
+    assert normalize_value(' Chief Executives ') == 'Chief Executives'
+    archive_path, new_path = str(tmp_path / 'abilitiesarchive.csv'), str(tmp_path / 'abilities.csv')
+    write_rows(archive_path, [['11-1011.00', '1.A.1', 'Oral', 'IM', '4.50'], ['11-1011.00', '1.A.2', 'Written', 'IM', '4.0']])
+    write_rows(new_path, [['11-1011.00 ', '1.A.1', ' Oral', 'IM', '4.5'], ['11-1011.00', '1.A.2', 'Written', 'IM', '4']])
+    diff = diff_files(archive_path, new_path)
+    assert diff['added'] == [] and diff['removed'] == [] and diff['changed'] == []
@@ -0,0 +1,76 @@
+# snapshot_store: store -> list -> restore of two releases, one stored object per distinct file,
+# and a diff between the stored releases
+
+import csv
+import os
+
+from snapshot_store import save_release, list_releases, releases_on, restore_release, diff_releases, object_path, store_path
+
+occupations = [['O*NET-SOC Code', 'Title', 'Description'],
+               ['11-1011.00', 'Chief Executives', 'Plan.'],
+               ['11-1021.00', 'General Managers', 'Direct.']]
+abilities = [['O*NET-SOC Code', 'Element ID', 'Scale ID', 'Data Value'],
+             ['11-1011.00', '1.A.1', 'IM', '4.5'],
+             ['11-1011.00', '1.A.2', 'IM', '4']]
+
+def write_rows(file_path, rows):
+    with open(file_path, 'w', newline='', encoding='utf-8') as csv_file:
+        csv.writer(csv_file, quoting=csv.QUOTE_ALL).writerows(rows)
+
+def read_bytes(file_path):
+    with open(file_path, 'rb') as f:
+        return f.read()
+
+def stored_objects(path):
+    objects = []
+    for folder, folders, file_names in os.walk(os.path.join(store_path(path), 'objects')):
+        objects += [file_name for file_name in file_names if file_name.endswith('.csv.gz')]
+    return sorted(objects)
+
+def save_two_releases(path):
+    write_rows(os.path.join(path, 'occupationdataadditions.csv'), occupations)
+    write_rows(os.path.join(path, 'abilitiesadditions.csv'), abilities)
+    first = save_release(path, 'db_24_2_text', ['occupationdataadditions.csv', 'abilitiesadditions.csv', 'missing.csv'], date='2024-08-01')
+    # the next release only changes abilities, and the comparisons script names it ...archive.csv
+    write_rows(os.path.join(path, 'occupationdataarchive.csv'), occupations)
+    write_rows(os.path.join(path, 'abilitiesarchive.csv'), abilities[:2] + [['11-1011.00', '1.A.2', 'IM', '3.5'], ['11-1011.00', '1.A.3', 'IM', '2']])
+    second = save_release(path, 'db_24_3_text', ['occupationdataarchive.csv', 'abilitiesarchive.csv'], date='2024-11-01')
+    return first, second
+
+def test_releases_round_trip_through_the_store(tmp_path):
+    path = str(tmp_path)
+    first, second = save_two_releases(path)
+    assert sorted(first) == ['abilities.csv', 'occupationdata.csv']
+    assert list_releases(path) == [('db_24_2_text', '2024-08-01'), ('db_24_3_text', '2024-11-01')]
+    assert releases_on(path, '2024-11-01') == ['db_24_3_text']
+
+    restored = restore_release(path, 'db_24_3_text', str(tmp_path / 'restored'), suffix='archive')
+    assert restored == ['abilitiesarchive.csv', 'occupationdataarchive.csv']
+    for file_name in restored:
+        assert read_bytes(str(tmp_path / 'restored' / file_name)) == read_bytes(os.path.join(path, file_name))
+    restore_release(path, 'db_24_2_text', str(tmp_path / 'older'))
+    assert read_bytes(str(tmp_path / 'older' / 'abilities.csv')) == read_bytes(os.path.join(path, 'abilitiesadditions.csv'))
+    assert sorted(os.listdir(str(tmp_path / 'older'))) == ['abilities.csv', 'occupationdata.csv']
+
+def test_unchanged_content_is_stored_once(tmp_path):
+    path = str(tmp_path)
+    first, second = save_two_releases(path)
+    assert first['occupationdata.csv'] == second['occupationdata.csv']
+    assert first['abilities.csv'] != second['abilities.csv']
+    assert len(stored_objects(path)) == 3
+    assert os.path.exists(object_path(path, first['occupationdata.csv']))
+    # saving the same release again adds nothing
+    save_release(path, 'db_24_3_text', ['occupationdataarchive.csv', 'abilitiesarchive.csv'], date='2024-11-01')
+    assert len(stored_objects(path)) == 3
+    assert len(list_releases(path)) == 2
+
+def test_two_stored_releases_diff_by_natural_key(tmp_path):
+    path = str(tmp_path)
+    save_two_releases(path)
+    results = diff_releases(path, 'db_24_2_text', 'db_24_3_text', str(tmp_path / 'diff'))
+    assert results == {'abilities.csv': {'added': 1, 'removed': 0, 'changed': 1},
+                       'occupationdata.csv': {'added': 0, 'removed': 0, 'changed': 0}}
+    with open(str(tmp_path / 'diff' / 'abilitieschanges.csv'), newline='', encoding='utf-8') as changes:
+        assert [(row['Element ID'], row['Data Value']) for row in csv.DictReader(changes)] == [('1.A.2', '3.5')]
+    with open(str(tmp_path / 'diff' / 'abilitiesadditions.csv'), newline='', encoding='utf-8') as additions:
+        assert [row['Element ID'] for row in csv.DictReader(additions)] == ['1.A.3']
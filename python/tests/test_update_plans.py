@@ -0,0 +1,77 @@
+# update_plans: the removals/changes of a release diff applied to a recording stand-in for the graph,
+# and the plan files of an earlier run cleared before a new one
+
+import csv
+import os
+
+from release_diff import diff_to_files
+from update_plans import apply_update_plans, clear_update_plans
+
+class RecordingTransaction:
+    def __init__(self, graph):
+        self.graph = graph
+
+    def run(self, statement, parameters):
+        self.graph.statements.append((statement, [dict(row) for row in parameters['rows']]))
+
+    def commit(self):
+        self.graph.commits += 1
+
+class RecordingGraph:
+    def __init__(self):
+        self.statements = []
+        self.commits = 0
+
+    def begin(self):
+        return RecordingTransaction(self)
+
+def write_rows(file_path, header, rows):
+    with open(file_path, 'w', newline='', encoding='utf-8') as csv_file:
+        wr = csv.writer(csv_file, quoting=csv.QUOTE_ALL)
+        wr.writerow(header)
+        wr.writerows(rows)
+
+# diff like the comparisons script: the new release becomes <base>archive.csv afterwards
+def diff_release(path, base_name, header, archive_rows, new_rows):
+    write_rows(os.path.join(path, base_name + 'archive.csv'), header, archive_rows)
+    write_rows(os.path.join(path, base_name + '.csv'), header, new_rows)
+    counts = diff_to_files(os.path.join(path, base_name + 'archive.csv'), os.path.join(path, base_name + '.csv'), path, base_name)
+    os.replace(os.path.join(path, base_name + '.csv'), os.path.join(path, base_name + 'archive.csv'))
+    return counts
+
+def test_plans_apply_removed_then_changed_rows(tmp_path):
+    header = ['O*NET-SOC Code', 'Title', 'Description']
+    counts = diff_release(str(tmp_path), 'occupationdata', header,
+        [['11-1011.00', 'Chief Executives', 'Plan.'], ['11-1021.00', 'General Managers', 'Direct.'], ['11-2011.00', 'Advertising Managers', 'Promote.']],
+        [['11-1011.00', 'Chief Executives', 'Plan and direct.'], ['11-2011.00', 'Advertising Managers', 'Promote.'], ['11-3011.00', 'Facilities Managers', 'Run.']])
+    assert counts == {'added': 1, 'removed': 1, 'changed': 1}
+
+    graph = RecordingGraph()
+    applied = []
+    rows = apply_update_plans(graph, str(tmp_path), on_done=lambda base_name, kind, rows: applied.append((base_name, kind, rows)))
+    assert rows == 2 and graph.commits == 2
+    assert applied == [('occupationdata', 'removed', 1), ('occupationdata', 'changed', 1)]
+    (removal, removed_rows), (change, changed_rows) = graph.statements
+    assert removal.startswith('UNWIND $rows AS line\n') and 'DETACH DELETE o' in removal
+    assert [row['O*NET-SOC Code'] for row in removed_rows] == ['11-1021.00']
+    assert 'SET o.title' in change and changed_rows[0]['Description'] == 'Plan and direct.'
+
+def test_removals_keyed_finer_than_the_graph_skip_surviving_keys(tmp_path):
+    header = ['O*NET-SOC Code', 'Element ID', 'Scale ID', 'Category', 'Data Value']
+    diff_release(str(tmp_path), 'educationtrainingandexperience', header,
+        [['11-1011.00', '2.D.1', 'RL', '1', '10'], ['11-1011.00', '2.D.1', 'RL', '2', '20'], ['11-1011.00', '3.A.1', 'RW', '1', '30']],
+        [['11-1011.00', '2.D.1', 'RL', '1', '10']])
+    graph = RecordingGraph()
+    apply_update_plans(graph, str(tmp_path))
+    # category 2 is gone but 2.D.1/RL still has a row, so only the 3.A.1 edges are deleted
+    removed = [rows for statement, rows in graph.statements if 'DELETE f' in statement]
+    assert removed and all([row['Element ID'] for row in rows] == ['3.A.1'] for rows in removed)
+
+def test_plan_files_of_an_earlier_run_are_cleared(tmp_path):
+    write_rows(str(tmp_path / 'abilitiesremovals.csv'), ['O*NET-SOC Code', 'Element ID', 'Scale ID'], [['11-1011.00', '1.A.1', 'IM']])
+    write_rows(str(tmp_path / 'knowledgechanges.csv'), ['O*NET-SOC Code', 'Element ID', 'Scale ID'], [['11-1011.00', '2.C.1', 'IM']])
+    (tmp_path / 'abilitiesarchive.csv').write_text('kept for the next diff\n')
+    assert sorted(clear_update_plans(str(tmp_path))) == ['abilitiesremovals.csv', 'knowledgechanges.csv']
+    assert os.listdir(str(tmp_path)) == ['abilitiesarchive.csv']
+    graph = RecordingGraph()
+    assert apply_update_plans(graph, str(tmp_path)) == 0 and graph.statements == []
@@ -0,0 +1,190 @@
+############# WRITE PLANS FOR REMOVED AND CHANGED ROWS OF A RELEASE DIFF #############
+# release_diff writes <file>removals.csv and <file>changes.csv next to <file>additions.csv.
+# Additions keep going through the regular loader queries; the plans below take care of the rest:
+# removed rows delete their Found_In / Equivalent_To / ... edges (and nodes that only they created),
+# changed rows SET the new values in place. Rows are sent in batches as UNWIND $rows AS line,
+# so every statement reads `line` exactly like the LOAD CSV loaders do.
+#
+# Some files are keyed finer than the graph (e.g. education ratings have a Category, but the
+# Found_In edge only has a scale). For those a removal carries the columns of the graph key,
+# and the row is only applied if nothing in the new release (<file>archive.csv) still has that key.
+
+import csv
+import os
+
+from release_diff import diff_suffixes, normalize_value
+
+update_batch_size = 1000 # rows per UNWIND transaction
+
+############# STATEMENT TEMPLATES #############
+def found_in_match(label, id_property, id_expression, element):
+    return """MATCH (b:""" + label + """ {""" + id_property + """: """ + id_expression + """})-[f:Found_In {scale: line.`Scale ID`, element: '""" + element + """'}]->(o)
+WHERE o.onet_soc_code = line.`O*NET-SOC Code` AND (o:Occupation OR o:Workrole)
+"""
+
+def rating_plans(targets, graph_key=None):
+    plans = []
+    for label, id_property, id_expression, element in targets:
+        plans.append(('removed', graph_key, found_in_match(label, id_property, id_expression, element) + """DELETE f"""))
+        plans.append(('changed', None, found_in_match(label, id_property, id_expression, element) + """SET f.datavalue = toFloat(line.`Data Value`)"""))
+    return plans
+
+element_id = "line.`Element ID`"
+task_id = "toInteger(line.`Task ID`)"
+rating_graph_key = ['O*NET-SOC Code', 'Element ID', 'Scale ID']
+
+# AlternateTitles nodes are one per occupation and title, keyed by the md5 of both
+alternate_title_key = "apoc.util.md5([line.`O*NET-SOC Code`, line.`Alternate Title`])"
+
+delete_job_zone = """MATCH (o:Occupation {onet_soc_code: line.`O*NET-SOC Code`})-[r:In_Job_Zone]->(:JobZone)
+DELETE r"""
+
+############# PLANS PER FILE: (kind, graph key columns or None, statement) #############
+# plans run in the order listed, removals before changes
+update_plans = {
+    'abilities': rating_plans([('Abilities', 'elementID', element_id, 'ability')]),
+    'interests': rating_plans([('Interests', 'elementID', element_id, 'interest')]),
+    'knowledge': rating_plans([('Knowledge', 'elementID', element_id, 'knowledge')]),
+    'skills': rating_plans([('Basic_Skills', 'elementID', element_id, 'basic_skill'),
+                            ('Cross_Functional_Skills', 'elementID', element_id, 'cf_skill')]),
+    'workactivities': rating_plans([('Generalized_Work_Activities', 'elementID', element_id, 'activity')]),
+    'workstyles': rating_plans([('Work_Styles', 'elementID', element_id, 'work_style')]),
+    'educationtrainingandexperience': rating_plans([('Education', 'elementID', element_id, 'education'),
+                                                    ('Experience_And_Training', 'elementID', element_id, 'experience')],
+                                                    rating_graph_key),
+    'taskratings': rating_plans([('Task', 'taskID', task_id, 'task')], ['O*NET-SOC Code', 'Task ID', 'Scale ID']),
+
+    'occupationdata': [
+        ('removed', None, """MATCH (o:Occupation {onet_soc_code: line.`O*NET-SOC Code`})
+DETACH DELETE o"""),
+        ('changed', None, """MATCH (o:Occupation {onet_soc_code: line.`O*NET-SOC Code`})
+SET o.title = toLower(line.Title), o.description = toLower(line.Description)""")],
+    'contentmodelreference': [
+        ('removed', None, """MATCH (e:Element {elementID: line.`Element ID`})
+DETACH DELETE e"""),
+        ('changed', None, """MATCH (e:Element {elementID: line.`Element ID`})
+SET e.title = toLower(line.`Element Name`), e.description = toLower(line.Description)""")],
+    'scalesreference': [
+        ('removed', None, """MATCH (s:Scale {scaleId: line.`Scale ID`})
+DETACH DELETE s"""),
+        ('changed', None, """MATCH (s:Scale {scaleId: line.`Scale ID`})
+SET s.title = toLower(line.`Scale Name`), s.min = toInteger(line.Minimum), s.max = toInteger(line.Maximum)""")],
+    'alternatetitles': [
+        ('removed', None, """MATCH (t:AlternateTitles {titleID: """ + alternate_title_key + """})
+DETACH DELETE t"""),
+        ('changed', None, """MATCH (t:AlternateTitles {titleID: """ + alternate_title_key + """})
+SET t.shorttitle = line.`Short Title`, t.source = line.`Source(s)`""")],
+    'iwareference': [
+        ('removed', None, """MATCH (a:Generalized_Work_Activities {elementID: line.`IWA ID`})
+DETACH DELETE a"""),
+        ('changed', None, """MATCH (a:Generalized_Work_Activities {elementID: line.`IWA ID`})
+SET a.title = line.`IWA Title`""")],
+    'dwareference': [
+        ('removed', None, """MATCH (a:Generalized_Work_Activities {elementID: line.`DWA ID`})
+DETACH DELETE a"""),
+        ('changed', None, """MATCH (a:Generalized_Work_Activities {elementID: line.`DWA ID`})
+SET a.title = line.`DWA Title`""")],
+    'jobzonereference': [
+        ('removed', None, """MATCH (j:JobZone {jobzone: toInteger(line.`Job Zone`)})
+DETACH DELETE j"""),
+        ('changed', None, """MATCH (j:JobZone {jobzone: toInteger(line.`Job Zone`)})
+SET j.name = toLower(line.Name), j.experience = toLower(line.Experience), j.education = toLower(line.Education),
+    j.training = toLower(line.`Job Training`), j.example = toLower(line.Examples), j.svpRange = line.`SVP Range`""")],
+    'jobzones': [
+        ('removed', None, delete_job_zone),
+        ('changed', None, delete_job_zone),
+        ('changed', None, """MATCH (o:Occupation {onet_soc_code: line.`O*NET-SOC Code`})
+MATCH (j:JobZone {jobzone: toInteger(line.`Job Zone`)})
+MERGE (o)-[:In_Job_Zone {jobzone: line.`Job Zone`, date: line.Date}]->(j)""")],
+    'taskstatements': [
+        ('removed', ['Task ID'], """MATCH (task:Task {taskID: toInteger(line.`Task ID`)})
+DETACH DELETE task"""),
+        ('changed', None, """MATCH (task:Task {taskID: toInteger(line.`Task ID`)})
+SET task.description = toLower(line.Task), task.tasktype = toLower(line.`Task Type`),
+    task.incumbentsresponding = line.`Incumbents Responding`, task.date = line.Date, task.domainsource = line.`Domain Source`""")],
+    'taskstodwas': [
+        ('removed', None, """MATCH (task:Task {taskID: toInteger(line.`Task ID`)})-[r:Task_For_DWA]->(a:Generalized_Work_Activities {elementID: line.`DWA ID`})
+DELETE r"""),
+        ('changed', None, """MATCH (task:Task {taskID: toInteger(line.`Task ID`)})-[r:Task_For_DWA]->(a:Generalized_Work_Activities {elementID: line.`DWA ID`})
+SET r.date = line.Date, r.domainsource = line.`Domain Source`""")],
+    'unspscreference': [
+        ('removed', None, """MATCH (m:Commodity {commodityID: toInteger(line.`Commodity Code`)})
+DETACH DELETE m"""),
+        ('changed', None, """MATCH (m:Commodity {commodityID: toInteger(line.`Commodity Code`)})
+SET m.title = toLower(line.`Commodity Title`)""")],
+    # the occupation edge hangs off the commodity and the product is shared by occupations,
+    # so each is only removed once no row of the new release still needs it
+    'technologyskills': [
+        ('removed', ['O*NET-SOC Code', 'Commodity Code'], """MATCH (m:Technology_Skills {commodityID: toInteger(line.`Commodity Code`)})-[r:Technology_Used_In]->(o)
+WHERE o.onet_soc_code = line.`O*NET-SOC Code` AND (o:Occupation OR o:Workrole)
+DELETE r"""),
+        ('removed', ['Example'], """MATCH (p:Tech_Skill_Product {title: line.Example})
+DETACH DELETE p"""),
+        ('changed', None, """MATCH (p:Tech_Skill_Product {title: line.Example})
+SET p.hottech = line.`Hot Technology`""")],
+    'toolsused': [
+        ('removed', ['O*NET-SOC Code', 'Commodity Code'], """MATCH (m:Tools {commodityID: toInteger(line.`Commodity Code`)})-[r:Tools_Used_In]->(o)
+WHERE o.onet_soc_code = line.`O*NET-SOC Code` AND (o:Occupation OR o:Workrole)
+DELETE r"""),
+        ('removed', ['Example'], """MATCH (p:Tool_Product {title: line.Example})
+DETACH DELETE p""")]}
+
+############# READ DIFF ROWS IN BATCHES #############
+# keys still present in the new release, for removals keyed finer than the graph
+def surviving_keys(release_path, key_columns):
+    keys = set()
+    if not os.path.exists(release_path):
+        return keys
+    with open(release_path, 'r', newline='', encoding='utf-8-sig') as csv_file:
+        for row in csv.DictReader(csv_file):
+            keys.add(tuple(normalize_value(row.get(column) or '') for column in key_columns))
+    return keys
+
+def iter_batches(rows_path, batch_size, key_columns=None, skip_keys=None):
+    batch = []
+    with open(rows_path, 'r', newline='', encoding='utf-8-sig') as csv_file:
+        for row in csv.DictReader(csv_file):
+            if skip_keys and tuple(normalize_value(row.get(column) or '') for column in key_columns) in skip_keys:
+                continue
+            batch.append(row)
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+############# CLEAR THE PLAN FILES OF AN EARLIER RUN #############
+# a diff that doesn't run this time must not leave its old removals/changes to be applied again
+# returns the names removed
+def clear_update_plans(path):
+    removed = []
+    for base_name in update_plans:
+        for kind in ('removed', 'changed'):
+            rows_file_name = base_name + diff_suffixes[kind]
+            if os.path.exists(os.path.join(path, rows_file_name)):
+                os.remove(os.path.join(path, rows_file_name))
+                removed.append(rows_file_name)
+    return removed
+
+############# APPLY EVERY PLAN THAT HAS A DIFF FILE #############
+# on_done(base_name, kind, rows) is called after each plan; returns the total rows written
+def apply_update_plans(graph, path, batch_size=update_batch_size, on_done=None):
+    total_rows = 0
+    for base_name, plans in update_plans.items():
+        for kind, graph_key, statement in plans:
+            rows_path = os.path.join(path, base_name + diff_suffixes[kind])
+            if not os.path.exists(rows_path):
+                continue
+            skip_keys = None
+            if graph_key:
+                skip_keys = surviving_keys(os.path.join(path, base_name + 'archive.csv'), graph_key)
+            rows = 0
+            for batch in iter_batches(rows_path, batch_size, graph_key, skip_keys):
+                tx = graph.begin() # one transaction per batch
+                tx.run('UNWIND $rows AS line\n' + statement, {'rows': batch})
+                tx.commit()
+                rows += len(batch)
+            total_rows += rows
+            if on_done:
+                on_done(base_name, kind, rows)
+    return total_rows
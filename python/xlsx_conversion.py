@@ -0,0 +1,175 @@
+############# STREAMING .XLSX TO .CSV CONVERSION #############
+# Reads the first worksheet straight out of the .xlsx zip with iterparse, one <row> at a time,
+# and writes the csv in fixed-size chunks, so peak memory does not grow with the number of rows.
+# Only the shared strings table is held in memory (it grows with distinct strings, not rows).
+# Cell values match what xlrd's row_values gave the old loop: numbers come out as floats,
+# booleans as 0/1 and missing cells as '', with every row padded to the sheet width.
+# convert_workbooks runs the conversions as their own stage on a process pool, one workbook per worker.
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import xml.etree.ElementTree as ET
+import posixpath
+import zipfile
+import time
+import csv
+import re
+import os
+
+chunk_rows = 5000 # rows buffered before each write to the csv
+
+main_ns = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+rel_ns = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+package_rel_ns = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+
+############# LOCATE THE FIRST WORKSHEET INSIDE THE WORKBOOK #############
+def first_sheet_path(workbook_zip):
+    workbook = ET.fromstring(workbook_zip.read('xl/workbook.xml'))
+    sheet = workbook.find(main_ns + 'sheets').find(main_ns + 'sheet')
+    sheet_rel_id = sheet.attrib[rel_ns + 'id']
+    rels = ET.fromstring(workbook_zip.read('xl/_rels/workbook.xml.rels'))
+    for rel in rels.iter(package_rel_ns + 'Relationship'):
+        if rel.attrib['Id'] == sheet_rel_id:
+            target = rel.attrib['Target']
+            # targets are usually relative to xl/, but some writers use absolute paths
+            if target.startswith('/'):
+                return target.lstrip('/')
+            return posixpath.normpath(posixpath.join('xl', target))
+    raise ValueError('Workbook has no worksheet for relationship ' + sheet_rel_id)
+
+############# SHARED STRINGS TABLE #############
+def read_shared_strings(workbook_zip):
+    shared_strings = []
+    if 'xl/sharedStrings.xml' not in workbook_zip.namelist():
+        return shared_strings
+    with workbook_zip.open('xl/sharedStrings.xml') as strings_file:
+        for event, elem in ET.iterparse(strings_file):
+            if elem.tag == main_ns + 'si':
+                # plain strings have one <t>, rich text has one per run; phonetic hints are skipped
+                runs = elem.findall(main_ns + 't') + elem.findall(main_ns + 'r/' + main_ns + 't')
+                shared_strings.append(''.join(t.text or '' for t in runs))
+                elem.clear()
+    return shared_strings
+
+# 'AB12' -> 27 (0-based column index)
+def column_index(cell_ref):
+    letters = re.match('[A-Z]+', cell_ref).group(0)
+    index = 0
+    for letter in letters:
+        index = index * 26 + (ord(letter) - ord('A') + 1)
+    return index - 1
+
+def cell_value(cell, shared_strings):
+    cell_type = cell.attrib.get('t', 'n')
+    if cell_type == 'inlineStr':
+        return ''.join(t.text or '' for t in cell.iter(main_ns + 't'))
+    value = cell.find(main_ns + 'v')
+    if value is None or value.text is None:
+        return ''
+    if cell_type == 's':
+        return shared_strings[int(value.text)]
+    if cell_type == 'b':
+        return int(value.text)
+    if cell_type in ('str', 'e'):
+        return value.text
+    return float(value.text)
+
+############# STREAM ROWS OUT OF THE WORKSHEET XML #############
+def iter_sheet_rows(workbook_zip, sheet_path, shared_strings):
+    ncols = 0
+    next_row = 0
+    sheet_data = None
+    with workbook_zip.open(sheet_path) as sheet_file:
+        for event, elem in ET.iterparse(sheet_file, events=('start', 'end')):
+            if event == 'start':
+                if elem.tag == main_ns + 'sheetData':
+                    sheet_data = elem
+                continue
+            if elem.tag == main_ns + 'dimension':
+                # e.g. ref="A1:M58730" gives the sheet width used to pad short rows
+                last_cell = elem.attrib.get('ref', 'A1').split(':')[-1]
+                ncols = column_index(last_cell) + 1
+            elif elem.tag == main_ns + 'row':
+                row_number = int(elem.attrib.get('r', next_row + 1)) - 1
+                # rows with no cells are left out of the xml, but they still count
+                while next_row < row_number:
+                    yield [''] * ncols
+                    next_row += 1
+                values = []
+                for position, cell in enumerate(elem.iter(main_ns + 'c')):
+                    index = column_index(cell.attrib['r']) if 'r' in cell.attrib else position
+                    if index >= len(values):
+                        values.extend([''] * (index + 1 - len(values)))
+                    values[index] = cell_value(cell, shared_strings)
+                if len(values) < ncols:
+                    values.extend([''] * (ncols - len(values)))
+                yield values
+                next_row += 1
+                # drop finished rows so the tree never holds more than one
+                sheet_data.clear()
+
+############# CONVERT ONE WORKBOOK #############
+# returns a summary dict with the row count and rows per second for logging
+def convert_workbook(xlsx_path, csv_path):
+    start = time.perf_counter()
+    rows = 0
+    with zipfile.ZipFile(xlsx_path) as workbook_zip:
+        shared_strings = read_shared_strings(workbook_zip)
+        sheet_path = first_sheet_path(workbook_zip)
+        with open(csv_path, 'w', newline='', encoding='utf-8') as csv_file:
+            wr = csv.writer(csv_file, quoting=csv.QUOTE_ALL)
+            chunk = []
+            for values in iter_sheet_rows(workbook_zip, sheet_path, shared_strings):
+                chunk.append(values)
+                if len(chunk) == chunk_rows:
+                    wr.writerows(chunk)
+                    rows += len(chunk)
+                    chunk = []
+            wr.writerows(chunk)
+            rows += len(chunk)
+    seconds = time.perf_counter() - start
+    return {'source_file_name': os.path.basename(xlsx_path),
+            'csv_file_name': os.path.basename(csv_path),
+            'rows': rows,
+            'seconds': seconds,
+            'rows_per_second': rows / seconds if seconds > 0 else float(rows)}
+
+# process pool worker: convert one workbook in the import folder, then remove the .xlsx
+def convert_in_folder(path, xlsx_file_name):
+    csv_file_name = xlsx_file_name.replace('.xlsx', '.csv')
+    conversion = convert_workbook(os.path.join(path, xlsx_file_name), os.path.join(path, csv_file_name))
+    os.remove(os.path.join(path, xlsx_file_name))
+    return conversion
+
+############# CONVERT ALL DOWNLOADED WORKBOOKS ON A PROCESS POOL #############
+# on_done(conversion) runs in the calling process as each workbook finishes, in completion order
+# returns (conversions, failures), both sorted by file name so the summary is deterministic
+def convert_workbooks(path, xlsx_file_names, workers=None, on_done=None):
+    conversions = []
+    failures = []
+    if not xlsx_file_names:
+        return conversions, failures
+    workers = min(workers or os.cpu_count() or 1, len(xlsx_file_names))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(convert_in_folder, path, xlsx_file_name): xlsx_file_name for xlsx_file_name in xlsx_file_names}
+        for future in as_completed(futures):
+            try:
+                conversion = future.result()
+            except Exception as e:
+                failures.append({'source_file_name': futures[future], 'error': repr(e)})
+                continue
+            conversions.append(conversion)
+            if on_done:
+                on_done(conversion)
+    conversions.sort(key=lambda conversion: conversion['source_file_name'])
+    failures.sort(key=lambda failure: failure['source_file_name'])
+    return conversions, failures
+
+def conversion_summary(conversions, failures):
+    lines = []
+    for conversion in conversions:
+        lines.append(f'{conversion["source_file_name"]} -> {conversion["csv_file_name"]}: {conversion["rows"]} rows in {conversion["seconds"]:0.2f}s ({conversion["rows_per_second"]:0.0f} rows/s)')
+    for failure in failures:
+        lines.append(f'FAILED {failure["source_file_name"]}: {failure["error"]}')
+    total_rows = sum(conversion['rows'] for conversion in conversions)
+    lines.append(f'Converted {len(conversions)} files ({total_rows} rows), {len(failures)} failed.')
+    return lines